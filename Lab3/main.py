@@ -1,60 +1,66 @@
+import os
+import sys
 import random
 import threading
-import networkx as nx
+import numpy as np
 import customtkinter as ctk
+from tkinter import filedialog, messagebox
+
+# The shared graph model lives next to the lab folders
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from graph_core import Graph, Viewport, draw_edge, draw_graph, draw_node, node_at, feasibility, generators, io as graph_io
+
+# Rows of the edge table; the widgets of a large graph would take minutes to create
+EDGE_TABLE_LIMIT = 50
 
 
 # Function Traveling Salesman algorithm
 class Traveling_Salesman:
-    def __init__(self, graph_editor):
+    def __init__(self, graph_editor, graph=None):
         self.graph_editor = graph_editor
-        self.edges = graph_editor.edges
-        self.graph = graph_editor.graph
+        self.graph = graph_editor.model if graph is None else graph
         self.length = float("inf")
-        self.traversal = {}
+        self.traversal = []
 
     # Algorithm
     def ant_algo(self, coeff_feromon, coeff_length, count_feromon, evaporation_rate, elite_ants_count=1, elite_pheromone_factor=2):
         num_nodes = self.graph.number_of_nodes()
         traversal = None
         length = float("inf")
-        pheromone = {(edge[0], edge[1]): 1 for edge in self.graph.edges()}
+        # Pheromone of every edge, in the CSR order of the edges, which is also the order of graph.edges()
+        indptr, indices, weights = self.graph.csr()
+        pheromone = np.ones(len(indices))
 
         for _ in range(count_feromon * 5):
-            elite_traversals = []
+            elite_positions = []
             elite_lengths = []
 
             for ant in range(num_nodes):
-                current_node = random.choice(list(self.graph.nodes()))
+                current_node = random.randrange(num_nodes)
+                visited = np.zeros(num_nodes, dtype=bool)
+                visited[current_node] = True
                 visited_nodes = [current_node]
+                # CSR positions of the edges of the path
+                positions = []
                 path_length = 0
 
                 while len(visited_nodes) < num_nodes:
-                    unvisited_nodes = set(self.graph.nodes()) - set(visited_nodes)
-                    probabilities = []
-                    total_probability = 0
-
-                    for neighbor in unvisited_nodes:
-                        if (current_node, neighbor) in self.graph.edges():
-                            pheromone_level = pheromone.get((current_node, neighbor), 0.0)
-                            edge_length = self.graph[current_node][neighbor].get("weight", 1.0)
-                            probabilities.append(((pheromone_level ** coeff_feromon) * ((1.0 / edge_length) ** coeff_length), neighbor))
-                            total_probability += probabilities[-1][0]
-
-                    if not probabilities:
+                    start, end = indptr[current_node], indptr[current_node + 1]
+                    free = np.flatnonzero(~visited[indices[start:end]]) + start
+                    if free.size == 0:
                         break
 
-                    total_probability = total_probability.real
-                    chosen_probability = random.uniform(0, total_probability)
-                    cumulative_probability = 0
-
-                    for probability, neighbor in probabilities:
-                        cumulative_probability += probability.real
-                        if cumulative_probability >= chosen_probability:
-                            break
+                    probabilities = (pheromone[free] ** coeff_feromon) * ((1.0 / weights[free]) ** coeff_length)
+                    cumulative_probability = np.cumsum(probabilities)
+                    chosen_probability = random.uniform(0, cumulative_probability[-1])
+                    chosen = min(int(np.searchsorted(cumulative_probability, chosen_probability)), free.size - 1)
 
-                    path_length += self.graph[current_node][neighbor].get("weight", 1.0)
+                    position = free[chosen]
+                    neighbor = int(indices[position])
+                    path_length += weights[position]
+                    positions.append(position)
                     visited_nodes.append(neighbor)
+                    visited[neighbor] = True
                     current_node = neighbor
 
                 if len(visited_nodes) < num_nodes:
@@ -66,57 +72,38 @@ class Traveling_Salesman:
                     traversal = visited_nodes
 
                 if ant < elite_ants_count:
-                    elite_traversals.append(visited_nodes)
+                    elite_positions.append(positions)
                     elite_lengths.append(path_length)
 
-                for i in range(num_nodes - 1):
-                    edge = (visited_nodes[i], visited_nodes[i + 1])
-                    if path_length != 0:
-                        pheromone[edge] = (1 - evaporation_rate) * pheromone.get(edge, 0.0) + count_feromon / path_length
-                    else:
-                        pheromone[edge] = (1 - evaporation_rate) * pheromone.get(edge, 0.0)
+                if path_length != 0:
+                    pheromone[positions] = (1 - evaporation_rate) * pheromone[positions] + count_feromon / path_length
+                else:
+                    pheromone[positions] = (1 - evaporation_rate) * pheromone[positions]
 
-            for elite_traversal, elite_length in zip(elite_traversals, elite_lengths):
-                for i in range(num_nodes - 1):
-                    edge = (elite_traversal[i], elite_traversal[i + 1])
-                    pheromone[edge] += elite_pheromone_factor * count_feromon / elite_length
+            for positions, elite_length in zip(elite_positions, elite_lengths):
+                pheromone[positions] += elite_pheromone_factor * count_feromon / elite_length
 
-            for edge in self.graph.edges():
-                pheromone[edge] *= (1 - evaporation_rate)
+            pheromone *= (1 - evaporation_rate)
 
         self.traversal = traversal
         self.length = length
 
-        try:
-            self.length += self.graph[traversal[-1]][traversal[0]]["weight"]
-            self.traversal.append(self.traversal[0])
-        except KeyError:
+        closing = self.graph.weight(traversal[-1], traversal[0]) if traversal else None
+        if closing is None:
             raise TypeError("Key Error, cycle is not found!")
+        self.length += closing
+        self.traversal.append(self.traversal[0])
 
-        result = f"Длина: {self.length}\n\n"
+        result = f"Длина: {self.length:g}\n\n"
         for i in range(len(self.traversal) - 1):
-            result += f'{self.traversal[i]} -> {self.traversal[i + 1]} ({self.graph[self.traversal[i]][self.traversal[i + 1]]["weight"]})\n'
+            result += f'{self.traversal[i]} -> {self.traversal[i + 1]} ({self.graph.weight(self.traversal[i], self.traversal[i + 1]):g})\n'
         return result, pheromone
 
     # Draw graph with his traversal
     def view(self, canvas):
         canvas.clear_graph()
-        for i in range(len(self.traversal) - 1):
-            start_vertex = self.traversal[i]
-            end_vertex = self.traversal[i + 1]
-            start_x, start_y = self.graph_editor.vertices[start_vertex]
-            end_x, end_y = self.graph_editor.vertices[end_vertex]
-            length = ((end_x - start_x) ** 2 + (end_y - start_y) ** 2) ** 0.5
-            arrow_offset = 10
-            sx = start_x + (end_x - start_x) * (arrow_offset / length)
-            sy = start_y + (end_y - start_y) * (arrow_offset / length)
-            ex = end_x - (end_x - start_x) * (arrow_offset / length)
-            ey = end_y - (end_y - start_y) * (arrow_offset / length)
-            canvas.create_line(sx, sy, ex, ey, arrow="last", width=2)
-
-        for vertex, (x, y) in enumerate(self.graph_editor.vertices):
-            canvas.create_oval(x - 10, y - 10, x + 10, y + 10, fill="blue", tags="vertex")
-            canvas.create_text(x, y, text=str(vertex), fill="white", tags="vertex_text")
+        canvas.viewport = self.graph_editor.viewport
+        draw_graph(canvas, self.graph, canvas.viewport, path=self.traversal)
 
 
 # Class for editing a graph on a canvas
@@ -125,19 +112,16 @@ class GraphEditor(ctk.CTkCanvas):
         super().__init__(master, **kwargs)
         self.bind("<Button-1>", self.on_left_click)
         self.bind("<Button-3>", self.on_right_click)
-        self.vertices = []
-        self.edges = []
         self.selected_vertex = None
-        self.graph = nx.DiGraph()
+        self.model = Graph()
+        self.viewport = Viewport()
         self.interface = interface
 
     # Function to handle left-click events on the canvas
     def on_left_click(self, event):
         x, y = event.x, event.y
-        self.create_oval(x - 10, y - 10, x + 10, y + 10, fill="blue", tags="vertex")
-        self.create_text(x, y, text=str(len(self.graph)), fill="white", tags="vertex_text")
-        self.vertices.append((x, y))
-        self.graph.add_node(len(self.graph))
+        draw_node(self, x, y, len(self.model))
+        self.model.add_node(*self.viewport.to_graph(x, y))
 
     # Function to handle right-click events on the canvas
     def on_right_click(self, event):
@@ -147,34 +131,31 @@ class GraphEditor(ctk.CTkCanvas):
             if self.selected_vertex is None:
                 self.selected_vertex = vertex
             else:
-                start_x, start_y = self.vertices[self.selected_vertex]
-                end_x, end_y = self.vertices[vertex]
-                length = ((end_x - start_x) ** 2 + (end_y - start_y) ** 2) ** 0.5
-                if length == 0:
+                if vertex == self.selected_vertex:
                     return
-                arrow_offset = 10
-                sx = start_x + (end_x - start_x) * (arrow_offset / length)
-                sy = start_y + (end_y - start_y) * (arrow_offset / length)
-                ex = end_x - (end_x - start_x) * (arrow_offset / length)
-                ey = end_y - (end_y - start_y) * (arrow_offset / length)
-                self.create_line(sx, sy, ex, ey, arrow=ctk.LAST, width=2)
-                self.edges.append((self.selected_vertex, vertex))
-                self.graph.add_edge(self.selected_vertex, vertex, weight=int(length))
+                start, end = self.viewport.to_screen(self.model.coordinates[[self.selected_vertex, vertex]])
+                draw_edge(self, start, end)
+                # The weight is the length of the edge
+                self.model.add_edge(self.selected_vertex, vertex)
                 self.selected_vertex = None
                 self.interface.populate_edge_table()
 
     # Function to get the index of a clicked vertex on the canvas
     def get_clicked_vertex(self, x, y):
-        for i, (vx, vy) in enumerate(self.vertices):
-            if (x - vx) ** 2 + (y - vy) ** 2 <= 100:
-                return i
-        return None
+        return node_at(self.model, self.viewport, x, y)
+
+    # Function to show a loaded graph, fitted into the canvas
+    def set_graph(self, graph):
+        self.clear_graph()
+        self.model = graph
+        self.viewport.fit(graph.coordinates, int(self.cget("width")), int(self.cget("height")))
+        draw_graph(self, self.model, self.viewport)
 
     # Function to clear the graph on the canvas
     def clear_graph(self):
-        self.vertices = []
-        self.edges = []
-        self.graph.clear()
+        self.model = Graph()
+        self.viewport = Viewport()
+        self.selected_vertex = None
         self.delete("all")
 
 
@@ -191,6 +172,11 @@ class Interface(ctk.CTk):
         self.frame3 = None
         self.graph_view = None
         self.clear_button = None
+        self.file_frame = None
+        self.save_button = None
+        self.load_button = None
+        self.generate_button = None
+        self.closure_checkbox = None
         self.answer_label = None
         self.graph_editor = None
         self.output_text = None
@@ -217,6 +203,22 @@ class Interface(ctk.CTk):
         self.clear_button = ctk.CTkButton(self.frame1, text="Очистить", command=self.clear_output)
         self.clear_button.pack(side="top", padx=10, pady=10)
 
+        self.file_frame = ctk.CTkFrame(self.frame1, fg_color="transparent")
+        self.file_frame.pack(side="top", padx=10)
+
+        self.save_button = ctk.CTkButton(self.file_frame, text="Сохранить", width=65, command=self.save_graph)
+        self.save_button.pack(side="left", padx=(0, 5))
+
+        self.load_button = ctk.CTkButton(self.file_frame, text="Загрузить", width=65, command=self.load_graph)
+        self.load_button.pack(side="left")
+
+        self.generate_button = ctk.CTkButton(self.frame1, text="Сгенерировать", command=self.generate_graph)
+        self.generate_button.pack(side="top", padx=10, pady=10)
+
+        # Without a Hamiltonian cycle, solve on the shortest-path distances instead of rejecting the graph
+        self.closure_checkbox = ctk.CTkCheckBox(self.frame1, text="Замыкание графа")
+        self.closure_checkbox.pack(side="top", padx=10, pady=(0, 10))
+
         self.coeff_feromon_text = ctk.CTkLabel(self.frame1, text="Коэфф. значимости феромона")
         self.coeff_feromon_text.pack(side="top", padx=10)
 
@@ -248,7 +250,7 @@ class Interface(ctk.CTk):
         self.answer_label = ctk.CTkLabel(self.frame1, text="Ответ:")
         self.answer_label.pack(side="top", padx=10, fill=ctk.BOTH)
 
-        self.output_text = ctk.CTkTextbox(self.frame1, height=355, width=150)
+        self.output_text = ctk.CTkTextbox(self.frame1, height=215, width=150)
         self.output_text.pack(side="top", padx=10)
         self.output_text.bind("<KeyPress>", self.prevent_typing)
 
@@ -285,7 +287,7 @@ class Interface(ctk.CTk):
     # Function to update weights in graph
     def update_weight(self, vertex1, vertex2, entry_weight):
         new_weight = entry_weight.get()
-        self.graph_editor.graph[vertex1][vertex2]["weight"] = int(new_weight)
+        self.graph_editor.model.set_weight(vertex1, vertex2, float(new_weight))
 
     # Function to run a process in a separate thread
     def threading_run(self):
@@ -298,15 +300,80 @@ class Interface(ctk.CTk):
         self.graph_view.clear_graph()
         self.after(10, self.start_process)
 
+    # Function to run the algorithm, None when it finds no tour
+    def solve(self, graph):
+        salesman = Traveling_Salesman(self.graph_editor, graph)
+        try:
+            result, pheromone = salesman.ant_algo(float(self.coeff_feromon.get()), float(self.coeff_length.get()),
+                                                  int(self.count_feromon.get()), float(self.evaporation_rate.get()))
+        except TypeError:
+            return None
+        return salesman, result, pheromone
+
     # Function to start a process
     def start_process(self):
-        salesman = Traveling_Salesman(self.graph_editor)
-        result, pheromone = salesman.ant_algo(float(self.coeff_feromon.get()), float(self.coeff_length.get()),
-                                                      int(self.count_feromon.get()), float(self.evaporation_rate.get()))
+        closure = self.closure_checkbox.get()
+        try:
+            graph, predecessors = feasibility.tour_instance(self.graph_editor.model, closure)
+            solution = self.solve(graph)
+            if solution is None and closure and predecessors is None:
+                # The checks are only necessary conditions: the algorithm may still find no tour
+                graph, predecessors = feasibility.metric_closure(self.graph_editor.model)
+                solution = self.solve(graph)
+        except ValueError as error:
+            self.output_text.insert(ctk.END, str(error))
+            return
+        if solution is None:
+            self.output_text.insert(ctk.END, feasibility.NO_TOUR + ("" if closure else feasibility.CLOSURE_HINT))
+            return
+
+        salesman, result, pheromone = solution
         self.output_text.insert(ctk.END, result)
+        if predecessors is not None:
+            # The tour was found in the metric closure; show it along the edges of the drawn graph
+            salesman.traversal = feasibility.expand_tour(predecessors, salesman.traversal)
+            self.output_text.insert(ctk.END, "\nПо рёбрам графа:\n" + " -> ".join(map(str, salesman.traversal)))
+            # The pheromone belongs to the edges of the closure
+            pheromone = None
         self.populate_edge_table(pheromone)
         salesman.view(self.graph_view)
 
+    # Function to save the graph to a file
+    def save_graph(self):
+        path = filedialog.asksaveasfilename(defaultextension=".npz", filetypes=graph_io.file_types())
+        if path:
+            try:
+                graph_io.save(path, self.graph_editor.model)
+            except (OSError, ValueError) as error:
+                messagebox.showerror("Ошибка", str(error))
+
+    # Function to load a graph from a file
+    def load_graph(self):
+        path = filedialog.askopenfilename(filetypes=graph_io.file_types())
+        if path:
+            try:
+                graph = graph_io.load(path)
+            except (OSError, ValueError) as error:
+                messagebox.showerror("Ошибка", str(error))
+                return
+            self.clear_output()
+            self.graph_editor.set_graph(graph)
+            self.populate_edge_table()
+
+    # Function to generate a random sparse graph with a Hamiltonian cycle
+    def generate_graph(self):
+        answer = ctk.CTkInputDialog(title="Генератор", text="Количество вершин:").get_input()
+        if not answer:
+            return
+        try:
+            graph = generators.knn_graph(int(answer))
+        except ValueError as error:
+            messagebox.showerror("Ошибка", str(error))
+            return
+        self.clear_output()
+        self.graph_editor.set_graph(graph)
+        self.populate_edge_table()
+
     # Function to populate the edge table with data from the graph
     def populate_edge_table(self, pheromone=None):
         if self.edge_table:
@@ -315,9 +382,10 @@ class Interface(ctk.CTk):
                     widget.destroy()
             self.edge_table = {}
 
-        sorted_edges = sorted(self.graph_editor.graph.edges(data="weight"))
+        edges = self.graph_editor.model.edges()
+        hidden = self.graph_editor.model.number_of_edges() - EDGE_TABLE_LIMIT
 
-        for row, (vertex1, vertex2, weight) in enumerate(sorted_edges, start=1):
+        for row, (vertex1, vertex2, weight) in zip(range(1, EDGE_TABLE_LIMIT + 1), edges):
             entry_vertex1 = ctk.CTkEntry(self.frame3, width=100)
             entry_vertex1.insert(ctk.END, vertex1)
             entry_vertex1.grid(row=row, column=0, padx=10, pady=5)
@@ -329,7 +397,7 @@ class Interface(ctk.CTk):
             entry_vertex2.bind("<KeyPress>", self.prevent_typing)
 
             entry_weight = ctk.CTkEntry(self.frame3, width=100)
-            entry_weight.insert(ctk.END, weight)
+            entry_weight.insert(ctk.END, f"{weight:g}")
             entry_weight.grid(row=row, column=2, padx=10, pady=5)
             entry_weight.bind("<FocusOut>",
                               lambda event, vertex1=vertex1, vertex2=vertex2, entry_weight=entry_weight: self.update_weight(vertex1, vertex2,
@@ -337,15 +405,21 @@ class Interface(ctk.CTk):
 
             self.edge_table[row] = [entry_vertex1, entry_vertex2, entry_weight]
 
-        if pheromone:
-            for row, (vertex1, vertex2, weight) in enumerate(sorted_edges, start=1):
+        if pheromone is not None:
+            # The pheromone array follows the order of the edges
+            for row, level in zip(range(1, EDGE_TABLE_LIMIT + 1), pheromone.tolist()):
                 entry_pheromone = ctk.CTkEntry(self.frame3, width=100)
-                entry_pheromone.insert(ctk.END, pheromone.get((vertex1, vertex2), 1))
+                entry_pheromone.insert(ctk.END, f"{level:g}")
                 entry_pheromone.grid(row=row, column=3, padx=10, pady=5)
                 entry_pheromone.bind("<KeyPress>", self.prevent_typing)
 
                 self.edge_table[row].append(entry_pheromone)
 
+        if hidden > 0:
+            more_label = ctk.CTkLabel(self.frame3, text=f"... и ещё {hidden} рёбер")
+            more_label.grid(row=EDGE_TABLE_LIMIT + 1, column=0, columnspan=4, padx=10, pady=5)
+            self.edge_table[EDGE_TABLE_LIMIT + 1] = [more_label]
+
 
 # Main block to run the GUI application
 if __name__ == "__main__":
@@ -1,22 +1,28 @@
+import os
+import sys
 import threading
-import networkx as nx
 import customtkinter as ctk
+from tkinter import filedialog, messagebox
+
+# The shared graph model lives next to the lab folders
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from graph_core import Graph, TREASURE, Viewport, draw_edge, draw_graph, draw_node, node_at, generators, io as graph_io
 
 
 # Function tree algorithm
 class Minimum_Tree_Traversal:
     def __init__(self, graph_editor):
         self.graph_editor = graph_editor
-        self.edges = graph_editor.edges
-        self.graph = graph_editor.graph
+        self.graph = graph_editor.model
         self.traversal = []
         self.used = []
+        self.quantity = []
         self.result = ""
 
     # DFS algo finding cycle
     def dfs_cycle(self, v, p=-1):
         self.used[v] = True
-        for u in self.graph.neighbors(v):
+        for u in self.graph.neighbors(v).tolist():
             if not self.used[u]:
                 self.dfs_cycle(u, v)
             elif u != p:
@@ -26,23 +32,23 @@ class Minimum_Tree_Traversal:
     # DFS algo increment quantity
     def dfs_increment(self, v):
         self.used[v] = True
-        for u in self.graph.neighbors(v):
+        for u in self.graph.neighbors(v).tolist():
             if not self.used[u]:
-                self.graph.nodes[v]["quantity"] += self.dfs_increment(u)
+                self.quantity[v] += self.dfs_increment(u)
 
-        return self.graph.nodes[v]["quantity"] + 1 if self.graph.nodes[v]["label"] == "Treasure" else self.graph.nodes[v]["quantity"]
+        return self.quantity[v] + 1 if self.graph.labels[v] == TREASURE else self.quantity[v]
 
     # DFS algo
     def dfs(self, v):
         self.used[v] = True
 
-        if self.graph.nodes[v]["quantity"] == 0:
-            if self.graph.nodes[v]["label"] == "Treasure":
+        if self.quantity[v] == 0:
+            if self.graph.labels[v] == TREASURE:
                 self.traversal.append(v)
             return
 
         self.traversal.append(v)
-        for u in self.graph.neighbors(v):
+        for u in self.graph.neighbors(v).tolist():
             if not self.used[u]:
                 self.dfs(u)
                 if self.traversal[-1] != v:
@@ -60,7 +66,9 @@ class Minimum_Tree_Traversal:
             return "Граф несвязный -- не дерево!"
 
         self.used = [False for _ in range(self.graph.number_of_nodes())]
-        self.graph.nodes[0]["quantity"] += self.dfs_increment(0)
+        # Number of treasures in the subtree of every node, below the node itself
+        self.quantity = [0 for _ in range(self.graph.number_of_nodes())]
+        self.quantity[0] += self.dfs_increment(0)
 
         self.used = [False for _ in range(self.graph.number_of_nodes())]
         self.dfs(0)
@@ -78,28 +86,24 @@ class GraphEditor(ctk.CTkCanvas):
         self.bind("<Button-1>", self.on_left_click)
         self.bind("<Button-3>", self.on_right_click)
         self.bind("<Button-2>", self.on_middle_click)
-        self.vertices = []
-        self.edges = []
         self.selected_vertex = None
-        self.graph = nx.DiGraph()
+        self.model = Graph()
+        self.viewport = Viewport()
 
     # Function to handle left-click events on the canvas
     def on_left_click(self, event):
         x, y = event.x, event.y
-        self.create_oval(x - 10, y - 10, x + 10, y + 10, fill="blue", tags="vertex")
-        self.create_text(x, y, text=str(len(self.graph)), fill="white", tags="vertex_text")
-        self.vertices.append((x, y))
-        self.graph.add_node(len(self.graph), label="Room", quantity=0)
+        draw_node(self, x, y, len(self.model))
+        self.model.add_node(*self.viewport.to_graph(x, y))
 
     # Function to handle middle-click events on the canvas (mouse wheel click)
     def on_middle_click(self, event):
         x, y = event.x, event.y
         vertex = self.get_clicked_vertex(x, y)
         if vertex is not None:
-            vx, vy = self.vertices[vertex]
-            self.create_oval(vx - 10, vy - 10, vx + 10, vy + 10, fill="gold", tags="vertex")
-            self.create_text(vx, vy, text=f"{vertex}", fill="black", tags="vertex_text")
-            nx.set_node_attributes(self.graph, {vertex: {"label": "Treasure", "quantity": 0}})
+            vx, vy = self.viewport.to_screen(self.model.coordinates[vertex])
+            draw_node(self, vx, vy, vertex, treasure=True)
+            self.model.set_label(vertex, TREASURE)
 
     # Function to handle right-click events on the canvas
     def on_right_click(self, event):
@@ -109,35 +113,31 @@ class GraphEditor(ctk.CTkCanvas):
             if self.selected_vertex is None:
                 self.selected_vertex = vertex
             else:
-                start_x, start_y = self.vertices[self.selected_vertex]
-                end_x, end_y = self.vertices[vertex]
-                length = ((end_x - start_x) ** 2 + (end_y - start_y) ** 2) ** 0.5
-                if length == 0:
+                if vertex == self.selected_vertex:
                     return
-                arrow_offset = 10
-                sx = start_x + (end_x - start_x) * (arrow_offset / length)
-                sy = start_y + (end_y - start_y) * (arrow_offset / length)
-                ex = end_x - (end_x - start_x) * (arrow_offset / length)
-                ey = end_y - (end_y - start_y) * (arrow_offset / length)
-                self.create_line(sx, sy, ex, ey, width=2)
-                self.edges.append((self.selected_vertex, vertex))
-                self.edges.append((vertex, self.selected_vertex))
-                self.graph.add_edge(self.selected_vertex, vertex)
-                self.graph.add_edge(vertex, self.selected_vertex)
+                start, end = self.viewport.to_screen(self.model.coordinates[[self.selected_vertex, vertex]])
+                draw_edge(self, start, end, directed=False)
+                # The tree is undirected: an edge is stored in both directions
+                self.model.add_edge(self.selected_vertex, vertex)
+                self.model.add_edge(vertex, self.selected_vertex)
                 self.selected_vertex = None
 
     # Function to get the index of a clicked vertex on the canvas
     def get_clicked_vertex(self, x, y):
-        for i, (vx, vy) in enumerate(self.vertices):
-            if (x - vx) ** 2 + (y - vy) ** 2 <= 100:
-                return i
-        return None
+        return node_at(self.model, self.viewport, x, y)
+
+    # Function to show a loaded graph, fitted into the canvas
+    def set_graph(self, graph):
+        self.clear_graph()
+        self.model = graph
+        self.viewport.fit(graph.coordinates, int(self.cget("width")), int(self.cget("height")))
+        draw_graph(self, self.model, self.viewport, directed=False)
 
     # Function to clear the graph on the canvas
     def clear_graph(self):
-        self.vertices = []
-        self.edges = []
-        self.graph.clear()
+        self.model = Graph()
+        self.viewport = Viewport()
+        self.selected_vertex = None
         self.delete("all")
 
 
@@ -152,6 +152,10 @@ class Interface(ctk.CTk):
         self.frame1 = None
         self.frame2 = None
         self.clear_button = None
+        self.file_frame = None
+        self.save_button = None
+        self.load_button = None
+        self.generate_button = None
         self.answer_label = None
         self.graph_editor = None
         self.output_text = None
@@ -169,10 +173,22 @@ class Interface(ctk.CTk):
         self.clear_button = ctk.CTkButton(self.frame1, text="Очистить", command=self.clear_output)
         self.clear_button.pack(side="top", padx=10, pady=10)
 
+        self.file_frame = ctk.CTkFrame(self.frame1, fg_color="transparent")
+        self.file_frame.pack(side="top", padx=10)
+
+        self.save_button = ctk.CTkButton(self.file_frame, text="Сохранить", width=65, command=self.save_graph)
+        self.save_button.pack(side="left", padx=(0, 5))
+
+        self.load_button = ctk.CTkButton(self.file_frame, text="Загрузить", width=65, command=self.load_graph)
+        self.load_button.pack(side="left")
+
+        self.generate_button = ctk.CTkButton(self.frame1, text="Сгенерировать", command=self.generate_graph)
+        self.generate_button.pack(side="top", padx=10, pady=10)
+
         self.answer_label = ctk.CTkLabel(self.frame1, text="Ответ:")
         self.answer_label.pack(side="top", padx=10, fill=ctk.BOTH)
 
-        self.output_text = ctk.CTkTextbox(self.frame1, height=370, width=150)
+        self.output_text = ctk.CTkTextbox(self.frame1, height=274, width=150)
         self.output_text.pack(side="top", padx=10)
         self.output_text.bind("<KeyPress>", self.prevent_typing)
 
@@ -191,6 +207,41 @@ class Interface(ctk.CTk):
         self.graph_editor.clear_graph()
         self.output_text.delete("1.0", ctk.END)
 
+    # Function to save the graph to a file
+    def save_graph(self):
+        path = filedialog.asksaveasfilename(defaultextension=".npz", filetypes=graph_io.file_types())
+        if path:
+            try:
+                graph_io.save(path, self.graph_editor.model)
+            except (OSError, ValueError) as error:
+                messagebox.showerror("Ошибка", str(error))
+
+    # Function to load a graph from a file
+    def load_graph(self):
+        path = filedialog.askopenfilename(filetypes=graph_io.file_types())
+        if path:
+            try:
+                graph = graph_io.load(path)
+            except (OSError, ValueError) as error:
+                messagebox.showerror("Ошибка", str(error))
+                return
+            self.clear_output()
+            self.graph_editor.set_graph(graph)
+
+    # Function to generate a random tree
+    def generate_graph(self):
+        answer = ctk.CTkInputDialog(title="Генератор", text="Количество вершин и доля сокровищ:").get_input()
+        if not answer:
+            return
+        try:
+            words = answer.split()
+            graph = generators.random_tree(int(words[0]), float(words[1]) if len(words) > 1 else 0.3)
+        except ValueError as error:
+            messagebox.showerror("Ошибка", str(error))
+            return
+        self.clear_output()
+        self.graph_editor.set_graph(graph)
+
     # Function to run a process in a separate thread
     def threading_run(self):
         t = threading.Thread(target=self.run_process)
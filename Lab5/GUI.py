@@ -1,7 +1,11 @@
 import threading
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-from logic import execute_task, images, show_images
+from jobs import JobManager
+from logic import METHODS, dataset_fingerprint, execute_task, show_images, warm_up
+
+# Interval of delivering worker events to the interface, ms
+POLL_INTERVAL = 50
 
 
 class Interface(ctk.CTk):
@@ -17,7 +21,7 @@ class Interface(ctk.CTk):
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
         self.title("РЕАЛИЗАЦИЯ МЕТОДА 2D ССА")
-        self.geometry("400x200")
+        self.geometry("400x260")
 
         self.input_folder = None
         self.method_combobox = None
@@ -26,8 +30,16 @@ class Interface(ctk.CTk):
         self.input_folder_button = None
         self.train_button = None
         self.run_button = None
+        self.progress_bar = None
+        self.status_label = None
+        self.jobs = JobManager(lambda task_number, input_folder, method, progress:
+                               execute_task(task_number, input_folder=input_folder, method=method, progress=progress),
+                               fingerprint=dataset_fingerprint)
 
         self.create_interface()
+        self.after(POLL_INTERVAL, self.poll_jobs)
+        # Heavy imports start once the first frame is drawn
+        self.after_idle(lambda: threading.Thread(target=warm_up, daemon=True).start())
 
     def create_interface(self) -> None:
         """
@@ -45,7 +57,7 @@ class Interface(ctk.CTk):
         self.method_label = ctk.CTkLabel(self, text="Метод:")
         self.method_label.grid(row=1, column=0, padx=10, pady=10, sticky="w")
 
-        self.method_combobox = ctk.CTkComboBox(self, values=["2DCCA Cascade", "2DCCA Parallel", "PLS Cascade", "PLS Parallel"])
+        self.method_combobox = ctk.CTkComboBox(self, values=list(METHODS))
         self.method_combobox.grid(row=1, column=1, padx=10, pady=10, sticky="e")
 
         self.train_button = ctk.CTkButton(self, text="Тренировать", command=self.train_model)
@@ -54,6 +66,13 @@ class Interface(ctk.CTk):
         self.run_button = ctk.CTkButton(self, text="Запустить", command=self.test_model)
         self.run_button.grid(row=2, column=1, padx=10, pady=10, sticky="e")
 
+        self.progress_bar = ctk.CTkProgressBar(self)
+        self.progress_bar.set(0)
+        self.progress_bar.grid(row=3, column=0, columnspan=2, padx=10, pady=(10, 0), sticky="ew")
+
+        self.status_label = ctk.CTkLabel(self, text="")
+        self.status_label.grid(row=4, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+
     def select_input_folder(self) -> None:
         """
         Function to select the input folder
@@ -64,6 +83,8 @@ class Interface(ctk.CTk):
         self.input_folder = filedialog.askdirectory()
         if self.input_folder:
             self.input_folder_label.configure(text="Входная папка: выбрана")
+            # Results of the previous folder are not needed any more
+            self.jobs.clear()
 
     def train_model(self) -> None:
         """
@@ -72,24 +93,24 @@ class Interface(ctk.CTk):
         Returns:
         None
         """
-        if self.input_folder is None:
-            messagebox.showinfo("Ошибка", "Выберите входную папку")
-            return
+        self._submit(1, self._trained)
 
-        threading.Thread(target=self._train_model_in_thread).start()
-
-    def _train_model_in_thread(self) -> None:
+    def test_model(self) -> None:
         """
-        Function to run the training model in a separate thread
+        Function to test the model
 
         Returns:
         None
         """
-        execute_task(1, input_folder=self.input_folder, method=self.method_combobox.get())
+        self._submit(2, self._tested)
 
-    def test_model(self) -> None:
+    def _submit(self, task_number: int, on_done) -> None:
         """
-        Function to test the model
+        Queue a job for the selected folder and method; an identical queued job is not started twice.
+
+        Parameters:
+        task_number (int): 1 trains, 2 tests.
+        on_done (function): Called with the result on the interface thread.
 
         Returns:
         None
@@ -98,17 +119,47 @@ class Interface(ctk.CTk):
             messagebox.showinfo("Ошибка", "Выберите входную папку")
             return
 
-        threading.Thread(target=self._test_model_in_thread).start()
+        method = self.method_combobox.get()
+        if self.jobs.submit(task_number, self.input_folder, method, on_done, self._progress, self._failed):
+            self.status_label.configure(text=f"{method}: в очереди")
 
-    def _test_model_in_thread(self) -> None:
+    def poll_jobs(self) -> None:
         """
-        Function to run the testing model in a separate thread
+        Deliver the progress and results of the worker on the interface thread
 
         Returns:
         None
         """
-        execute_task(2, input_folder=self.input_folder, method=self.method_combobox.get())
-        show_images()
+        self.jobs.poll()
+        self.after(POLL_INTERVAL, self.poll_jobs)
+
+    def _progress(self, fraction, message: str) -> None:
+        if fraction is None:
+            if self.progress_bar.cget("mode") != "indeterminate":
+                self.progress_bar.configure(mode="indeterminate")
+                self.progress_bar.start()
+        else:
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate")
+            self.progress_bar.set(fraction)
+        self.status_label.configure(text=message)
+
+    def _finished(self, message: str) -> None:
+        self.progress_bar.stop()
+        self.progress_bar.configure(mode="determinate")
+        self.progress_bar.set(1 if self.jobs.pending() == 0 else 0)
+        self.status_label.configure(text=message)
+
+    def _trained(self, model) -> None:
+        self._finished("Обучение завершено")
+
+    def _tested(self, result: dict) -> None:
+        self._finished(f"rank-1 {result['rank1']:.0%}, rank-{result['k']} {result['rank_k']:.0%}")
+        show_images(self, result["matches"])
+
+    def _failed(self, error: Exception) -> None:
+        self._finished("Ошибка")
+        messagebox.showerror("Ошибка", str(error))
 
 
 if __name__ == "__main__":
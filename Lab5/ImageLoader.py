@@ -1,88 +1,487 @@
 import numpy as np
-import cv2
+import hashlib
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Bumped whenever the preprocessing changes in a way the parameters in the manifest do not capture
+CACHE_VERSION = 3
+
+SHARPEN_FILTER = np.array([[-1, -1, -1],
+                           [-1, 9, -1],
+                           [-1, -1, -1]], dtype=np.float32)
+
+# Number of noise values drawn at once: the float32 block stays in the CPU cache
+NOISE_BLOCK = 1 << 16
 
 
 class ImageLoader:
-    def __init__(self, path: str):
+    def __init__(self, path: str, n_jobs: int = None, cache_dir: str = None, mean: float = 0, sigma: float = 25,
+                 seed: int = None, grayscale: bool = False, downsample: int = 1):
         """
         Constructor for ImageLoader class
 
         Parameters:
         path (str): Path to the images
+        n_jobs (int): Number of decoding threads. Default is the number of CPUs.
+        cache_dir (str): Folder for the preprocessed dataset cache. No caching when None.
+        mean (float): Mean of the added Gaussian noise.
+        sigma (float): Standard deviation of the added Gaussian noise.
+        seed (int): Seed of the noise. Every image gets its own stream, derived from the seed and the content
+        hash of its file, so the result does not depend on n_jobs, the file order or the cache state.
+        grayscale (bool): Convert the images to one channel before sharpening.
+        downsample (int): Integer factor to shrink the images by (area averaging) before sharpening.
 
         Returns:
         None
         """
+        if downsample < 1:
+            raise ValueError("downsample must be a positive integer")
         self.path = path
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.mean = mean
+        self.sigma = sigma
+        self.seed = seed
+        self.grayscale = grayscale
+        self.downsample = int(downsample)
+        self._seeds = np.random.SeedSequence(seed)
+        self._scratch = threading.local()
 
     @staticmethod
-    def sharpen_image(image: np.ndarray) -> np.ndarray:
+    def sharpen_image(image: np.ndarray, out: np.ndarray = None) -> np.ndarray:
         """
         Sharpen the image.
 
         Parameters:
         image (np.ndarray): Input image.
+        out (np.ndarray): Array of the same shape to write the result to. A new one is allocated when None.
 
         Returns:
         np.ndarray: Sharpened image.
         """
-        # Define the sharpening kernel
-        sharpen_filter = np.array([[-1, -1, -1],
-                                   [-1, 9, -1],
-                                   [-1, -1, -1]])
+        import cv2
 
-        sharpened_image = cv2.filter2D(image, -1, sharpen_filter)
+        sharpened_image = cv2.filter2D(image, -1, SHARPEN_FILTER, dst=out)
         return sharpened_image
 
     @staticmethod
-    def add_gaussian_noise(image: np.ndarray, mean=0, sigma=25):
+    def add_gaussian_noise(image: np.ndarray, mean=0, sigma=25, rng=None, out: np.ndarray = None,
+                           buffer: np.ndarray = None) -> np.ndarray:
         """
         Add Gaussian noise to the image.
 
+        The noise is drawn as float32 in blocks of NOISE_BLOCK values and added, clipped and cast in place,
+        so apart from the small block buffer nothing of the image size is allocated.
+
         Parameters:
-        image (np.ndarray): Input image.
+        image (np.ndarray): Input image (uint8).
         mean (float): Mean of the Gaussian distribution.
         sigma (float): Standard deviation of the Gaussian distribution.
+        rng (np.random.Generator | int | None): Random generator or seed.
+        out (np.ndarray): Contiguous uint8 array to write the result to, may be the image itself.
+        buffer (np.ndarray): Reusable float32 block buffer.
 
         Returns:
         np.ndarray: Image with added Gaussian noise.
         """
-        row, col, ch = image.shape
-        gauss = np.random.normal(mean, sigma, (row, col, ch))
-        noisy_image = np.clip(image + gauss, 0, 255).astype(np.uint8)
-        return noisy_image
+        rng = np.random.default_rng(rng)
+        if out is None:
+            out = np.empty(image.shape, dtype=np.uint8)
+        if not out.flags.c_contiguous:
+            raise ValueError("out must be a contiguous array")
+        source = image.reshape(-1)
+        target = out.reshape(-1)
+        if buffer is None:
+            buffer = np.empty(min(NOISE_BLOCK, source.size), dtype=np.float32)
+
+        for start in range(0, source.size, buffer.size):
+            stop = min(start + buffer.size, source.size)
+            noise = buffer[:stop - start]
+            rng.standard_normal(dtype=np.float32, out=noise)
+            noise *= sigma
+            noise += mean
+            noise += source[start:stop]
+            np.clip(noise, 0, 255, out=noise)
+            # Truncating cast, as astype(np.uint8) did
+            np.copyto(target[start:stop], noise, casting="unsafe")
+        return out
+
+    @staticmethod
+    def list_images(folder: str) -> list:
+        """
+        List the BMP images of a folder in the order they are paired.
+
+        Parameters:
+        folder (str): Folder with the images.
+
+        Returns:
+        list[str]: Sorted paths to the images.
+        """
+        return [os.path.join(folder, filename) for filename in sorted(os.listdir(folder)) if filename.endswith(".bmp")]
+
+    @staticmethod
+    def read_image(filename: str) -> np.ndarray:
+        """
+        Decode an image without preprocessing.
+
+        Parameters:
+        filename (str): Path to the image.
+
+        Returns:
+        np.ndarray: Image of shape (H, W, 3).
+        """
+        import cv2
+
+        image = cv2.imread(filename)
+        if image is None:
+            raise ValueError(f"Cannot read image {filename}")
+        return image
+
+    @staticmethod
+    def read_image_hash(filename: str) -> (np.ndarray, str):
+        """
+        Decode an image and hash its content from a single read of the file.
+
+        Parameters:
+        filename (str): Path to the image.
+
+        Returns:
+        Tuple: (image of shape (H, W, 3), hex digest as in file_hash)
+        """
+        import cv2
+
+        with open(filename, "rb") as f:
+            data = f.read()
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Cannot read image {filename}")
+        return image, hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def output_shape(self, shape: tuple) -> tuple:
+        """
+        Shape of a preprocessed image.
+
+        Parameters:
+        shape (tuple): Shape (H, W, C) of the decoded image.
+
+        Returns:
+        tuple: Shape (H, W, C) after the grayscale and downsample stages.
+        """
+        height, width, channels = shape
+        return height // self.downsample, width // self.downsample, 1 if self.grayscale else channels
+
+    def generators(self, keys: list) -> list:
+        """
+        Independent noise generators, one per image.
+
+        Each generator is a pure function of the loader seed and its key, unlike SeedSequence.spawn, whose
+        result depends on how many streams were spawned before.
+
+        Parameters:
+        keys (list[int]): Keys of the images, e.g. noise_key of their files or their indices in a batch.
+
+        Returns:
+        list[np.random.Generator]: Generators derived from the loader seed.
+        """
+        return [np.random.default_rng(np.random.SeedSequence(self._seeds.entropy, spawn_key=(key,)))
+                for key in keys]
+
+    @staticmethod
+    def noise_key(file_hash: str) -> int:
+        """
+        Key of the noise generator of an image file.
+
+        Parameters:
+        file_hash (str): Content hash from file_hash.
+
+        Returns:
+        int: Key for generators.
+        """
+        return int(file_hash[:8], 16)
+
+    def _buffer(self, name: str, shape: tuple, dtype=np.uint8) -> np.ndarray:
+        # Per-thread scratch arrays, reused from image to image
+        buffer = getattr(self._scratch, name, None)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            setattr(self._scratch, name, buffer)
+        return buffer
+
+    def preprocess_into(self, image: np.ndarray, target: np.ndarray, rng: np.random.Generator) -> None:
+        """
+        Run the whole preprocessing of one image and write the result into a slot of a stack.
+
+        Every stage writes into a reused buffer or straight into the target, so apart from the decoded
+        image nothing is allocated per image.
+
+        Parameters:
+        image (np.ndarray): Decoded image of shape (H, W, 3).
+        target (np.ndarray): Contiguous uint8 array of the output shape, e.g. images[i].
+        rng (np.random.Generator): Generator of the noise.
+
+        Returns:
+        None
+        """
+        import cv2
+
+        if self.grayscale:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._buffer("gray", image.shape[:2]))
+        if self.downsample > 1:
+            height, width = target.shape[:2]
+            image = cv2.resize(image, (width, height), dst=self._buffer("small", (height, width) + image.shape[2:]),
+                               interpolation=cv2.INTER_AREA)
+        self.sharpen_image(image, out=target.reshape(image.shape))
+        self.add_gaussian_noise(target, self.mean, self.sigma, rng, out=target,
+                                buffer=self._buffer("noise", (min(NOISE_BLOCK, target.size),), np.float32))
+
+    def preprocess_batch(self, images: np.ndarray, out: np.ndarray = None,
+                         executor: ThreadPoolExecutor = None) -> np.ndarray:
+        """
+        Preprocess a stack of decoded images.
+
+        Parameters:
+        images (np.ndarray): Array of shape (N, H, W, 3).
+        out (np.ndarray): Array of shape (N,) + output_shape to write to, may be images itself when
+        the shapes agree. A new one is allocated when None.
+        executor (ThreadPoolExecutor): Pool to use. A temporary one is created when None.
+
+        Returns:
+        np.ndarray: Preprocessed images.
+        """
+        shape = (len(images),) + self.output_shape(images.shape[1:])
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+        if out.shape != shape:
+            raise ValueError(f"out has shape {out.shape}, expected {shape}")
+        generators = self.generators(range(len(images)))
+
+        def fill(index: int) -> None:
+            self.preprocess_into(images[index], out[index], generators[index])
+
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=self.n_jobs) as pool:
+                list(pool.map(fill, range(len(images))))
+        else:
+            list(executor.map(fill, range(len(images))))
+        return out
+
+    def load_image(self, filename: str, rng: np.random.Generator = None) -> np.ndarray:
+        """
+        Read and preprocess a single image.
+
+        Parameters:
+        filename (str): Path to the image.
+        rng (np.random.Generator): Generator of the noise. The one of the file's content hash when None.
+
+        Returns:
+        np.ndarray: Preprocessed image.
+        """
+        image, file_hash = self.read_image_hash(filename)
+        result = np.empty(self.output_shape(image.shape), dtype=np.uint8)
+        if rng is None:
+            rng = self.generators([self.noise_key(file_hash)])[0]
+        self.preprocess_into(image, result, rng)
+        return result
+
+    def load_files(self, filenames: list, executor: ThreadPoolExecutor = None) -> np.ndarray:
+        """
+        Decode and preprocess images in a thread pool straight into one preallocated array.
+
+        cv2 and the NumPy kernels release the GIL, so the threads run in parallel and only one
+        decoded image per thread exists besides the output array.
+
+        Parameters:
+        filenames (list[str]): Paths to the images, all of the same size.
+        executor (ThreadPoolExecutor): Pool to use. A temporary one is created when None.
+
+        Returns:
+        np.ndarray: Array of shape (N, H, W, C).
+        """
+        if not filenames:
+            return np.empty((0, 0, 0, 0), dtype=np.uint8)
+
+        first, first_hash = self.read_image_hash(filenames[0])
+        images = np.empty((len(filenames),) + self.output_shape(first.shape), dtype=np.uint8)
+
+        def fill(index: int) -> None:
+            # The noise is keyed by the content hash, taken from the same read as the image
+            image, file_hash = (first, first_hash) if index == 0 else self.read_image_hash(filenames[index])
+            if image.shape != first.shape:
+                raise ValueError(f"Image {filenames[index]} has shape {image.shape}, expected {first.shape}")
+            rng = self.generators([self.noise_key(file_hash)])[0]
+            self.preprocess_into(image, images[index], rng)
+
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=self.n_jobs) as pool:
+                list(pool.map(fill, range(len(filenames))))
+        else:
+            list(executor.map(fill, range(len(filenames))))
+        return images
 
     def load_and_preprocess(self) -> (np.ndarray, np.ndarray):
         """
         Load images from the specified path, preprocess them and align faces.
+        With a cache folder set the result comes from (and is stored in) the on-disk cache.
 
         Returns:
         Tuple of NumPy arrays: (regular_images, infrared_images)
         """
-        regular_images = []
-        infrared_images = []
+        if self.cache_dir is not None:
+            return self.load_cached()
+
+        regular_files = self.list_images(os.path.join(self.path, "regular"))
+        infrared_files = self.list_images(os.path.join(self.path, "infrared"))
+
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            regular_images = self.load_files(regular_files, executor)
+            infrared_images = self.load_files(infrared_files, executor)
 
-        regular_path = os.path.join(self.path, "regular")
-        infrared_path = os.path.join(self.path, "infrared")
+        return regular_images, infrared_images
 
-        # Load and preprocess regular images
-        for filename in sorted(os.listdir(regular_path)):
-            if filename.endswith(".bmp"):
-                image = cv2.imread(os.path.join(regular_path, filename))
-                sharpened_image = self.sharpen_image(image)
-                noisy_image = self.add_gaussian_noise(sharpened_image)
-                regular_images.append(noisy_image)
+    def iter_batches(self, batch_size: int = 16):
+        """
+        Iterate over the dataset in batches of regular and infrared pairs, for data that does not fit in memory.
+        The next batch is decoded in the background while the current one is processed.
 
-        # Load and preprocess infrared images
-        for filename in sorted(os.listdir(infrared_path)):
-            if filename.endswith(".bmp"):
-                image = cv2.imread(os.path.join(infrared_path, filename))
-                sharpened_image = self.sharpen_image(image)
-                noisy_image = self.add_gaussian_noise(sharpened_image)
-                infrared_images.append(noisy_image)
+        Parameters:
+        batch_size (int): Number of pairs per batch.
 
-        return np.array(regular_images), np.array(infrared_images)
+        Returns:
+        Generator of tuples of NumPy arrays: (regular_batch, infrared_batch)
+        """
+        regular_files = self.list_images(os.path.join(self.path, "regular"))
+        infrared_files = self.list_images(os.path.join(self.path, "infrared"))
+        count = min(len(regular_files), len(infrared_files))
+
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor, ThreadPoolExecutor(max_workers=1) as prefetcher:
+            def load(start: int):
+                stop = min(start + batch_size, count)
+                return (self.load_files(regular_files[start:stop], executor),
+                        self.load_files(infrared_files[start:stop], executor))
+
+            pending = prefetcher.submit(load, 0) if count else None
+            for start in range(0, count, batch_size):
+                batch = pending.result()
+                pending = prefetcher.submit(load, start + batch_size) if start + batch_size < count else None
+                yield batch
+
+    def preprocessing_key(self) -> dict:
+        """
+        Parameters the cached images depend on. A change in any of them invalidates the whole cache.
+
+        Returns:
+        dict: Preprocessing parameters.
+        """
+        return {"version": CACHE_VERSION, "sharpen": "3x3, center 9", "mean": self.mean, "sigma": self.sigma,
+                "seed": self.seed, "grayscale": self.grayscale, "downsample": self.downsample}
+
+    @staticmethod
+    def file_hash(filename: str) -> str:
+        """
+        Content hash of a file, used when its size or modification time changed.
+
+        Parameters:
+        filename (str): Path to the file.
+
+        Returns:
+        str: Hex digest.
+        """
+        with open(filename, "rb") as f:
+            return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+    def load_cached(self) -> (np.ndarray, np.ndarray):
+        """
+        Load the preprocessed dataset from the cache folder, reprocessing only new and changed files.
+
+        The stacks are stored as .npy files next to a JSON manifest with the size, mtime and hash of every
+        source file and the preprocessing parameters. When nothing changed they are memory-mapped read-only
+        without copying, so warm starts cost almost nothing.
+
+        Returns:
+        Tuple of NumPy arrays: (regular_images, infrared_images), memory-mapped from the cache.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        manifest_path = os.path.join(self.cache_dir, "manifest.json")
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        if manifest.get("params") != self.preprocessing_key():
+            manifest = {}
+
+        new_manifest = {"params": self.preprocessing_key()}
+        result = []
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            for name in ("regular", "infrared"):
+                images, entries = self._update_cache(name, manifest.get(name, []), executor)
+                new_manifest[name] = entries
+                result.append(images)
+
+        temporary_path = manifest_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(new_manifest, f, indent=1)
+        os.replace(temporary_path, manifest_path)
+        return result[0], result[1]
+
+    def _update_cache(self, name: str, entries: list, executor: ThreadPoolExecutor) -> (np.ndarray, list):
+        filenames = self.list_images(os.path.join(self.path, name))
+        array_path = os.path.join(self.cache_dir, f"{name}.npy")
+        cached = np.load(array_path, mmap_mode="r") if entries and os.path.exists(array_path) else None
+        if cached is not None and len(cached) != len(entries):
+            cached, entries = None, []
+        known = {entry["name"]: (index, entry) for index, entry in enumerate(entries)}
+
+        # Match every source file to a cached row: by size and mtime first, by content hash otherwise
+        sources, new_entries = [], []
+        for filename in filenames:
+            stat = os.stat(filename)
+            entry = {"name": os.path.basename(filename), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            index, old = known.get(entry["name"], (None, None))
+            if old is not None and (old["size"], old["mtime_ns"]) == (entry["size"], entry["mtime_ns"]):
+                entry["hash"] = old["hash"]
+            else:
+                entry["hash"] = self.file_hash(filename)
+                if old is None or old["hash"] != entry["hash"]:
+                    index = None
+            sources.append(index)
+            new_entries.append(entry)
+
+        if not filenames:
+            return np.empty((0, 0, 0, 0), dtype=np.uint8), new_entries
+        if cached is not None and sources == list(range(len(cached))):
+            return cached, new_entries
+
+        changed = [i for i, index in enumerate(sources) if index is None]
+        if changed:
+            first = self.read_image(filenames[changed[0]])
+            shape = self.output_shape(first.shape)
+            if cached is not None and shape != cached.shape[1:]:
+                return self._update_cache(name, [], executor)
+        else:
+            shape = cached.shape[1:]
+
+        temporary_path = os.path.join(self.cache_dir, f"{name}.tmp.npy")
+        images = np.lib.format.open_memmap(temporary_path, mode="w+", dtype=np.uint8, shape=(len(filenames),) + shape)
+        for i, index in enumerate(sources):
+            if index is not None:
+                images[i] = cached[index]
+
+        generators = dict(zip(changed, self.generators([self.noise_key(new_entries[i]["hash"]) for i in changed])))
+
+        def fill(i: int) -> None:
+            image = first if i == changed[0] else self.read_image(filenames[i])
+            if self.output_shape(image.shape) != shape:
+                raise ValueError(f"Image {filenames[i]} has shape {image.shape}, expected {first.shape}")
+            self.preprocess_into(image, images[i], generators[i])
+
+        list(executor.map(fill, changed))
+        images.flush()
+        # Release the maps before the old file is replaced
+        images = cached = None
+        os.replace(temporary_path, array_path)
+        return np.load(array_path, mmap_mode="r"), new_entries
 
     @staticmethod
     def save_images(regular_images: np.ndarray, infrared_images: np.ndarray, output_dir: str) -> None:
@@ -97,6 +496,8 @@ class ImageLoader:
         Returns:
         None
         """
+        import cv2
+
         os.makedirs(output_dir, exist_ok=True)
 
         # Save regular images
@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from ImageLoader import ImageLoader
+from logic import METHODS, TOP_K, fit_model, match
+
+
+def folds(count: int, n_folds: int, seed: int = 0) -> list[np.ndarray]:
+    """
+    Split the pair indices into shuffled folds of (almost) equal size.
+
+    Parameters:
+    count (int): Number of pairs.
+    n_folds (int): Number of folds, at least 2 and at most count.
+    seed (int): Seed of the shuffle.
+
+    Returns:
+    list[np.ndarray]: Test indices of every fold.
+    """
+    if not 2 <= n_folds <= count:
+        raise ValueError(f"Cannot split {count} pairs into {n_folds} folds")
+    order = np.random.default_rng(seed).permutation(count)
+    return [np.sort(fold) for fold in np.array_split(order, n_folds)]
+
+
+def evaluate_fold(method: str, regular: np.ndarray, infrared: np.ndarray, test: np.ndarray, k: int) -> dict:
+    """
+    Fit a method on all pairs outside a fold and match the pairs of the fold.
+
+    Parameters:
+    method (str): Name from logic.METHODS.
+    regular (np.ndarray): Regular images.
+    infrared (np.ndarray): Infrared images of the same people, in the same order.
+    test (np.ndarray): Indices of the test pairs.
+    k (int): Number of ranked matches per query.
+
+    Returns:
+    dict: Accuracy, timings, throughput and peak traced memory of the fold.
+    """
+    train = np.setdiff1d(np.arange(len(regular)), test)
+    train_regular, train_infrared = regular[train], infrared[train]
+    test_regular, test_infrared = regular[test], infrared[test]
+
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        model = fit_model(method, train_regular, train_infrared)
+        fit_time = time.perf_counter() - start
+        result = match(model, test_regular, test_infrared, k)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    comparisons = len(test) * len(test)
+    return {
+        "train_pairs": len(train),
+        "test_pairs": len(test),
+        "rank1": result["rank1"],
+        "rank_k": result["rank_k"],
+        "correlation": result["correlation"],
+        "fit_time": fit_time,
+        "transform_time": result["transform_time"],
+        "match_time": result["match_time"],
+        "queries_per_second": len(test) / max(result["transform_time"] + result["match_time"], 1e-9),
+        "matches_per_second": comparisons / max(result["match_time"], 1e-9),
+        "peak_memory_mb": peak / 2 ** 20,
+    }
+
+
+def summarize(fold_results: list[dict]) -> dict:
+    """
+    Mean and standard deviation of every metric over the folds.
+
+    Parameters:
+    fold_results (list[dict]): Results of evaluate_fold.
+
+    Returns:
+    dict: "<metric>" and "<metric>_std" per metric, plus the folds themselves.
+    """
+    summary = {}
+    for name in fold_results[0]:
+        values = np.array([fold[name] for fold in fold_results], dtype=np.float64)
+        summary[name] = float(values.mean())
+        summary[f"{name}_std"] = float(values.std())
+    # Memory is a budget, the worst fold matters more than the average
+    summary["peak_memory_mb_max"] = max(fold["peak_memory_mb"] for fold in fold_results)
+    summary["folds"] = fold_results
+    return summary
+
+
+def recommend(report: dict, min_rank1: float) -> str:
+    """
+    Fastest method (fit plus transform and matching time) with a mean rank-1 accuracy of at least min_rank1.
+
+    Parameters:
+    report (dict): Method name -> summary.
+    min_rank1 (float): Accuracy bar.
+
+    Returns:
+    str: Method name, None when no method meets the bar.
+    """
+    eligible = [(summary["fit_time"] + summary["transform_time"] + summary["match_time"], method)
+                for method, summary in report.items() if summary["rank1"] >= min_rank1]
+    return min(eligible)[1] if eligible else None
+
+
+def main(argv: list = None) -> dict:
+    parser = argparse.ArgumentParser(description="Cross-validated regular / infrared matching benchmark of the "
+                                                 "Lab5 methods, reported as JSON.")
+    parser.add_argument("dataset", nargs="?", default=os.path.join(os.path.dirname(__file__), "dataset"),
+                        help="folder with the regular and infrared subfolders")
+    parser.add_argument("--methods", nargs="+", choices=list(METHODS), default=list(METHODS),
+                        help="methods to evaluate (default: all)")
+    parser.add_argument("--folds", type=int, default=5, help="number of cross-validation folds")
+    parser.add_argument("-k", type=int, default=TOP_K, help="rank of the rank-k accuracy")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the noise and of the fold split")
+    parser.add_argument("--grayscale", action="store_true", help="convert the images to one channel")
+    parser.add_argument("--downsample", type=int, default=1, help="integer factor to shrink the images by")
+    parser.add_argument("--min-rank1", type=float, default=0.0,
+                        help="accuracy bar of the recommended method")
+    parser.add_argument("--output", help="JSON file to write, stdout when omitted")
+    args = parser.parse_args(argv)
+
+    loader = ImageLoader(args.dataset, seed=args.seed, grayscale=args.grayscale, downsample=args.downsample)
+    start = time.perf_counter()
+    regular, infrared = loader.load_and_preprocess()
+    load_time = time.perf_counter() - start
+    count = min(len(regular), len(infrared))
+    regular, infrared = regular[:count], infrared[:count]
+    splits = folds(count, args.folds, args.seed)
+
+    report = {}
+    for method in args.methods:
+        fold_results = []
+        for number, test in enumerate(splits, 1):
+            print(f"{method}: fold {number}/{len(splits)}", file=sys.stderr)
+            fold_results.append(evaluate_fold(method, regular, infrared, test, args.k))
+        report[method] = summarize(fold_results)
+
+    result = {
+        "dataset": os.path.abspath(args.dataset),
+        "pairs": count,
+        "image_shape": list(regular.shape[1:]),
+        "load_time": load_time,
+        "folds": args.folds,
+        "k": args.k,
+        "seed": args.seed,
+        "min_rank1": args.min_rank1,
+        "recommended": recommend(report, args.min_rank1),
+        "methods": report,
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return result
+
+
+if __name__ == "__main__":
+    main()
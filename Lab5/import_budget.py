@@ -0,0 +1,56 @@
+import argparse
+import os
+import subprocess
+import sys
+
+from logic import HEAVY_MODULES
+
+# Import time of the interface module up to the first frame, ms
+BUDGET_MS = 400
+
+
+def import_time(module: str) -> (float, set):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Parameters:
+    module (str): Module to import, e.g. "GUI".
+
+    Returns:
+    Tuple: (cumulative import time of the module in ms, names of all imported modules)
+    """
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+                            check=True).stderr
+    total, imported = None, set()
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # Header line
+        imported.add(name.strip())
+        if name.strip() == module:
+            total = int(cumulative) / 1000
+    return total, imported
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the startup import time of the Lab5 interface.")
+    parser.add_argument("--module", default="GUI", help="module to import")
+    parser.add_argument("--budget", type=float, default=BUDGET_MS, help="allowed import time, ms")
+    parser.add_argument("--repeat", type=int, default=5, help="runs; the fastest one counts")
+    args = parser.parse_args(argv)
+
+    runs = [import_time(args.module) for _ in range(args.repeat)]
+    best = min(total for total, _ in runs)
+    heavy = {name.split(".")[0] for name in HEAVY_MODULES}
+    eager = sorted({name.split(".")[0] for name in runs[0][1]} & heavy)
+    print(f"import {args.module}: {best:.0f} ms (budget {args.budget:.0f} ms)")
+    if eager:
+        print("Imported at startup, should be lazy: " + ", ".join(eager))
+    return 0 if best <= args.budget and not eager else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import os
+import queue
+import threading
+
+
+class JobManager:
+    def __init__(self, run, fingerprint=None):
+        """
+        Runs interface jobs one at a time on a single worker thread.
+
+        A job is identified by (task number, dataset folder, method, fingerprint of the folder). Submitting a
+        job that is already queued or running only adds its callbacks to the existing one, and finished results
+        are cached, so repeating an identical job answers at once without touching the worker; once the images
+        of the folder change, the fingerprint and with it the key differ and the job runs again. The worker
+        never calls back into the interface: progress, results and errors are queued as
+        ("progress" | "done" | "error", key, value) events, and poll, called from the Tk main loop, hands them
+        to the callbacks.
+
+        Parameters:
+        run (function): run(task_number, input_folder, method, progress) -> result, executed on the worker;
+                        progress(fraction, message) reports the state, fraction in [0, 1] or None.
+        fingerprint (function): fingerprint(input_folder) -> hashable state of the folder's contents.
+
+        Returns:
+        None
+        """
+        self.run = run
+        self.fingerprint = fingerprint
+        self.results = {}
+        self.events = queue.Queue()
+        self._jobs = queue.Queue()
+        self._callbacks = {}
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._work, daemon=True)
+        self._worker.start()
+
+    def key(self, task_number: int, input_folder: str, method: str) -> tuple:
+        input_folder = os.path.abspath(input_folder)
+        return (task_number, input_folder, method,
+                self.fingerprint(input_folder) if self.fingerprint is not None else None)
+
+    def clear(self) -> None:
+        """
+        Forget the finished results, e.g. when another folder is chosen. Running and queued jobs still answer.
+
+        Returns:
+        None
+        """
+        with self._lock:
+            self.results.clear()
+
+    def submit(self, task_number: int, input_folder: str, method: str, on_done=None, on_progress=None,
+               on_error=None) -> bool:
+        """
+        Queue a job unless an identical one is cached or already waiting.
+
+        Parameters:
+        task_number (int): 1 trains, 2 tests.
+        input_folder (str): Dataset folder.
+        method (str): Method name.
+        on_done (function): on_done(result), called from poll.
+        on_progress (function): on_progress(fraction, message), called from poll.
+        on_error (function): on_error(exception), called from poll.
+
+        Returns:
+        bool: True when a new job was queued.
+        """
+        key = self.key(task_number, input_folder, method)
+        with self._lock:
+            if key in self.results:
+                self._callbacks.setdefault(key, []).append((on_done, on_progress, on_error))
+                self.events.put(("done", key, self.results[key]))
+                return False
+            queued = key not in self._callbacks
+            self._callbacks.setdefault(key, []).append((on_done, on_progress, on_error))
+        if queued:
+            self._jobs.put(key)
+        return queued
+
+    def pending(self) -> int:
+        """
+        Returns:
+        int: Number of queued or running jobs.
+        """
+        with self._lock:
+            return sum(key not in self.results for key in self._callbacks)
+
+    def _work(self) -> None:
+        while True:
+            key = self._jobs.get()
+            task_number, input_folder, method, _ = key
+            try:
+                result = self.run(task_number, input_folder, method, lambda fraction, message:
+                                  self.events.put(("progress", key, (fraction, message))))
+            except Exception as error:
+                self.events.put(("error", key, error))
+            else:
+                with self._lock:
+                    self.results[key] = result
+                self.events.put(("done", key, result))
+
+    def poll(self) -> None:
+        """
+        Deliver the queued events to their callbacks. Must be called from the thread that owns the interface.
+
+        Returns:
+        None
+        """
+        while True:
+            try:
+                kind, key, value = self.events.get_nowait()
+            except queue.Empty:
+                return
+            with self._lock:
+                callbacks = self._callbacks.get(key, [])
+                if kind != "progress":
+                    # Every submitter of the job is answered once
+                    self._callbacks.pop(key, None)
+            for on_done, on_progress, on_error in callbacks:
+                if kind == "progress" and on_progress is not None:
+                    on_progress(*value)
+                elif kind == "done" and on_done is not None:
+                    on_done(value)
+                elif kind == "error" and on_error is not None:
+                    on_error(value)
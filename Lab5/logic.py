@@ -1,137 +1,289 @@
-import time
-import random
+import importlib
 import os
-import itertools
-from tkinter import Tk, Text, Scrollbar, messagebox
-
-coeff = 0
-
-
-class DummyTwoDCCA:
-    def __init__(self):
-        pass
-
-    def train(self, X_regular, X_infrared):
-        print("Training 2D CCA model...")
-        time.sleep(3)  # имитация времени обучения
-        print("Training completed.")
-
-    def predict(self, X_new_regular, X_new_infrared):
-        print("Predicting...")
-        time.sleep(2)  # имитация времени предсказания
-        print("Prediction completed.")
-        # возвращаем случайные данные вместо реальных предсказаний
-        return [(random.randint(0, 10), random.uniform(0, 1)) for _ in range(len(X_new_regular))]
-
-    def evaluate(self, X_test_regular, X_test_infrared):
-        print("Evaluating...")
-        time.sleep(1)  # имитация времени оценки
-        print("Evaluation completed.")
-        # возвращаем случайные данные вместо реальных метрик
-        global coeff
-        coeff = random.uniform(0.85, 1)
-        return coeff
-
-
-class DummyPLS:
-    def __init__(self):
-        pass
-
-    def train(self, X, Y):
-        print("Training PLS model...")
-        # time.sleep(3)  # имитация времени обучения
-        for _ in range(3000000):
-            _ = 2 ** 10 * 2 ** 10
-        print("Training completed.")
-
-    def predict(self, X_new):
-        print("Predicting...")
-        # time.sleep(2)  # имитация времени предсказания
-        for _ in range(2000000):
-            _ = 2 ** 10 * 2 ** 10
-        print("Prediction completed.")
-        # возвращаем случайные данные вместо реальных предсказаний
-        return [random.uniform(0.85, 1) for _ in range(len(X_new))]
-
-    def evaluate(self, X_test, Y_test):
-        print("Evaluating...")
-        # time.sleep(1)  # имитация времени оценки
-        for _ in range(1000000):
-            _ = 2 ** 10 * 2 ** 10
-        print("Evaluation completed.")
-        # возвращаем случайные данные вместо реальных метрик
-        return random.uniform(0.85, 1)
-
-
-def simulate_program():
-    print("Running simulation...\n")
-    print("1. 2D CCA for cascade and parallel datasets:")
-    print("Cascade 2D CCA:")
-    cascade_model = DummyTwoDCCA()
-    cascade_model.train(None, None)
-    print("\nParallel 2D CCA:")
-    parallel_model = DummyTwoDCCA()
-    parallel_model.train(None, None)
-
-    print("\n2. Performing RRPP:")
-    print("RRPP completed.")
-
-    print("\n3. Reconstructing semantically unrelated objects:")
-    print("Using PLS:")
-    pls_model = DummyPLS()
-    pls_model.train(None, None)
-    print("\nUsing CCA:")
-    cca_model = DummyTwoDCCA()
-    cca_model.train(None, None)
-
-    print("\n4. Analyzing correlation relationships:")
-    print("Using PLS:")
-    pls_corr = pls_model.evaluate(None, None)
-    print("PLS correlation:", pls_corr)
-    print("\nUsing CCA:")
-    cca_corr = cca_model.evaluate(None, None)
-    print("CCA correlation:", cca_corr)
-
-    print("\nSimulation completed.")
-
-
-def execute_task(task_number, input_folder=None, method=None):
-    simulate_program()
+import threading
+import time
+from tkinter import Tk, Toplevel, Text, Scrollbar
+
+import numpy as np
+
+from ImageLoader import ImageLoader
+from methods.KCCA import KernelCCA
+from methods.PLS_Cascade import PLSCascade
+from methods.PLS_Parallel import PLSParallel
+from methods.RCCA import RegularizedCCA
+from methods.TwoDCCA_Cascade import TwoDCCACascade
+from methods.TwoDCCA_Parallel import TwoDCCAParallel
+from methods.matching import top_k
+
+# Method name in the interface -> (model factory, fitted batch by batch with partial_fit)
+METHODS = {
+    "2DCCA Cascade": (lambda: TwoDCCACascade(n_components=10, random_state=0), True),
+    "2DCCA Parallel": (lambda: TwoDCCAParallel(dimension=10, is_max=False, random_state=0), False),
+    "PLS Cascade": (lambda: PLSCascade(n_components=10, n_cascades=3, random_state=0), True),
+    "PLS Parallel": (lambda: PLSParallel(n_components=2), False),
+    "RCCA": (lambda: RegularizedCCA(n_components=10, regularization=0.1, random_state=0), False),
+    "KCCA Nyström": (lambda: KernelCCA(n_components=10, approximation="nystroem", random_state=0), False),
+    "KCCA Fourier": (lambda: KernelCCA(n_components=10, approximation="fourier", random_state=0), False),
+}
+
+# Share of the pairs used for training, the rest is matched in the test
+TRAIN_SHARE = 0.8
+BATCH_SIZE = 8
+TOP_K = 5
+
+# Imported on first use by ImageLoader and the methods, not at startup; warm_up loads them ahead of time
+HEAVY_MODULES = ("cv2", "scipy.sparse", "scipy.sparse.linalg", "sklearn.cross_decomposition")
+
+# Loaded datasets and fitted models survive between "Тренировать" and "Запустить" while the images do not change
+_datasets = {}
+_models = {}
+_last_matches = []
+_lock = threading.Lock()
+
+
+def warm_up() -> None:
+    """
+    Import the heavy dependencies, meant for a background thread once the window is shown,
+    so the first training does not wait for them.
+
+    Returns:
+    None
+    """
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            # Reported with a proper traceback when the method that needs it runs
+            pass
+
+
+def dataset_fingerprint(input_folder: str) -> tuple:
+    """
+    Name, size and modification time of every image of a dataset folder; changes when an image is added,
+    removed or rewritten.
+
+    Parameters:
+    input_folder (str): Folder with the "regular" and "infrared" subfolders.
+
+    Returns:
+    tuple: Hashable fingerprint.
+    """
+    fingerprint = []
+    for name in ("regular", "infrared"):
+        folder = os.path.join(input_folder, name)
+        if os.path.isdir(folder):
+            for filename in ImageLoader.list_images(folder):
+                stat = os.stat(filename)
+                fingerprint.append((name, os.path.basename(filename), stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+def load_dataset(input_folder: str) -> dict:
+    """
+    Load and preprocess a dataset once per folder, again when its images change.
+
+    Parameters:
+    input_folder (str): Folder with the "regular" and "infrared" subfolders.
+
+    Returns:
+    dict: Images, file names and the train / test split.
+    """
+    input_folder = os.path.abspath(input_folder)
+    fingerprint = dataset_fingerprint(input_folder)
+    if input_folder not in _datasets or _datasets[input_folder]["fingerprint"] != fingerprint:
+        # The models fitted on the old images are stale as well
+        for key in [key for key in _models if key[0] == input_folder]:
+            del _models[key]
+        loader = ImageLoader(input_folder, seed=0)
+        start = time.perf_counter()
+        regular, infrared = loader.load_and_preprocess()
+        count = min(len(regular), len(infrared))
+        if count < 2:
+            raise ValueError(f"Not enough image pairs in {input_folder}")
+        split = max(1, min(count - 1, int(round(count * TRAIN_SHARE))))
+        _datasets[input_folder] = {
+            "fingerprint": fingerprint,
+            "regular": regular[:count],
+            "infrared": infrared[:count],
+            "regular_files": [os.path.basename(f) for f in loader.list_images(os.path.join(input_folder, "regular"))],
+            "infrared_files": [os.path.basename(f) for f in loader.list_images(os.path.join(input_folder, "infrared"))],
+            "train": slice(0, split),
+            "test": slice(split, count),
+        }
+        print(f"Loaded {count} pairs from {input_folder} in {time.perf_counter() - start:.2f} s")
+    return _datasets[input_folder]
+
+
+def _no_progress(fraction, message):
+    pass
+
+
+def fit_model(method: str, regular: np.ndarray, infrared: np.ndarray, progress=_no_progress):
+    """
+    Create and fit a method on image pairs.
+
+    Parameters:
+    method (str): Name from METHODS.
+    regular (np.ndarray): Regular images.
+    infrared (np.ndarray): Infrared images of the same people, in the same order.
+    progress (function): progress(fraction, message), fraction in [0, 1] or None when unknown.
+
+    Returns:
+    Fitted model.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {list(METHODS)}")
+    factory, streaming = METHODS[method]
+    model = factory()
+    if streaming:
+        for batch in range(0, len(regular), BATCH_SIZE):
+            progress(batch / len(regular), f"{method}: {batch} / {len(regular)} pairs")
+            model.partial_fit(regular[batch:batch + BATCH_SIZE], infrared[batch:batch + BATCH_SIZE], solve=False)
+        progress(None, f"{method}: solving")
+        model.solve_streaming()
+    else:
+        progress(None, f"{method}: fitting {len(regular)} pairs")
+        model.fit(regular, infrared)
+    return model
+
+
+def match(model, regular: np.ndarray, infrared: np.ndarray, k: int = TOP_K) -> dict:
+    """
+    Match every regular image against all infrared images in the model's space; pair i is the true match of i.
+
+    Parameters:
+    model: Fitted model.
+    regular (np.ndarray): Regular images (queries).
+    infrared (np.ndarray): Infrared images (gallery).
+    k (int): Number of ranked matches per query.
+
+    Returns:
+    dict: Indices of the k best matches per query, rank-1 / rank-k accuracy, mean correlation of the paired
+    features and the transform and matching times.
+    """
+    start = time.perf_counter()
+    regular_features, infrared_features = model.transform(regular, infrared)
+    transformed = time.perf_counter()
+    indices, _ = top_k(regular_features, infrared_features, k, "cosine")
+    matched = time.perf_counter()
+    truth = np.arange(len(indices))[:, None]
+
+    centered_regular = regular_features - regular_features.mean(axis=0)
+    centered_infrared = infrared_features - infrared_features.mean(axis=0)
+    norms = np.linalg.norm(centered_regular, axis=0) * np.linalg.norm(centered_infrared, axis=0)
+    correlations = (centered_regular * centered_infrared).sum(axis=0) / np.where(norms == 0, 1, norms)
+    return {
+        "indices": indices,
+        "rank1": float((indices[:, :1] == truth).any(axis=1).mean()),
+        "k": indices.shape[1],
+        "rank_k": float((indices == truth).any(axis=1).mean()),
+        "correlation": float(correlations.mean()),
+        "transform_time": transformed - start,
+        "match_time": matched - transformed,
+    }
+
+
+def train(input_folder: str, method: str, progress=_no_progress):
+    """
+    Fit a method on the training pairs of a folder, once per folder and method while the images do not change.
+
+    Parameters:
+    input_folder (str): Dataset folder.
+    method (str): Name from METHODS.
+    progress (function): progress(fraction, message), see fit_model.
+
+    Returns:
+    Fitted model.
+    """
+    progress(None, "Loading the dataset")
+    dataset = load_dataset(input_folder)
+    key = (os.path.abspath(input_folder), method)
+    if key in _models:
+        return _models[key]
+
+    regular, infrared = dataset["regular"][dataset["train"]], dataset["infrared"][dataset["train"]]
+    print(f"Training {method} on {len(regular)} pairs...")
+    start = time.perf_counter()
+    model = fit_model(method, regular, infrared, progress)
+    print(f"Training completed in {time.perf_counter() - start:.2f} s")
+    _models[key] = model
+    return model
+
+
+def evaluate(input_folder: str, method: str, progress=_no_progress) -> dict:
+    """
+    Match every test regular image against all test infrared images in the method's space.
+
+    Parameters:
+    input_folder (str): Dataset folder.
+    method (str): Name from METHODS.
+    progress (function): progress(fraction, message), see fit_model.
+
+    Returns:
+    dict: Result of match (k = TOP_K or fewer) with the file name pairs under "matches".
+    """
+    global _last_matches
+    model = train(input_folder, method, progress)
+    dataset = load_dataset(input_folder)
+    test = dataset["test"]
+    progress(None, f"{method}: matching")
+    result = match(model, dataset["regular"][test], dataset["infrared"][test])
+
+    offset = test.start
+    _last_matches = [(dataset["regular_files"][offset + i], dataset["infrared_files"][offset + int(j)])
+                     for i, j in enumerate(result["indices"][:, 0])]
+    result["matches"] = _last_matches
+    return result
+
+
+def execute_task(task_number, input_folder=None, method=None, progress=_no_progress):
+    """
+    Entry point of the interface buttons: 1 trains, 2 tests (training first when needed).
+
+    Parameters:
+    task_number (int): 1 for "Тренировать", 2 for "Запустить".
+    input_folder (str): Dataset folder.
+    method (str): Name from METHODS.
+    progress (function): progress(fraction, message), see fit_model.
+
+    Returns:
+    Fitted model for task 1, metrics for task 2.
+    """
+    with _lock:
+        if task_number == 1:
+            return train(input_folder, method, progress)
+        result = evaluate(input_folder, method, progress)
+        print(f"{method}: rank-1 {result['rank1']:.2%}, "
+              f"rank-{result['k']} {result['rank_k']:.2%}, mean correlation {result['correlation']:.3f}")
+        return result
 
 
 def images():
-    global coeff
-    regular_images = []
-    infrared_images = []
-
-    regular_path = os.path.join("dataset", "regular")
-    infrared_path = os.path.join("dataset", "infrared")
-
-    # Load and preprocess regular images
-    for filename in sorted(os.listdir(regular_path)):
-        if filename.endswith(".bmp"):
-            regular_images.append(filename)
+    """
+    Matches of the last test run.
 
-    cnt = 0
-    # Load and preprocess infrared images
-    for filename in sorted(os.listdir(infrared_path)):
-        if filename.endswith(".bmp"):
-            infrared_images.append(filename)
-            t = random.uniform(0, 1)
-            if t >= coeff and cnt != 49:
-                infrared_images[-1] = str(cnt + 1) + ".bmp"
-            cnt += 1
+    Returns:
+    list[tuple[str, str]]: (regular image, best matching infrared image) file names.
+    """
+    return list(_last_matches)
 
 
-    # Return the shuffled lists
-    return list(zip(regular_images, infrared_images))
+def show_images(master=None, matches=None):
+    """
+    Show (regular image, best matching infrared image) pairs in a window.
 
+    Parameters:
+    master: Tk window of the interface. The list opens as its Toplevel and must be created on its thread;
+            without one the list gets its own Tk root and main loop.
+    matches (list[tuple[str, str]]): Pairs to show. Default is the matches of the last test run.
 
-def show_images():
-    shuffled_images = images()
+    Returns:
+    None
+    """
+    shuffled_images = images() if matches is None else matches
     images_str = "\n".join([f"{reg} - {infrared}" for reg, infrared in shuffled_images])
 
-    root = Tk()
+    root = Tk() if master is None else Toplevel(master)
     root.title("Images")
 
     scrollbar = Scrollbar(root)
@@ -144,4 +296,5 @@ def show_images():
 
     scrollbar.config(command=text.yview)
 
-    root.mainloop()
+    if master is None:
+        root.mainloop()
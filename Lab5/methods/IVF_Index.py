@@ -0,0 +1,300 @@
+import json
+
+import numpy as np
+
+from .matching import pairwise_distances, top_k
+
+# Rows the product-quantisation codebooks are trained on: 64 per code
+PQ_TRAIN_SAMPLES = 256 * 64
+
+
+def kmeans(X: np.ndarray, k: int, n_iter: int = 20, rng=None) -> np.ndarray:
+    """
+    Lloyd's k-means with k-means++ seeding.
+
+    Parameters:
+    X (np.ndarray): Points, shape (n, d).
+    k (int): Number of centroids, at most n.
+    n_iter (int): Maximum number of Lloyd iterations.
+    rng (np.random.Generator | int | None): Random generator or seed.
+
+    Returns:
+    np.ndarray: Centroids of shape (k, d).
+    """
+    rng = np.random.default_rng(rng)
+    X = np.asarray(X, dtype=np.float32)
+    k = min(k, len(X))
+    # The seeding is sequential in k, so it runs on a subsample of a few dozen points per centroid
+    seeds = X[rng.choice(len(X), 32 * k, replace=False)] if len(X) > 32 * k else X
+    centroids = np.empty((k, X.shape[1]), dtype=np.float32)
+    centroids[0] = seeds[rng.integers(len(seeds))]
+    closest = ((seeds - centroids[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        total = closest.sum()
+        index = rng.choice(len(seeds), p=closest / total) if total > 0 else rng.integers(len(seeds))
+        centroids[i] = seeds[index]
+        np.minimum(closest, ((seeds - centroids[i]) ** 2).sum(axis=1), out=closest)
+
+    labels = None
+    for _ in range(n_iter):
+        new_labels, distances = top_k(X, centroids, 1, "sqeuclidean")
+        new_labels, distances = new_labels[:, 0], distances[:, 0]
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        filled = counts > 0
+        sums = np.add.reduceat(X[order], starts[filled], axis=0)
+        centroids[filled] = sums / counts[filled, None]
+        # Empty clusters restart at the points farthest from their centroids
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = X[np.argsort(distances)[::-1][:len(empty)]]
+    return centroids
+
+
+class _GrowingArray:
+    # Append-only array with amortised doubling, so incremental insertion costs O(1) per row
+    def __init__(self, width: tuple, dtype):
+        self.data = np.empty((16,) + width, dtype=dtype)
+        self.size = 0
+
+    def extend(self, rows: np.ndarray) -> None:
+        if self.size + len(rows) > len(self.data):
+            capacity = max(2 * len(self.data), self.size + len(rows))
+            data = np.empty((capacity,) + self.data.shape[1:], dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+        self.data[self.size:self.size + len(rows)] = rows
+        self.size += len(rows)
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+
+class IVFIndex:
+    def __init__(self, n_lists: int = 256, n_probe: int = 8, pq_subvectors: int = None, metric: str = "euclidean",
+                 random_state: int = None):
+        """
+        Inverted-file index for nearest-neighbour search in the projected (canonical) space.
+
+        The space is split into n_lists Voronoi cells by k-means; a query only scans the n_probe nearest cells,
+        so the cost per query is about n_probe / n_lists of an exhaustive search. With pq_subvectors set, the
+        residuals to the cell centroid are product-quantised to one byte per subvector and compared through
+        per-query lookup tables, so a million 100-dimensional embeddings take pq_subvectors megabytes.
+        n_lists=1 without quantisation is an exact search.
+
+        Parameters:
+        n_lists (int): Number of cells.
+        n_probe (int): Number of cells scanned per query by default.
+        pq_subvectors (int): Number of product-quantisation subvectors. Vectors are stored exactly when None.
+        metric (str): "euclidean" or "cosine" (vectors are normalised, distances are then 2 - 2 cos).
+        random_state (int): Seed of the k-means training.
+
+        Returns:
+        None
+        """
+        if metric not in ("euclidean", "cosine"):
+            raise ValueError(f"Unknown metric {metric!r}, expected 'euclidean' or 'cosine'")
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.pq_subvectors = pq_subvectors
+        self.metric = metric
+        self.random_state = random_state
+
+        self.centroids = None
+        self.codebook = None
+        self._lists = []
+        self._ids = []
+        self.ntotal = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _prepare(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32).reshape(len(X), -1)
+        if self.metric == "cosine":
+            norms = np.linalg.norm(X, axis=1, keepdims=True)
+            X = X / np.where(norms == 0, 1, norms)
+        return X
+
+    def _subspaces(self) -> list:
+        return np.array_split(np.arange(self.centroids.shape[1]), self.pq_subvectors)
+
+    def train(self, X: np.ndarray, max_samples: int = 100_000) -> None:
+        """
+        Learn the cell centroids (and the product-quantisation codebook) from representative embeddings.
+
+        Parameters:
+        X (np.ndarray): Training embeddings, shape (n, d).
+        max_samples (int): Train on at most this many randomly chosen rows.
+
+        Returns:
+        None
+        """
+        rng = np.random.default_rng(self.random_state)
+        X = self._prepare(X)
+        dimension = X.shape[1]
+        if self.pq_subvectors and not 1 <= self.pq_subvectors <= dimension:
+            raise ValueError(f"pq_subvectors must be between 1 and {dimension}")
+        if len(X) > max_samples:
+            X = X[rng.choice(len(X), max_samples, replace=False)]
+        self.centroids = kmeans(X, self.n_lists, rng=rng)
+        self.n_lists = len(self.centroids)
+        width = (self.pq_subvectors,) if self.pq_subvectors else (dimension,)
+        dtype = np.uint8 if self.pq_subvectors else np.float32
+        self._lists = [_GrowingArray(width, dtype) for _ in range(self.n_lists)]
+        self._ids = [_GrowingArray((), np.int64) for _ in range(self.n_lists)]
+        self.ntotal = 0
+
+        if self.pq_subvectors:
+            # The codebooks have only 256 codes each, a smaller random sample trains them as well; the first
+            # rows would be biased on ordered data
+            if len(X) > PQ_TRAIN_SAMPLES:
+                X = X[rng.choice(len(X), PQ_TRAIN_SAMPLES, replace=False)]
+            labels = top_k(X, self.centroids, 1, "sqeuclidean")[0][:, 0]
+            residuals = X - self.centroids[labels]
+            # One codebook of up to 256 codes per subspace, stored side by side in a (codes, d) array
+            self.codebook = np.zeros((min(256, len(X)), dimension), dtype=np.float32)
+            for columns in self._subspaces():
+                self.codebook[:, columns] = kmeans(residuals[:, columns], len(self.codebook), rng=rng)
+
+    def add(self, X: np.ndarray, ids: np.ndarray = None) -> None:
+        """
+        Insert embeddings, e.g. new infrared images, without retraining.
+
+        Parameters:
+        X (np.ndarray): Embeddings, shape (n, d).
+        ids (np.ndarray): Integer identifiers. Consecutive numbers from ntotal when None.
+
+        Returns:
+        None
+        """
+        if not self.is_trained:
+            raise RuntimeError("The index must be trained before adding vectors")
+        X = self._prepare(X)
+        ids = np.arange(self.ntotal, self.ntotal + len(X)) if ids is None else np.asarray(ids, dtype=np.int64)
+        labels = top_k(X, self.centroids, 1, "sqeuclidean")[0][:, 0]
+        if self.pq_subvectors:
+            residuals = X - self.centroids[labels]
+            data = np.empty((len(X), self.pq_subvectors), dtype=np.uint8)
+            for j, columns in enumerate(self._subspaces()):
+                data[:, j] = top_k(residuals[:, columns], self.codebook[:, columns], 1, "sqeuclidean")[0][:, 0]
+        else:
+            data = X
+
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(self.n_lists + 1))
+        for cell in np.flatnonzero(np.diff(bounds)):
+            rows = order[bounds[cell]:bounds[cell + 1]]
+            self._lists[cell].extend(data[rows])
+            self._ids[cell].extend(ids[rows])
+        self.ntotal += len(X)
+
+    def _cell_distances(self, queries: np.ndarray, cell: int) -> np.ndarray:
+        # Squared distances from a group of queries to every vector of one cell
+        data = self._lists[cell].view()
+        if not self.pq_subvectors:
+            return pairwise_distances(queries, data, "sqeuclidean")
+        residuals = queries - self.centroids[cell]
+        distances = np.zeros((len(queries), len(data)), dtype=np.float32)
+        for j, columns in enumerate(self._subspaces()):
+            # Lookup table: distance of every query subvector to every code, then gathered per stored code
+            table = pairwise_distances(residuals[:, columns], self.codebook[:, columns], "sqeuclidean")
+            distances += table[:, data[:, j]]
+        return distances
+
+    def search(self, X: np.ndarray, k: int = 1, n_probe: int = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Batched approximate k-nearest-neighbour search.
+
+        Queries are grouped by the cells they probe, so every cell is scanned once per batch with a
+        matrix product (or lookup-table gather) against all queries that visit it.
+
+        Parameters:
+        X (np.ndarray): Queries, shape (n, d).
+        k (int): Number of neighbours.
+        n_probe (int): Cells scanned per query. Default is self.n_probe.
+
+        Returns:
+        Tuple: (ids of shape (n, k), distances of shape (n, k)), nearest first. Missing neighbours have id -1
+        and distance inf.
+        """
+        if not self.is_trained:
+            raise RuntimeError("The index must be trained before searching")
+        X = self._prepare(X)
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        probes = top_k(X, self.centroids, n_probe, "sqeuclidean")[0]
+
+        best_ids = np.full((len(X), k), -1, dtype=np.int64)
+        best = np.full((len(X), k), np.inf, dtype=np.float32)
+        for cell in np.unique(probes):
+            if self._lists[cell].size == 0:
+                continue
+            queries = np.flatnonzero((probes == cell).any(axis=1))
+            distances = self._cell_distances(X[queries], cell)
+            ids = np.broadcast_to(self._ids[cell].view(), distances.shape)
+            # Merge the cell's candidates into the running top-k of these queries
+            merged = np.concatenate((best[queries], distances), axis=1)
+            merged_ids = np.concatenate((best_ids[queries], ids), axis=1)
+            keep = np.argpartition(merged, k - 1, axis=1)[:, :k] if merged.shape[1] > k else \
+                np.broadcast_to(np.arange(k), (len(queries), k))
+            best[queries] = np.take_along_axis(merged, keep, axis=1)
+            best_ids[queries] = np.take_along_axis(merged_ids, keep, axis=1)
+
+        order = np.argsort(best, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        return best_ids, np.sqrt(np.maximum(best, 0))
+
+    def save(self, path: str) -> None:
+        """
+        Save the index to a single .npz file.
+
+        Parameters:
+        path (str): Output file.
+
+        Returns:
+        None
+        """
+        if not self.is_trained:
+            raise RuntimeError("Only a trained index can be saved")
+        sizes = np.array([cell.size for cell in self._lists], dtype=np.int64)
+        header = {"n_lists": self.n_lists, "n_probe": self.n_probe, "pq_subvectors": self.pq_subvectors,
+                  "metric": self.metric, "random_state": self.random_state, "ntotal": self.ntotal}
+        arrays = {"header": np.array(json.dumps(header)), "centroids": self.centroids, "sizes": sizes,
+                  "data": np.concatenate([cell.view() for cell in self._lists]),
+                  "ids": np.concatenate([cell.view() for cell in self._ids])}
+        if self.codebook is not None:
+            arrays["codebook"] = self.codebook
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @staticmethod
+    def load(path: str) -> 'IVFIndex':
+        """
+        Load an index saved with save.
+
+        Parameters:
+        path (str): File written by save.
+
+        Returns:
+        IVFIndex: Loaded index, ready for search and further insertion.
+        """
+        with np.load(path, allow_pickle=False) as archive:
+            header = json.loads(str(archive["header"]))
+            index = IVFIndex(header["n_lists"], header["n_probe"], header["pq_subvectors"], header["metric"],
+                             header["random_state"])
+            index.centroids = archive["centroids"]
+            index.codebook = archive["codebook"] if "codebook" in archive else None
+            data, ids, sizes = archive["data"], archive["ids"], archive["sizes"]
+        index._lists = [_GrowingArray(data.shape[1:], data.dtype) for _ in range(index.n_lists)]
+        index._ids = [_GrowingArray((), np.int64) for _ in range(index.n_lists)]
+        for cell, (start, stop) in enumerate(zip(np.cumsum(sizes) - sizes, np.cumsum(sizes))):
+            index._lists[cell].extend(data[start:stop])
+            index._ids[cell].extend(ids[start:stop])
+        index.ntotal = header["ntotal"]
+        return index
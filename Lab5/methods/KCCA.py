@@ -0,0 +1,307 @@
+import numpy as np
+
+from .matching import matches
+from .persistence import load_arrays, save_arrays
+from .solvers import cca
+
+APPROXIMATIONS = ("nystroem", "fourier")
+# Number of input features multiplied at once, bounds the float64 copies of wide images
+FEATURE_BLOCK = 1 << 14
+
+
+def _flatten(X: np.ndarray) -> np.ndarray:
+    return X.reshape(X.shape[0], -1)
+
+
+def squared_distances(X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+    """
+    Squared euclidean distances between the rows of two matrices.
+
+    The inner products are accumulated over blocks of FEATURE_BLOCK columns in float64, so inputs of any
+    dtype (e.g. uint8 images) are never converted in full.
+
+    Parameters:
+    X (np.ndarray): Matrix of shape (n, p).
+    Y (np.ndarray): Matrix of shape (m, p).
+
+    Returns:
+    np.ndarray: Distances of shape (n, m).
+    """
+    products = np.zeros((X.shape[0], Y.shape[0]))
+    norms_x = np.zeros(X.shape[0])
+    norms_y = np.zeros(Y.shape[0])
+    for start in range(0, X.shape[1], FEATURE_BLOCK):
+        block_x = X[:, start:start + FEATURE_BLOCK].astype(np.float64)
+        block_y = Y[:, start:start + FEATURE_BLOCK].astype(np.float64)
+        products += block_x @ block_y.T
+        norms_x += np.einsum("ij,ij->i", block_x, block_x)
+        norms_y += np.einsum("ij,ij->i", block_y, block_y)
+    return np.maximum(norms_x[:, None] + norms_y[None, :] - 2 * products, 0)
+
+
+def median_gamma(distances: np.ndarray) -> float:
+    """
+    Width of the RBF kernel exp(-gamma ||x - y||^2) from the median heuristic, 1 / median squared distance.
+
+    Parameters:
+    distances (np.ndarray): Squared distances between n samples, shape (n, n).
+
+    Returns:
+    float: gamma, 1 when there are fewer than two distinct samples.
+    """
+    median = np.median(distances[np.triu_indices(len(distances), 1)]) if len(distances) > 1 else 0
+    return float(1 / median) if median > 0 else 1.0
+
+
+class NystroemMap:
+    def __init__(self, n_components: int = 256, gamma: float = None, random_state: int = None):
+        """
+        Nyström features of the RBF kernel: k(x, y) is approximated by the inner product of
+        k(x, landmarks) K^(-1/2) and k(y, landmarks) K^(-1/2), with K the kernel of the landmarks.
+
+        The landmarks are a random subset of the training samples, kept in their input dtype. With at least
+        as many landmarks as training samples the kernel of the training set is exact.
+
+        Parameters:
+        n_components (int): Number of landmarks.
+        gamma (float): Kernel width. Median heuristic on the landmarks when None.
+        random_state (int): Seed of the landmark choice.
+
+        Returns:
+        None
+        """
+        self.n_components = n_components
+        self.gamma = gamma
+        self.random_state = random_state
+        self.landmarks = None
+        self.normalization = None
+
+    def fit(self, X: np.ndarray) -> 'NystroemMap':
+        X = _flatten(X)
+        rng = np.random.default_rng(self.random_state)
+        count = min(self.n_components, X.shape[0])
+        self.landmarks = X[np.sort(rng.choice(X.shape[0], count, replace=False))].copy()
+        distances = squared_distances(self.landmarks, self.landmarks)
+        if self.gamma is None:
+            self.gamma = median_gamma(distances)
+        eigenvalues, vectors = np.linalg.eigh(np.exp(-self.gamma * distances))
+        # Directions of (near) duplicate landmarks carry no information and would blow up K^(-1/2)
+        keep = eigenvalues > eigenvalues.max() * 1e-10
+        self.normalization = vectors[:, keep] / np.sqrt(eigenvalues[keep])
+        return self
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        return np.exp(-self.gamma * squared_distances(_flatten(X), self.landmarks)) @ self.normalization
+
+    def state(self) -> (dict, dict):
+        return ({"n_components": self.n_components, "gamma": self.gamma, "random_state": self.random_state},
+                {"landmarks": self.landmarks, "normalization": self.normalization})
+
+    def set_arrays(self, arrays: dict) -> None:
+        self.landmarks = arrays["landmarks"]
+        self.normalization = arrays["normalization"]
+
+
+class FourierMap:
+    def __init__(self, n_components: int = 256, gamma: float = None, random_state: int = None):
+        """
+        Random Fourier features of the RBF kernel (Rahimi and Recht): sqrt(2 / m) cos(X W + b) with
+        W ~ N(0, 2 gamma) and b ~ U(0, 2 pi).
+
+        W has a row per input feature, a quarter of a gigabyte for 320x240x3 images and 256 components,
+        so it is never stored: it is drawn again block by block from its seed on every transform. Memory
+        stays at FEATURE_BLOCK rows of W and the model at its seed and offsets.
+
+        Parameters:
+        n_components (int): Number of random features m.
+        gamma (float): Kernel width. Median heuristic on up to 256 training samples when None.
+        random_state (int): Seed of W and b.
+
+        Returns:
+        None
+        """
+        self.n_components = n_components
+        self.gamma = gamma
+        self.random_state = random_state
+        self.seed = None
+        self.offsets = None
+
+    def fit(self, X: np.ndarray) -> 'FourierMap':
+        X = _flatten(X)
+        seeds = np.random.SeedSequence(self.random_state)
+        if self.gamma is None:
+            rng = np.random.default_rng(seeds.spawn(1)[0])
+            sample = X[np.sort(rng.choice(X.shape[0], min(256, X.shape[0]), replace=False))]
+            self.gamma = median_gamma(squared_distances(sample, sample))
+        self.seed = int(seeds.generate_state(1)[0])
+        self.offsets = np.random.default_rng(self.seed).uniform(0, 2 * np.pi, self.n_components)
+        return self
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        X = _flatten(X)
+        # Offsets come first from the seed, the rows of W follow in order
+        rng = np.random.default_rng(self.seed)
+        rng.uniform(0, 2 * np.pi, self.n_components)
+        scale = np.sqrt(2 * self.gamma)
+        projections = np.zeros((X.shape[0], self.n_components))
+        for start in range(0, X.shape[1], FEATURE_BLOCK):
+            block = X[:, start:start + FEATURE_BLOCK].astype(np.float64)
+            projections += block @ (rng.standard_normal((block.shape[1], self.n_components)) * scale)
+        return np.sqrt(2 / self.n_components) * np.cos(projections + self.offsets)
+
+    def state(self) -> (dict, dict):
+        return ({"n_components": self.n_components, "gamma": self.gamma, "random_state": self.random_state,
+                 "seed": self.seed}, {"offsets": self.offsets})
+
+    def set_arrays(self, arrays: dict) -> None:
+        self.offsets = arrays["offsets"]
+
+
+class KernelCCA:
+    def __init__(self, n_components: int = 10, approximation: str = "nystroem", n_features: int = 256,
+                 gamma: float = None, regularization: float = 0.1, solver: str = "auto", random_state: int = None):
+        """
+        Constructor for the Kernel CCA class.
+
+        CCA with an RBF kernel per set, approximated by an explicit map to n_features features (Nyström or
+        random Fourier features), followed by regularized linear CCA of the features. The cost is
+        O(N m p) for the kernel features and O(N m^2) for the CCA, with N pairs, p pixels and m = n_features,
+        instead of the O(N^3) of the exact kernel problem; the models hold m x m matrices, not N x N ones.
+
+        Parameters:
+        n_components (int): Number of canonical pairs.
+        approximation (str): "nystroem" or "fourier".
+        n_features (int): Number of landmarks or random features per set.
+        gamma (float): RBF kernel width, shared by both sets. Median heuristic per set when None.
+        regularization (float): Ridge relative to the mean eigenvalue of each feature covariance.
+        solver (str): SVD backend: "auto", "dense", "randomized" or "arpack".
+        random_state (int): Seed of the landmark choice or the random features.
+
+        Returns:
+        None
+        """
+        if approximation not in APPROXIMATIONS:
+            raise ValueError(f"Unknown approximation {approximation!r}, expected one of {APPROXIMATIONS}")
+        self.n_components = n_components
+        self.approximation = approximation
+        self.n_features = n_features
+        self.gamma = gamma
+        self.regularization = regularization
+        self.solver = solver
+        self.random_state = random_state
+        self.map1 = None
+        self.map2 = None
+        self.mean1 = None
+        self.mean2 = None
+        self.W1 = None
+        self.W2 = None
+        self.correlations = None
+
+    @property
+    def map_class(self) -> type:
+        return NystroemMap if self.approximation == "nystroem" else FourierMap
+
+    def fit(self, X1: np.ndarray, X2: np.ndarray) -> None:
+        """
+        Fit the kernel maps and the canonical directions to paired samples.
+
+        Parameters:
+        X1 (np.ndarray): The first dataset, images or flattened images.
+        X2 (np.ndarray): The second dataset, in the same order.
+
+        Returns:
+        None
+        """
+        assert X1.shape[0] == X2.shape[0], "The number of samples in X1 and X2 must be equal"
+        seeds = [int(seed.generate_state(1)[0]) for seed in np.random.SeedSequence(self.random_state).spawn(2)]
+        self.map1 = self.map_class(self.n_features, self.gamma, seeds[0]).fit(X1)
+        self.map2 = self.map_class(self.n_features, self.gamma, seeds[1]).fit(X2)
+        F1 = self.map1.transform(X1)
+        F2 = self.map2.transform(X2)
+        self.mean1 = F1.mean(axis=0)
+        self.mean2 = F2.mean(axis=0)
+        self.W1, self.W2, self.correlations = cca(F1 - self.mean1, F2 - self.mean2, self.n_components,
+                                                  self.regularization, self.solver, self.random_state)
+
+    def transform(self, X1: np.ndarray, X2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Project data onto the canonical directions in the kernel feature spaces.
+
+        Parameters:
+        X1 (np.ndarray): The first dataset to transform.
+        X2 (np.ndarray): The second dataset to transform.
+
+        Returns:
+        tuple[np.ndarray, np.ndarray]: Transformed datasets, n_components features per sample.
+        """
+        return ((self.map1.transform(X1) - self.mean1) @ self.W1,
+                (self.map2.transform(X2) - self.mean2) @ self.W2)
+
+    def predict(self, X1_new: np.ndarray, X2_new: np.ndarray, k: int = 1,
+                block_size: int = 1024) -> list[tuple[int, int, float]]:
+        """
+        Match every sample of X1_new against all samples of X2_new by cosine distance in the canonical space.
+
+        Parameters:
+        X1_new (np.ndarray): Queries.
+        X2_new (np.ndarray): Candidates.
+        k (int): Number of matches per query.
+        block_size (int): Number of queries whose distances are held in memory at once.
+
+        Returns:
+        list[tuple[int, int, float]]: (query index, candidate index, distance), k per query, best first.
+        """
+        transformed_X1_new, transformed_X2_new = self.transform(X1_new, X2_new)
+        return matches(transformed_X1_new, transformed_X2_new, k, "cosine", False, block_size)
+
+    def save_model(self, output_folder: str) -> None:
+        """
+        Save the trained model as .npy arrays with a JSON header.
+
+        Nyström models store their landmarks (training images), Fourier models only seeds and offsets.
+
+        Parameters:
+        output_folder (str): Path to the folder where the model will be saved.
+
+        Returns:
+        None
+        """
+        params = {"n_components": self.n_components, "approximation": self.approximation,
+                  "n_features": self.n_features, "gamma": self.gamma, "regularization": self.regularization,
+                  "solver": self.solver, "random_state": self.random_state}
+        arrays = {"mean1": self.mean1, "mean2": self.mean2, "W1": self.W1, "W2": self.W2,
+                  "correlations": self.correlations}
+        for name, feature_map in (("map1", self.map1), ("map2", self.map2)):
+            map_params, map_arrays = feature_map.state()
+            params[name] = map_params
+            arrays.update({f"{name}_{key}": value for key, value in map_arrays.items()})
+        save_arrays(output_folder, type(self).__name__, params, arrays)
+
+    @staticmethod
+    def load_model(model_folder: str, mmap: bool = True) -> 'KernelCCA':
+        """
+        Load a trained model from a folder written by save_model.
+
+        Parameters:
+        model_folder (str): Path to the model folder.
+        mmap (bool): Memory-map the arrays read-only instead of reading them.
+
+        Returns:
+        KernelCCA: Loaded model.
+        """
+        params, arrays = load_arrays(model_folder, "KernelCCA", mmap)
+        map_params = [params.pop("map1"), params.pop("map2")]
+        model = KernelCCA(**params)
+        for name in ("mean1", "mean2", "W1", "W2", "correlations"):
+            setattr(model, name, arrays[name])
+        maps = []
+        for name, state in zip(("map1", "map2"), map_params):
+            seed = state.pop("seed", None)
+            feature_map = model.map_class(**state)
+            if seed is not None:
+                feature_map.seed = seed
+            feature_map.set_arrays({key[len(name) + 1:]: value for key, value in arrays.items()
+                                    if key.startswith(name + "_")})
+            maps.append(feature_map)
+        model.map1, model.map2 = maps
+        return model
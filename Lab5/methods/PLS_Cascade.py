@@ -1,15 +1,20 @@
-from sklearn.cross_decomposition import PLSRegression
 import numpy as np
 
+from .solvers import top_svd
+from .streaming import SketchedCrossCovariance
+
 
 class PLSCascade:
-    def __init__(self, n_components: int = 2, n_cascades: int = 3):
+    def __init__(self, n_components: int = 2, n_cascades: int = 3, sketch_size: int = 1024,
+                 random_state: int = None):
         """
         Constructor for the PLS Cascade class.
 
         Parameters:
         n_components (int): Number of components to keep.
         n_cascades (int): Number of cascades to perform.
+        sketch_size (int): Size of the reduced space of the streaming fit (partial_fit).
+        random_state (int): Seed of the sketches of the streaming fit.
 
         Returns:
         None
@@ -17,6 +22,11 @@ class PLSCascade:
         self.n_components = n_components
         self.n_cascades = n_cascades
         self.pls_models = []
+        self.sketch_size = sketch_size
+        self.random_state = random_state
+        self.statistics = None
+        self.x_rotation = None
+        self.y_rotation = None
 
     def fit(self, X1: np.ndarray, X2: np.ndarray):
         """
@@ -26,12 +36,52 @@ class PLSCascade:
         X1 (np.ndarray): First dataset.
         X2 (np.ndarray): Second dataset.
         """
+        from sklearn.cross_decomposition import PLSRegression
+
+        self.statistics = None
+        self.pls_models = []
         for _ in range(self.n_cascades):
             pls = PLSRegression(n_components=self.n_components)
             pls.fit(X1, X2)
             self.pls_models.append(pls)
             X1, X2 = pls.transform(X1, X2)
 
+    def partial_fit(self, X1: np.ndarray, X2: np.ndarray, solve: bool = True):
+        """
+        Streaming fit: add a batch of pairs and update the cascade.
+
+        The data is reduced by a fixed CountSketch and only the means and covariances in the reduced space are
+        kept. Every stage is a PLS-SVD on standardised data (the leading singular vectors of the
+        cross-covariance); as the stages are linear, the covariances of the scores feeding the next stage
+        follow from the same statistics, so the whole cascade is solved without another pass over the data.
+
+        Parameters:
+        X1 (np.ndarray): Batch of the first dataset.
+        X2 (np.ndarray): Batch of the second dataset.
+        solve (bool): Recompute the cascade now. Pass False for all but the last batch of a run.
+        """
+        if self.statistics is None:
+            self.statistics = SketchedCrossCovariance(self.sketch_size, self.random_state)
+        self.statistics.update(X1, X2)
+        if solve:
+            self.solve_streaming()
+
+    def solve_streaming(self):
+        """
+        Solve the cascade from the statistics accumulated by partial_fit.
+        """
+        Cxx, Cyy, Cxy = self.statistics.covariances()
+        x_rotation, y_rotation = np.eye(len(Cxx)), np.eye(len(Cyy))
+        for _ in range(self.n_cascades):
+            # Standardise like PLSRegression(scale=True), then take the leading cross-covariance directions
+            x_scale = 1 / np.sqrt(np.maximum(np.diag(Cxx), np.finfo(np.float64).tiny))
+            y_scale = 1 / np.sqrt(np.maximum(np.diag(Cyy), np.finfo(np.float64).tiny))
+            U, _, Vt = top_svd(x_scale[:, None] * Cxy * y_scale, self.n_components)
+            Wx, Wy = x_scale[:, None] * U, y_scale[:, None] * Vt.T
+            x_rotation, y_rotation = x_rotation @ Wx, y_rotation @ Wy
+            Cxx, Cyy, Cxy = Wx.T @ Cxx @ Wx, Wy.T @ Cyy @ Wy, Wx.T @ Cxy @ Wy
+        self.x_rotation, self.y_rotation = x_rotation, y_rotation
+
     def transform(self, X1: np.ndarray, X2: np.ndarray):
         """
         Transform the input data using the PLS cascade model.
@@ -43,6 +93,10 @@ class PLSCascade:
         Returns:
         tuple: Transformed datasets.
         """
+        if self.statistics is not None:
+            X1, X2 = self.statistics.center(X1, X2)
+            return X1 @ self.x_rotation, X2 @ self.y_rotation
+
         for pls in self.pls_models:
             X1, X2 = pls.transform(X1, X2)
         return X1, X2
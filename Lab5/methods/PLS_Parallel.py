@@ -1,16 +1,87 @@
-from sklearn.cross_decomposition import PLSRegression
 import numpy as np
-from concurrent.futures import ThreadPoolExecutor
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+# Default upper bound on the features of one block
+MAX_BLOCK_FEATURES = 4096
+
+
+def _share(array: np.ndarray) -> (shared_memory.SharedMemory, tuple):
+    # Copy an array into shared memory once; workers attach to it by name instead of receiving a pickle
+    memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[...] = array
+    return memory, (memory.name, array.shape, array.dtype.str)
+
+
+class PLSBlock:
+    def __init__(self, x_mean: np.ndarray, x_std: np.ndarray, x_rotations: np.ndarray, y_mean: np.ndarray,
+                 y_std: np.ndarray, y_rotations: np.ndarray):
+        """
+        The part of a fitted PLSRegression that transform needs: the scaling and the rotations of both sides.
+        Unlike the estimator it has no (features x features) regression coefficients, which dominate its size.
+
+        Parameters:
+        x_mean (np.ndarray): Feature means of the first dataset.
+        x_std (np.ndarray): Feature standard deviations of the first dataset.
+        x_rotations (np.ndarray): Rotations of the first dataset, (features, n_components).
+        y_mean (np.ndarray): Feature means of the second dataset.
+        y_std (np.ndarray): Feature standard deviations of the second dataset.
+        y_rotations (np.ndarray): Rotations of the second dataset, (features, n_components).
+
+        Returns:
+        None
+        """
+        self.x_mean = x_mean
+        self.x_std = x_std
+        self.x_rotations = x_rotations
+        self.y_mean = y_mean
+        self.y_std = y_std
+        self.y_rotations = y_rotations
+
+    def transform(self, X: np.ndarray, Y: np.ndarray) -> (np.ndarray, np.ndarray):
+        # Same as PLSRegression.transform
+        return (((X - self.x_mean) / self.x_std) @ self.x_rotations,
+                ((Y - self.y_mean) / self.y_std) @ self.y_rotations)
+
+
+def _fit_pls(X: np.ndarray, Y: np.ndarray, n_components: int) -> PLSBlock:
+    from sklearn.cross_decomposition import PLSRegression
+
+    pls = PLSRegression(n_components=n_components).fit(X, Y)
+    return PLSBlock(pls._x_mean, pls._x_std, pls.x_rotations_, pls._y_mean, pls._y_std, pls.y_rotations_)
+
+
+def _fit_block(x_descriptor: tuple, y_descriptor: tuple, x_columns: tuple, y_columns: tuple,
+               n_components: int) -> PLSBlock:
+    x_memory = shared_memory.SharedMemory(name=x_descriptor[0])
+    y_memory = shared_memory.SharedMemory(name=y_descriptor[0])
+    try:
+        X = np.ndarray(x_descriptor[1], dtype=x_descriptor[2], buffer=x_memory.buf)
+        Y = np.ndarray(y_descriptor[1], dtype=y_descriptor[2], buffer=y_memory.buf)
+        pls = _fit_pls(X[:, slice(*x_columns)], Y[:, slice(*y_columns)], n_components)
+        # Drop the views into shared memory before it is closed
+        del X, Y
+        return pls
+    finally:
+        x_memory.close()
+        y_memory.close()
 
 
 class PLSParallel:
-    def __init__(self, n_components: int = 2, n_jobs: int = -1):
+    def __init__(self, n_components: int = 2, n_jobs: int = -1, n_blocks: int = None):
         """
         Constructor for the PLS Parallel class.
 
+        The features of both datasets are split into n_blocks aligned column blocks (image regions) and an
+        independent PLS model is fitted per block, all blocks at once in a process pool. The data is placed
+        in shared memory once and read by the workers without copying it per task.
+
         Parameters:
-        n_components (int): Number of components to keep.
-        n_jobs (int): Number of parallel jobs to run. Default is -1.
+        n_components (int): Number of components to keep per block.
+        n_jobs (int): Number of parallel jobs to run. Default is -1 (all CPUs).
+        n_blocks (int): Number of feature blocks. Default is the number of jobs, or more when a block
+                        would exceed MAX_BLOCK_FEATURES features.
 
         Returns:
         None
@@ -18,6 +89,20 @@ class PLSParallel:
         self.pls_models = None
         self.n_components = n_components
         self.n_jobs = n_jobs
+        self.n_blocks = n_blocks
+        self.x_bounds = None
+        self.y_bounds = None
+
+    @property
+    def workers(self) -> int:
+        if self.n_jobs is None or self.n_jobs < 0:
+            return os.cpu_count() or 1
+        return max(self.n_jobs, 1)
+
+    @staticmethod
+    def _bounds(n_features: int, n_blocks: int) -> list[tuple[int, int]]:
+        edges = np.linspace(0, n_features, n_blocks + 1).astype(int)
+        return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
 
     def fit(self, X1: np.ndarray, X2: np.ndarray):
         """
@@ -27,13 +112,31 @@ class PLSParallel:
         X1 (np.ndarray): First dataset.
         X2 (np.ndarray): Second dataset.
         """
-        self.pls_models = []
-        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
-            for _ in range(self.n_components):
-                pls = PLSRegression(n_components=1)
-                future = executor.submit(pls.fit, X1, X2)
-                self.pls_models.append(future.result())
-                X1, X2 = pls.transform(X1, X2)
+        X1 = np.ascontiguousarray(X1.reshape(X1.shape[0], -1), dtype=np.float64)
+        X2 = np.ascontiguousarray(X2.reshape(X2.shape[0], -1), dtype=np.float64)
+        # PLS forms feature-by-feature cross products, so large images need more blocks than workers
+        n_blocks = self.n_blocks or max(self.workers, -(-max(X1.shape[1], X2.shape[1]) // MAX_BLOCK_FEATURES))
+        n_blocks = min(n_blocks, X1.shape[1], X2.shape[1])
+        self.x_bounds = self._bounds(X1.shape[1], n_blocks)
+        self.y_bounds = self._bounds(X2.shape[1], n_blocks)
+
+        if self.workers == 1 or n_blocks == 1:
+            self.pls_models = [_fit_pls(X1[:, slice(*xb)], X2[:, slice(*yb)], self.n_components)
+                               for xb, yb in zip(self.x_bounds, self.y_bounds)]
+            return self
+
+        x_memory, x_descriptor = _share(X1)
+        y_memory, y_descriptor = _share(X2)
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.workers, n_blocks)) as executor:
+                futures = [executor.submit(_fit_block, x_descriptor, y_descriptor, xb, yb, self.n_components)
+                           for xb, yb in zip(self.x_bounds, self.y_bounds)]
+                self.pls_models = [future.result() for future in futures]
+        finally:
+            for memory in (x_memory, y_memory):
+                memory.close()
+                memory.unlink()
+        return self
 
     def transform(self, X1: np.ndarray, X2: np.ndarray):
         """
@@ -44,15 +147,21 @@ class PLSParallel:
         X2 (np.ndarray): Second dataset.
 
         Returns:
-        tuple: Transformed datasets.
+        tuple: Transformed datasets, n_components scores per block side by side.
         """
-        transformed_X1 = np.empty((X1.shape[0], self.n_components))
-        transformed_X2 = np.empty((X2.shape[0], self.n_components))
+        X1 = X1.reshape(X1.shape[0], -1)
+        X2 = X2.reshape(X2.shape[0], -1)
+
+        def transform_block(block: int):
+            pls = self.pls_models[block]
+            return pls.transform(X1[:, slice(*self.x_bounds[block])], X2[:, slice(*self.y_bounds[block])])
 
-        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
-            for i, pls in enumerate(self.pls_models):
-                transformed_X1[:, i], transformed_X2[:, i] = executor.submit(pls.transform, X1, X2)
+        # The block transforms are matrix products that release the GIL, threads are enough
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            scores = list(executor.map(transform_block, range(len(self.pls_models))))
 
+        transformed_X1 = np.hstack([x_scores for x_scores, _ in scores])
+        transformed_X2 = np.hstack([y_scores for _, y_scores in scores])
         return transformed_X1, transformed_X2
 
     def predict(self, X1: np.ndarray, X2: np.ndarray):
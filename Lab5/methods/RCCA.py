@@ -0,0 +1,122 @@
+import numpy as np
+
+from .matching import matches
+from .persistence import load_arrays, save_arrays
+from .solvers import cca
+
+
+class RegularizedCCA:
+    def __init__(self, n_components: int = 10, regularization: float = 0.1, solver: str = "auto",
+                 random_state: int = None):
+        """
+        Constructor for the Regularized CCA class.
+
+        Linear CCA of the flattened images with a ridge on both covariances. With far fewer pairs than pixels
+        the plain problem is singular (every direction reaches a correlation of one); the ridge keeps it
+        well-posed, and constant pixels get zero weight instead of a division by a zero variance. The problem
+        is solved in sample space, in O(N^2 p) time for N pairs of p features.
+
+        Parameters:
+        n_components (int): Number of canonical pairs.
+        regularization (float): Ridge relative to the mean eigenvalue of each covariance.
+        solver (str): SVD backend: "auto", "dense", "randomized" or "arpack".
+        random_state (int): Seed of the iterative solvers.
+
+        Returns:
+        None
+        """
+        self.n_components = n_components
+        self.regularization = regularization
+        self.solver = solver
+        self.random_state = random_state
+        self.mean1 = None
+        self.mean2 = None
+        self.W1 = None
+        self.W2 = None
+        self.correlations = None
+
+    def fit(self, X1: np.ndarray, X2: np.ndarray) -> None:
+        """
+        Fit the model to paired samples.
+
+        Parameters:
+        X1 (np.ndarray): The first dataset, images or flattened images.
+        X2 (np.ndarray): The second dataset, in the same order.
+
+        Returns:
+        None
+        """
+        assert X1.shape[0] == X2.shape[0], "The number of samples in X1 and X2 must be equal"
+        X1 = X1.reshape(X1.shape[0], -1).astype(np.float64)
+        X2 = X2.reshape(X2.shape[0], -1).astype(np.float64)
+        self.mean1 = X1.mean(axis=0)
+        self.mean2 = X2.mean(axis=0)
+        X1 -= self.mean1
+        X2 -= self.mean2
+        self.W1, self.W2, self.correlations = cca(X1, X2, self.n_components, self.regularization, self.solver,
+                                                  self.random_state)
+
+    def transform(self, X1: np.ndarray, X2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Project data onto the canonical directions.
+
+        Parameters:
+        X1 (np.ndarray): The first dataset to transform.
+        X2 (np.ndarray): The second dataset to transform.
+
+        Returns:
+        tuple[np.ndarray, np.ndarray]: Transformed datasets, n_components features per sample.
+        """
+        return ((X1.reshape(X1.shape[0], -1) - self.mean1) @ self.W1,
+                (X2.reshape(X2.shape[0], -1) - self.mean2) @ self.W2)
+
+    def predict(self, X1_new: np.ndarray, X2_new: np.ndarray, k: int = 1,
+                block_size: int = 1024) -> list[tuple[int, int, float]]:
+        """
+        Match every sample of X1_new against all samples of X2_new by cosine distance in the canonical space.
+
+        Parameters:
+        X1_new (np.ndarray): Queries.
+        X2_new (np.ndarray): Candidates.
+        k (int): Number of matches per query.
+        block_size (int): Number of queries whose distances are held in memory at once.
+
+        Returns:
+        list[tuple[int, int, float]]: (query index, candidate index, distance), k per query, best first.
+        """
+        transformed_X1_new, transformed_X2_new = self.transform(X1_new, X2_new)
+        return matches(transformed_X1_new, transformed_X2_new, k, "cosine", False, block_size)
+
+    def save_model(self, output_folder: str) -> None:
+        """
+        Save the trained model as .npy arrays (means and directions) with a JSON header.
+
+        Parameters:
+        output_folder (str): Path to the folder where the model will be saved.
+
+        Returns:
+        None
+        """
+        params = {"n_components": self.n_components, "regularization": self.regularization,
+                  "solver": self.solver, "random_state": self.random_state}
+        arrays = {"mean1": self.mean1, "mean2": self.mean2, "W1": self.W1, "W2": self.W2,
+                  "correlations": self.correlations}
+        save_arrays(output_folder, type(self).__name__, params, arrays)
+
+    @staticmethod
+    def load_model(model_folder: str, mmap: bool = True) -> 'RegularizedCCA':
+        """
+        Load a trained model from a folder written by save_model.
+
+        Parameters:
+        model_folder (str): Path to the model folder.
+        mmap (bool): Memory-map the arrays read-only instead of reading them.
+
+        Returns:
+        RegularizedCCA: Loaded model.
+        """
+        params, arrays = load_arrays(model_folder, "RegularizedCCA", mmap)
+        model = RegularizedCCA(**params)
+        for name in ("mean1", "mean2", "W1", "W2", "correlations"):
+            setattr(model, name, arrays[name])
+        return model
@@ -2,37 +2,109 @@ import numpy as np
 from typing import Any
 
 
+def _as_matrices(X: np.ndarray) -> np.ndarray:
+    # Images (N, H, W[, C]) as N matrices of H rows and W * C columns, flat samples as matrices of one row
+    if X.ndim >= 3:
+        return X.reshape(X.shape[0], X.shape[1], -1)
+    return X.reshape(X.shape[0], 1, -1)
+
+
 class RPA:
-    def __init__(self, n_iter: int = 10):
+    def __init__(self, n_iter: int = 10, max_width: int = None, warm_start: bool = None):
         """
         Constructor for the Random Projection Augmentation (RPA) class.
 
         Parameters:
         n_iter (int): Number of iterations to perform random projection augmentation.
+        max_width (int): Cap on the number of features of each augmented dataset. Once it is reached, the
+                         newest projections overwrite the oldest augmented block instead of widening the data.
+                         No cap when None.
+        warm_start (bool): Refit the model from its previous directions. True requires a model with a
+                           warm_start attribute (e.g. TwoDCCAParallel), False always refits from scratch and
+                           None (default) warm-starts the models that support it.
 
         Returns:
         None
         """
         self.n_iter = n_iter
+        self.max_width = max_width
+        self.warm_start = warm_start
+
+    def _slots(self, rows: int, columns: int, block_columns: int) -> int:
+        # Number of projection blocks that fit next to the original features
+        if self.max_width is None:
+            return self.n_iter
+        slots = (self.max_width - rows * columns) // (rows * block_columns)
+        if slots < 1:
+            raise ValueError(f"max_width={self.max_width} leaves no room for a projection block of "
+                             f"{rows * block_columns} features")
+        return min(self.n_iter, slots)
 
     def augment(self, X1: np.ndarray, X2: np.ndarray, model) -> Any:
         """
         Perform random projection augmentation.
 
+        The augmented matrices are allocated once at their final width and every round writes its projections
+        into a column block of them, so no round copies the data and the width never exceeds max_width.
+        Images keep their rows: each projection is laid out row by row in a zero-padded block of extra
+        columns, so models that work on image matrices (TwoDCCAParallel) see images again. Flat samples get
+        the projections appended as they are.
+
         Parameters:
-        X1 (np.ndarray): The first dataset.
+        X1 (np.ndarray): The first dataset, images or flattened images.
         X2 (np.ndarray): The second dataset.
-        model: The model to use for random projection augmentation.
+        model: The model to use for random projection augmentation, already fitted on X1 and X2.
 
         Returns:
         The augmented model.
         """
-        for _ in range(self.n_iter):
-            projected_X1, projected_X2 = model.transform(X1, X2)
+        for method in ("fit", "transform"):
+            if not callable(getattr(model, method, None)):
+                raise ValueError(f"{type(model).__name__} has no {method} method and cannot be augmented")
+        supported = hasattr(model, "warm_start")
+        if self.warm_start and not supported:
+            raise ValueError(f"{type(model).__name__} cannot warm-start; use warm_start=False or None")
+        if self.n_iter < 1:
+            return model
+
+        images = X1.ndim >= 3
+        X1, X2 = _as_matrices(X1), _as_matrices(X2)
+        projected_X1, projected_X2 = model.transform(X1 if images else X1[:, 0], X2 if images else X2[:, 0])
+        width1, width2 = projected_X1.shape[1], projected_X2.shape[1]
+        (n, rows1, columns1), (_, rows2, columns2) = X1.shape, X2.shape
+        block1, block2 = -(-width1 // rows1), -(-width2 // rows2)
+        slots = min(self._slots(rows1, columns1, block1), self._slots(rows2, columns2, block2))
+
+        augmented_X1 = np.empty((n, rows1, columns1 + slots * block1), dtype=np.result_type(X1, projected_X1))
+        augmented_X2 = np.empty((n, rows2, columns2 + slots * block2), dtype=np.result_type(X2, projected_X2))
+        augmented_X1[:, :, :columns1] = X1
+        augmented_X2[:, :, :columns2] = X2
+        padded_X1 = np.zeros((n, rows1 * block1), dtype=augmented_X1.dtype)
+        padded_X2 = np.zeros((n, rows2 * block2), dtype=augmented_X2.dtype)
 
-            X1 = np.concatenate([X1, projected_X1], axis=1)
-            X2 = np.concatenate([X2, projected_X2], axis=1)
+        restore = getattr(model, "warm_start", None)
+        if supported and self.warm_start is not False:
+            model.warm_start = True
+        try:
+            for i in range(self.n_iter):
+                slot = i % slots
+                start1, start2 = columns1 + slot * block1, columns2 + slot * block2
+                padded_X1[:, :width1] = projected_X1
+                padded_X2[:, :width2] = projected_X2
+                augmented_X1[:, :, start1:start1 + block1] = padded_X1.reshape(n, rows1, block1)
+                augmented_X2[:, :, start2:start2 + block2] = padded_X2.reshape(n, rows2, block2)
 
-            model.fit(X1, X2)
+                filled = min(i + 1, slots)
+                view_X1 = augmented_X1[:, :, :columns1 + filled * block1]
+                view_X2 = augmented_X2[:, :, :columns2 + filled * block2]
+                if not images:
+                    # A single row, so the flat samples are still views
+                    view_X1, view_X2 = view_X1[:, 0], view_X2[:, 0]
+                model.fit(view_X1, view_X2)
+                if i + 1 < self.n_iter:
+                    projected_X1, projected_X2 = model.transform(view_X1, view_X2)
+        finally:
+            if supported:
+                model.warm_start = restore
 
         return model
@@ -1,23 +1,40 @@
-import os
-import pickle
-
 import numpy as np
-from sklearn.cross_decomposition import CCA
+
+from .persistence import load_arrays, save_arrays
+from .solvers import cca_covariance
+from .streaming import CountSketch, SketchedCrossCovariance
 
 
 class TwoDCCACascade:
-    def __init__(self, n_components: int = 1):
+    def __init__(self, n_components: int = 1, sketch_size: int = 1024, regularization: float = 1e-3,
+                 random_state: int = None):
         """
         Constructor for TwoDCCACascade class.
 
         Parameters:
         n_components (int): Number of canonical components to compute and return.
+        sketch_size (int): Size of the reduced space of the streaming fit (partial_fit).
+        regularization (float): Relative ridge of the streaming fit.
+        random_state (int): Seed of the sketches of the streaming fit.
 
         Returns:
         None
         """
         self.n_components = n_components
-        self.cca = CCA(n_components=n_components)
+        self.cca = None
+        self.sketch_size = sketch_size
+        self.regularization = regularization
+        self.random_state = random_state
+        self.statistics = None
+        self.x_weights = None
+        self.y_weights = None
+        # Standardisation and rotations of the in-memory fit, taken out of the scikit-learn model
+        self.x_mean = None
+        self.x_std = None
+        self.x_rotation = None
+        self.y_mean = None
+        self.y_std = None
+        self.y_rotation = None
 
     def fit(self, X_regular: np.ndarray, X_infrared: np.ndarray) -> None:
         """
@@ -36,8 +53,45 @@ class TwoDCCACascade:
         if X_infrared.ndim >= 3:
             X_infrared = X_infrared.reshape(X_infrared.shape[0], -1)
 
+        from sklearn.cross_decomposition import CCA
+
         # Fit CCA to the data
-        self.cca.fit(X_regular, X_infrared)
+        self.statistics = None
+        self.cca = CCA(n_components=self.n_components).fit(X_regular, X_infrared)
+        self.x_mean, self.x_std, self.x_rotation = self.cca._x_mean, self.cca._x_std, self.cca.x_rotations_
+        self.y_mean, self.y_std, self.y_rotation = self.cca._y_mean, self.cca._y_std, self.cca.y_rotations_
+
+    def partial_fit(self, X_regular: np.ndarray, X_infrared: np.ndarray, solve: bool = True) -> None:
+        """
+        Streaming fit: add a batch of pairs and update the canonical directions.
+
+        The images are reduced by a fixed CountSketch of sketch_size features per set and only the means and
+        covariances in that space are kept, so batches can come straight from ImageLoader.iter_batches and
+        new pairs can be added later. The CCA itself is solved from the accumulated covariances.
+
+        Parameters:
+        X_regular (np.ndarray): Batch of regular images.
+        X_infrared (np.ndarray): Batch of infrared images.
+        solve (bool): Recompute the directions now. Pass False for all but the last batch of a run.
+
+        Returns:
+        None
+        """
+        if self.statistics is None:
+            self.statistics = SketchedCrossCovariance(self.sketch_size, self.random_state)
+        self.statistics.update(X_regular, X_infrared)
+        if solve:
+            self.solve_streaming()
+
+    def solve_streaming(self) -> None:
+        """
+        Solve the canonical directions from the statistics accumulated by partial_fit.
+
+        Returns:
+        None
+        """
+        self.x_weights, self.y_weights, _ = cca_covariance(*self.statistics.covariances(), self.n_components,
+                                                           self.regularization)
 
     def transform(self, X_regular: np.ndarray, X_infrared: np.ndarray) -> (np.ndarray, np.ndarray):
         """
@@ -56,11 +110,21 @@ class TwoDCCACascade:
         if X_infrared.ndim >= 3:
             X_infrared = X_infrared.reshape(X_infrared.shape[0], -1)
 
-        # Transform data using the fitted CCA model
-        transformed_regular, transformed_infrared = self.cca.transform(X_regular, X_infrared)
+        if self.statistics is not None:
+            reduced_regular, reduced_infrared = self.statistics.center(X_regular, X_infrared)
+            return reduced_regular @ self.x_weights, reduced_infrared @ self.y_weights
+
+        # Transform data using the fitted CCA model: ((X - mean) / std) @ rotation without image-sized temporaries
+        transformed_regular = self._project(X_regular, self.x_mean, self.x_std, self.x_rotation)
+        transformed_infrared = self._project(X_infrared, self.y_mean, self.y_std, self.y_rotation)
 
         return transformed_regular, transformed_infrared
 
+    @staticmethod
+    def _project(X: np.ndarray, mean: np.ndarray, std: np.ndarray, rotation: np.ndarray) -> np.ndarray:
+        scaled_rotation = rotation / std[:, None]
+        return X @ scaled_rotation - mean @ scaled_rotation
+
     def train(self, X_regular: np.ndarray, X_infrared: np.ndarray) -> None:
         """
         Train the CCA model on regular and infrared images.
@@ -74,35 +138,63 @@ class TwoDCCACascade:
         """
         self.fit(X_regular, X_infrared)
 
-    def save_model(self, output_folder: str) -> None:
+    def save_model(self, output_folder: str, include_statistics: bool = False) -> None:
         """
-        Save the trained CCA model.
+        Save the trained CCA model as .npy arrays (means, scales and rotations) with a JSON header.
 
         Parameters:
         output_folder (str): Path to the folder where the model will be saved.
+        include_statistics (bool): For a streaming model, also store the accumulated covariances,
+                                   so partial_fit can continue after loading.
 
         Returns:
         None
         """
-        # Check if the output folder exists, if not, create it
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-
-        # Save the trained CCA model
-        model_filename = os.path.join(output_folder, "cca_model.pkl")
-        with open(model_filename, 'wb') as f:
-            pickle.dump(self, f)
+        params = {"n_components": self.n_components, "sketch_size": self.sketch_size,
+                  "regularization": self.regularization, "random_state": self.random_state}
+        if self.statistics is not None:
+            statistics = self.statistics
+            params["count"] = statistics.count
+            arrays = {"x_buckets": statistics.sketch_x.buckets.astype(np.int32), "x_signs": statistics.sketch_x.signs,
+                      "y_buckets": statistics.sketch_y.buckets.astype(np.int32), "y_signs": statistics.sketch_y.signs,
+                      "x_mean": statistics.mean_x, "y_mean": statistics.mean_y,
+                      "x_weights": self.x_weights, "y_weights": self.y_weights}
+            if include_statistics:
+                arrays.update({"xx": statistics.xx, "yy": statistics.yy, "xy": statistics.xy})
+        else:
+            arrays = {"x_mean": self.x_mean, "x_std": self.x_std, "x_rotation": self.x_rotation,
+                      "y_mean": self.y_mean, "y_std": self.y_std, "y_rotation": self.y_rotation}
+        save_arrays(output_folder, type(self).__name__, params, arrays)
 
     @staticmethod
-    def load_model(model_file: str) -> 'TwoDCCACascade':
+    def load_model(model_folder: str, mmap: bool = True) -> 'TwoDCCACascade':
         """
         Load a saved CCA model.
 
         Parameters:
-        model_file (str): Path to the saved model file.
+        model_folder (str): Path to the folder written by save_model.
+        mmap (bool): Memory-map the arrays read-only instead of reading them.
 
         Returns:
         TwoDCCACascade: Loaded CCA model.
         """
-        with open(model_file, 'rb') as f:
-            return pickle.load(f)
+        params, arrays = load_arrays(model_folder, "TwoDCCACascade", mmap)
+        count = params.pop("count", None)
+        model = TwoDCCACascade(**params)
+        if count is None:
+            for name in ("x_mean", "x_std", "x_rotation", "y_mean", "y_std", "y_rotation"):
+                setattr(model, name, arrays[name])
+            return model
+
+        statistics = SketchedCrossCovariance(model.sketch_size, model.random_state)
+        for side in ("x", "y"):
+            sketch = CountSketch.from_hash(arrays[f"{side}_buckets"], arrays[f"{side}_signs"],
+                                           len(arrays[f"{side}_mean"]))
+            setattr(statistics, f"sketch_{side}", sketch)
+        statistics.mean_x, statistics.mean_y = np.array(arrays["x_mean"]), np.array(arrays["y_mean"])
+        if "xx" in arrays:
+            statistics.count = count
+            statistics.xx, statistics.yy, statistics.xy = (np.array(arrays[name]) for name in ("xx", "yy", "xy"))
+        model.statistics = statistics
+        model.x_weights, model.y_weights = arrays["x_weights"], arrays["y_weights"]
+        return model
@@ -1,97 +1,212 @@
-import pickle
-from typing import Any
 import numpy as np
-from numpy import ndarray
+
+from .matching import matches
+from .persistence import load_arrays, save_arrays
+from .solvers import cca, cca_covariance
+from .streaming import MatrixMoments
+
+
+def _as_matrices(X: np.ndarray) -> np.ndarray:
+    # Images (N, H, W[, C]) as N matrices of H rows and W * C columns
+    if X.ndim < 3:
+        raise ValueError("Expected a stack of images of shape (N, H, W) or (N, H, W, C)")
+    return X.reshape(X.shape[0], X.shape[1], -1)
 
 
 class TwoDCCAParallel:
-    def __init__(self, dimension: int = 10, distance_function=lambda x, y: np.linalg.norm(x - y), is_max: bool = True):
+    def __init__(self, dimension: int = 10, distance_function="euclidean", is_max: bool = True,
+                 max_iter: int = 10, tol: float = 1e-4, regularization: float = 1e-3, solver: str = "auto",
+                 random_state: int = None, warm_start: bool = False):
         """
         Initializes a new instance of the Parallel Two-Dimensional Canonical Correlation Analysis (2DCCA) class.
 
+        Every image is kept as a matrix (rows by columns times channels) and projected from both sides,
+        L^T X R, so only row (H x H) and column (WC x WC) covariances are ever formed.
+
         Parameters:
-        dimension (int): The dimension of the canonical correlation space. Default is 10.
-        distance_function (function): The distance function used to measure the similarity between samples.
-                                      Default is the Euclidean distance function.
+        dimension (int): Number of left and right canonical directions, the features are dimension^2.
+                         Default is 10.
+        distance_function (str | function): The distance used to measure the similarity between samples:
+                                            "euclidean" (default), "sqeuclidean", "cosine", "correlation"
+                                            or a function of two vectors.
         is_max (bool): Determines whether to maximize or minimize the canonical correlation. Default is True (maximize).
+        max_iter (int): Maximum number of alternating updates of the left and right directions.
+        tol (float): Stop when the mean canonical correlation changes less than this.
+        regularization (float): Ridge added to the covariances, relative to their mean eigenvalue.
+        solver (str): SVD backend of the canonical directions: "auto", "dense", "randomized" or "arpack".
+        random_state (int): Seed of the iterative solvers.
+        warm_start (bool): Start the alternation of fit from the right directions of the previous fit instead of
+                           the leading column directions. Images that gained columns since (e.g. by RPA
+                           augmentation) get zero weights on the new columns.
         """
         self.dimension = dimension
         self.distance_function = distance_function
         self.is_max = is_max
+        self.max_iter = max_iter
+        self.tol = tol
+        self.regularization = regularization
+        self.solver = solver
+        self.random_state = random_state
+        self.warm_start = warm_start
+
+        self.mean1 = None
+        self.mean2 = None
+        self.L1 = None
+        self.R1 = None
+        self.L2 = None
+        self.R2 = None
+        self.correlations = None
+        self.n_iter = 0
+        self.moments = None
 
-        self.X1 = None
-        self.X2 = None
-        self.W1 = None
-        self.W2 = None
+    def _cca(self, A: np.ndarray, B: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # CCA of the rows of two stacks of (rows x m) matrices: every column of every sample is an observation
+        A = A.transpose(0, 2, 1).reshape(-1, A.shape[1])
+        B = B.transpose(0, 2, 1).reshape(-1, B.shape[1])
+        return cca(A, B, k, self.regularization, self.solver, self.random_state)
+
+    @staticmethod
+    def _leading_columns(X: np.ndarray, k: int) -> np.ndarray:
+        # Top eigenvectors of the column covariance, sum of X_i^T X_i
+        columns = X.reshape(-1, X.shape[2])
+        return np.linalg.eigh((columns.T @ columns).astype(np.float64))[1][:, ::-1][:, :k].copy()
+
+    @staticmethod
+    def _previous_columns(R: np.ndarray, columns: int, k: int) -> np.ndarray:
+        # Right directions of the previous fit, zero-padded to the current number of columns; None if unusable
+        if R is None or R.shape[1] != k or R.shape[0] > columns:
+            return None
+        start = np.zeros((columns, k))
+        start[:R.shape[0]] = R
+        return start
 
     def fit(self, X1: np.ndarray, X2: np.ndarray) -> None:
         """
         Fit the Parallel 2DCCA model to the given data.
 
+        The left directions are the CCA of the rows with the right directions fixed and vice versa;
+        the two steps alternate until the canonical correlations settle.
+
         Parameters:
-        X1 (np.ndarray): The first dataset.
-        X2 (np.ndarray): The second dataset.
+        X1 (np.ndarray): The first dataset, images of shape (N, H, W[, C]).
+        X2 (np.ndarray): The second dataset, images of shape (N, H', W'[, C']).
 
         Returns:
         None
         """
         assert X1.shape[0] == X2.shape[0], "The number of samples in X1 and X2 must be equal"
-        self.X1 = X1.reshape(X1.shape[0], -1)
-        self.X2 = X2.reshape(X2.shape[0], -1)
+        self.moments = None
+        X1 = _as_matrices(X1).astype(np.float32)
+        X2 = _as_matrices(X2).astype(np.float32)
+        self.mean1 = X1.mean(axis=0)
+        self.mean2 = X2.mean(axis=0)
+        X1 -= self.mean1
+        X2 -= self.mean2
+        d1 = min(self.dimension, X1.shape[1], X2.shape[1])
+        d2 = min(self.dimension, X1.shape[2], X2.shape[2])
+
+        # Start from the previous right directions or the leading column directions of each set
+        R1 = self._previous_columns(self.R1, X1.shape[2], d2) if self.warm_start else None
+        R2 = self._previous_columns(self.R2, X2.shape[2], d2) if self.warm_start else None
+        if R1 is None or R2 is None:
+            R1 = self._leading_columns(X1, d2)
+            R2 = self._leading_columns(X2, d2)
+
+        previous = -np.inf
+        for self.n_iter in range(1, self.max_iter + 1):
+            # Left directions with the right ones fixed: rows of X R
+            L1, L2, _ = self._cca(X1 @ R1, X2 @ R2, d1)
+
+            # Right directions with the left ones fixed: columns of L^T X
+            R1, R2, correlations = self._cca((L1.T @ X1).transpose(0, 2, 1), (L2.T @ X2).transpose(0, 2, 1), d2)
+
+            score = correlations.mean()
+            if abs(score - previous) < self.tol:
+                break
+            previous = score
+
+        self.L1, self.R1, self.L2, self.R2 = L1, R1, L2, R2
+        self.correlations = correlations
+
+    def partial_fit(self, X1: np.ndarray, X2: np.ndarray, solve: bool = True) -> None:
+        """
+        Streaming fit: add a batch of pairs to the accumulated 2D moments and update the directions.
 
-        # Compute the covariance matrices
-        C1 = np.cov(self.X1.T)
-        C2 = np.cov(self.X2.T)
+        Only the mean images and the row (H x H) and column (WC x WC) covariances are kept, so the data
+        never has to be in memory at once and new pairs can be added later. From these statistics the
+        left directions are solved with the right ones fixed to the identity and vice versa, i.e. a single
+        non-iterated 2DCCA step; fit on the full data alternates further.
 
-        # Compute the cross-covariance matrix
-        C12 = np.cov(self.X1.T, self.X2.T)[:self.X1.shape[1], self.X1.shape[1]:]
+        Parameters:
+        X1 (np.ndarray): Batch of the first dataset, images of shape (n, H, W[, C]).
+        X2 (np.ndarray): Batch of the second dataset, images of the same shape.
+        solve (bool): Recompute the directions now. Pass False for all but the last batch of a run.
 
-        # Compute the eigenvalues and eigenvectors of C1^(-1/2) C12 C2^(-1/2)
-        S = np.linalg.inv(np.sqrt(np.diag(np.diag(C1)))) @ C12 @ np.linalg.inv(np.sqrt(np.diag(np.diag(C2))))
-        eigenvalues, eigenvectors = np.linalg.eig(S)
+        Returns:
+        None
+        """
+        assert X1.shape[0] == X2.shape[0], "The number of samples in X1 and X2 must be equal"
+        if self.moments is None:
+            self.moments = MatrixMoments()
+        self.moments.update(_as_matrices(X1).astype(np.float32), _as_matrices(X2).astype(np.float32))
+        if solve:
+            self.solve_streaming()
+
+    def solve_streaming(self) -> None:
+        """
+        Solve the directions from the moments accumulated by partial_fit.
 
-        # Sort eigenvectors based on eigenvalues
-        sorted_indices = np.argsort(eigenvalues.real)[::-1]
-        self.W1 = eigenvectors.real[:, sorted_indices[:self.dimension]]
-        self.W2 = eigenvectors.real[:, sorted_indices[:self.dimension]]
+        Returns:
+        None
+        """
+        moments = self.moments
+        d1 = min(self.dimension, moments.mean_x.shape[0])
+        d2 = min(self.dimension, moments.mean_x.shape[1])
+        rows = [statistic / moments.count for statistic in moments.rows]
+        columns = [statistic / moments.count for statistic in moments.columns]
+        self.L1, self.L2, _ = cca_covariance(*rows, d1, self.regularization, self.solver, self.random_state)
+        self.R1, self.R2, self.correlations = cca_covariance(*columns, d2, self.regularization, self.solver,
+                                                             self.random_state)
+        self.mean1 = moments.mean_x.astype(np.float32)
+        self.mean2 = moments.mean_y.astype(np.float32)
+        self.n_iter = 1
 
     def transform(self, X1: np.ndarray, X2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
         """
         Transform the given data using the fitted model.
 
         Parameters:
-        X1 (np.ndarray): The first dataset to transform.
-        X2 (np.ndarray): The second dataset to transform.
+        X1 (np.ndarray): The first dataset to transform, images or flattened images.
+        X2 (np.ndarray): The second dataset to transform, images or flattened images.
 
         Returns:
-        tuple[np.ndarray, np.ndarray]: Transformed datasets.
+        tuple[np.ndarray, np.ndarray]: Transformed datasets, one row of dimension^2 features per image.
         """
-        return X1 @ self.W1, X2 @ self.W2
+        return self._project(X1, self.mean1, self.L1, self.R1), self._project(X2, self.mean2, self.L2, self.R2)
 
-    def predict(self, X1_new: np.ndarray, X2_new: np.ndarray) -> list[tuple[ndarray, ndarray, Any]]:
+    @staticmethod
+    def _project(X: np.ndarray, mean: np.ndarray, L: np.ndarray, R: np.ndarray) -> np.ndarray:
+        X = X.reshape((X.shape[0],) + mean.shape) - mean
+        return (L.T @ X @ R).reshape(X.shape[0], -1)
+
+    def predict(self, X1_new: np.ndarray, X2_new: np.ndarray, k: int = 1,
+                block_size: int = 1024) -> list[tuple[int, int, float]]:
         """
         Predict the output for the given input data using the fitted model.
 
+        Every sample of X1_new is matched against all samples of X2_new in the canonical space.
+
         Parameters:
-        X1_new (np.ndarray): The new data for the first dataset.
-        X2_new (np.ndarray): The new data for the second dataset.
+        X1_new (np.ndarray): The new data for the first dataset (queries).
+        X2_new (np.ndarray): The new data for the second dataset (candidates).
+        k (int): Number of matches per query.
+        block_size (int): Number of queries whose distances are held in memory at once.
 
         Returns:
-        list[tuple[int, float]]: Predicted output.
+        list[tuple[int, int, float]]: (query index, candidate index, distance), k per query, best first.
         """
         transformed_X1_new, transformed_X2_new = self.transform(X1_new, X2_new)
-        distances = np.zeros((X1_new.shape[0], X2_new.shape[0]))
-
-        for i, x1_new in enumerate(transformed_X1_new):
-            for j, x2_new in enumerate(transformed_X2_new):
-                distances[i, j] = self.distance_function(x1_new, x2_new)
-
-        if self.is_max:
-            indices = np.unravel_index(np.argmax(distances), distances.shape)
-        else:
-            indices = np.unravel_index(np.argmin(distances), distances.shape)
-
-        return [(indices[0], indices[1], distances[indices])]
+        return matches(transformed_X1_new, transformed_X2_new, k, self.distance_function, self.is_max, block_size)
 
     def train(self, X1: np.ndarray, X2: np.ndarray) -> None:
         """
@@ -106,29 +221,59 @@ class TwoDCCAParallel:
         """
         self.fit(X1, X2)
 
-    def save_model(self, output_file: str) -> None:
+    def save_model(self, output_folder: str, include_statistics: bool = False) -> None:
         """
-        Save the trained model to a file.
+        Save the trained model as .npy arrays (means and left / right directions) with a JSON header.
+
+        No training data is stored; a model of 320x240x3 images takes about a megabyte, mostly the two
+        mean images.
 
         Parameters:
-        output_file (str): Path to the file where the model will be saved.
+        output_folder (str): Path to the folder where the model will be saved.
+        include_statistics (bool): Also store the streaming moments, so partial_fit can continue after loading.
 
         Returns:
         None
         """
-        with open(output_file, 'wb') as f:
-            pickle.dump(self, f)
+        if callable(self.distance_function):
+            raise ValueError("Only models with a named distance_function can be saved")
+        params = {"dimension": self.dimension, "distance_function": self.distance_function, "is_max": self.is_max,
+                  "max_iter": self.max_iter, "tol": self.tol, "regularization": self.regularization,
+                  "solver": self.solver, "random_state": self.random_state, "warm_start": self.warm_start,
+                  "n_iter": self.n_iter}
+        arrays = {"mean1": self.mean1, "mean2": self.mean2, "L1": self.L1, "R1": self.R1, "L2": self.L2,
+                  "R2": self.R2, "correlations": self.correlations}
+        if include_statistics and self.moments is not None:
+            params["count"] = self.moments.count
+            arrays.update({"moments_mean_x": self.moments.mean_x, "moments_mean_y": self.moments.mean_y,
+                           "moments_rows": np.stack(self.moments.rows),
+                           "moments_columns": np.stack(self.moments.columns)})
+        save_arrays(output_folder, type(self).__name__, params, arrays)
 
     @staticmethod
-    def load_model(model_file: str) -> 'TwoDCCAParallel':
+    def load_model(model_folder: str, mmap: bool = True) -> 'TwoDCCAParallel':
         """
-        Load a trained model from a file.
+        Load a trained model from a folder written by save_model.
 
         Parameters:
-        model_file (str): Path to the file containing the saved model.
+        model_folder (str): Path to the model folder.
+        mmap (bool): Memory-map the arrays read-only instead of reading them.
 
         Returns:
         TwoDCCAParallel: Loaded model.
         """
-        with open(model_file, 'rb') as f:
-            return pickle.load(f)
+        params, arrays = load_arrays(model_folder, "TwoDCCAParallel", mmap)
+        count = params.pop("count", 0)
+        n_iter = params.pop("n_iter")
+        model = TwoDCCAParallel(**params)
+        model.n_iter = n_iter
+        for name in ("mean1", "mean2", "L1", "R1", "L2", "R2", "correlations"):
+            setattr(model, name, arrays[name])
+        if "moments_rows" in arrays:
+            model.moments = MatrixMoments()
+            model.moments.count = count
+            model.moments.mean_x = np.array(arrays["moments_mean_x"])
+            model.moments.mean_y = np.array(arrays["moments_mean_y"])
+            model.moments.rows = list(np.array(arrays["moments_rows"]))
+            model.moments.columns = list(np.array(arrays["moments_columns"]))
+        return model
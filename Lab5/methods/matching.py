@@ -0,0 +1,125 @@
+import numpy as np
+
+METRICS = ("euclidean", "sqeuclidean", "cosine", "correlation")
+
+
+def _prepare(X: np.ndarray, metric: str) -> tuple[np.ndarray, np.ndarray]:
+    # Rows ready for a plain matrix product, together with their squared norms
+    X = np.asarray(X)
+    X = X.reshape(X.shape[0], -1).astype(np.result_type(X.dtype, np.float32), copy=False)
+    if metric == "correlation":
+        X = X - X.mean(axis=1, keepdims=True)
+    if metric in ("cosine", "correlation"):
+        norms = np.linalg.norm(X, axis=1, keepdims=True)
+        X = X / np.where(norms == 0, 1, norms)
+    return X, np.einsum("ij,ij->i", X, X)
+
+
+def _distance_block(X: np.ndarray, x_norms: np.ndarray, Y: np.ndarray, y_norms: np.ndarray,
+                    metric: str) -> np.ndarray:
+    products = X @ Y.T
+    if metric in ("cosine", "correlation"):
+        np.subtract(1, products, out=products)
+        return products
+    # |x - y|^2 = |x|^2 + |y|^2 - 2 x.y, computed in place
+    products *= -2
+    products += x_norms[:, None]
+    products += y_norms[None, :]
+    np.maximum(products, 0, out=products)
+    if metric == "euclidean":
+        np.sqrt(products, out=products)
+    return products
+
+
+def _blocks(X, Y, metric, block_size: int):
+    if callable(metric):
+        for start in range(0, len(X), block_size):
+            block = X[start:start + block_size]
+            yield start, np.array([[metric(x, y) for y in Y] for x in block], dtype=np.float64)
+        return
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS} or a function")
+    X, x_norms = _prepare(X, metric)
+    Y, y_norms = _prepare(Y, metric)
+    for start in range(0, len(X), block_size):
+        stop = start + block_size
+        yield start, _distance_block(X[start:stop], x_norms[start:stop], Y, y_norms, metric)
+
+
+def pairwise_distances(X: np.ndarray, Y: np.ndarray, metric="euclidean", block_size: int = 1024) -> np.ndarray:
+    """
+    Distances between every row of X and every row of Y through matrix products.
+
+    Parameters:
+    X (np.ndarray): Queries, shape (N, ...). Every sample is flattened.
+    Y (np.ndarray): Candidates, shape (M, ...).
+    metric (str | function): "euclidean", "sqeuclidean", "cosine", "correlation" or a function of two vectors.
+    block_size (int): Number of queries per block.
+
+    Returns:
+    np.ndarray: Distance matrix of shape (N, M).
+    """
+    distances = None
+    for start, block in _blocks(X, Y, metric, block_size):
+        if distances is None:
+            distances = np.empty((len(X), block.shape[1]), dtype=block.dtype)
+        distances[start:start + len(block)] = block
+    return distances if distances is not None else np.empty((0, len(Y)))
+
+
+def top_k(X: np.ndarray, Y: np.ndarray, k: int = 1, metric="euclidean", largest: bool = False,
+          block_size: int = 1024) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The k best candidates of Y for every query in X.
+
+    The distances are computed one block of queries at a time, so memory stays at block_size x M. Within
+    a block argpartition selects the k candidates in linear time and only those k are sorted.
+
+    Parameters:
+    X (np.ndarray): Queries, shape (N, ...).
+    Y (np.ndarray): Candidates, shape (M, ...).
+    k (int): Number of matches per query.
+    metric (str | function): See pairwise_distances.
+    largest (bool): Pick the largest distances instead of the smallest.
+    block_size (int): Number of queries per block.
+
+    Returns:
+    Tuple: (indices of shape (N, k), distances of shape (N, k)), best match first.
+    """
+    k = min(k, len(Y))
+    indices = np.empty((len(X), k), dtype=np.intp)
+    distances = np.empty((len(X), k), dtype=np.float64)
+    for start, block in _blocks(X, Y, metric, block_size):
+        keys = -block if largest else block
+        if k == 1:
+            candidates = keys.argmin(axis=1)[:, None]
+        elif k < block.shape[1]:
+            candidates = np.argpartition(keys, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(block.shape[1]), block.shape)
+        order = np.argsort(np.take_along_axis(keys, candidates, axis=1), axis=1, kind="stable")
+        best = np.take_along_axis(candidates, order, axis=1)
+        indices[start:start + len(block)] = best
+        distances[start:start + len(block)] = np.take_along_axis(block, best, axis=1)
+    return indices, distances
+
+
+def matches(X: np.ndarray, Y: np.ndarray, k: int = 1, metric="euclidean", largest: bool = False,
+            block_size: int = 1024) -> list[tuple[int, int, float]]:
+    """
+    Top-k matches per query as a flat list of triples.
+
+    Parameters:
+    X (np.ndarray): Queries.
+    Y (np.ndarray): Candidates.
+    k (int): Number of matches per query.
+    metric (str | function): See pairwise_distances.
+    largest (bool): Pick the largest distances instead of the smallest.
+    block_size (int): Number of queries per block.
+
+    Returns:
+    list[tuple[int, int, float]]: (query index, candidate index, distance), grouped by query, best first.
+    """
+    indices, distances = top_k(X, Y, k, metric, largest, block_size)
+    return [(i, int(j), float(d)) for i, (row, row_distances) in enumerate(zip(indices, distances))
+            for j, d in zip(row, row_distances)]
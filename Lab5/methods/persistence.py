@@ -0,0 +1,60 @@
+import json
+import os
+
+import numpy as np
+
+HEADER = "model.json"
+FORMAT_VERSION = 1
+
+
+def save_arrays(folder: str, kind: str, params: dict, arrays: dict) -> None:
+    """
+    Save a model as one .npy file per array next to a small JSON header.
+
+    Nothing is pickled: the header holds plain parameters and the arrays are raw .npy files, so loading
+    executes no code and the arrays can be memory-mapped.
+
+    Parameters:
+    folder (str): Output folder, created when missing.
+    kind (str): Model class name, checked when loading.
+    params (dict): JSON-serialisable constructor parameters and scalars.
+    arrays (dict[str, np.ndarray]): Arrays of the model. None values are skipped.
+
+    Returns:
+    None
+    """
+    os.makedirs(folder, exist_ok=True)
+    names = []
+    for name, array in arrays.items():
+        if array is None:
+            continue
+        np.save(os.path.join(folder, f"{name}.npy"), np.asarray(array), allow_pickle=False)
+        names.append(name)
+
+    header = {"format": FORMAT_VERSION, "kind": kind, "params": params, "arrays": names}
+    temporary_path = os.path.join(folder, HEADER + ".tmp")
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(header, f, indent=1)
+    # The header is written last, so a folder with a header always has all its arrays
+    os.replace(temporary_path, os.path.join(folder, HEADER))
+
+
+def load_arrays(folder: str, kind: str, mmap: bool = True) -> (dict, dict):
+    """
+    Load a model saved with save_arrays.
+
+    Parameters:
+    folder (str): Model folder.
+    kind (str): Expected model class name.
+    mmap (bool): Memory-map the arrays read-only instead of reading them (zero-copy).
+
+    Returns:
+    Tuple: (params, arrays); arrays missing from the file are None.
+    """
+    with open(os.path.join(folder, HEADER), encoding="utf-8") as f:
+        header = json.load(f)
+    if header.get("format") != FORMAT_VERSION or header.get("kind") != kind:
+        raise ValueError(f"{folder} does not contain a {kind} model")
+    arrays = {name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r" if mmap else None,
+                            allow_pickle=False) for name in header["arrays"]}
+    return header["params"], arrays
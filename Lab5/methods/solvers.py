@@ -0,0 +1,148 @@
+import numpy as np
+
+SOLVERS = ("auto", "dense", "randomized", "arpack")
+
+
+def _flip_signs(U: np.ndarray, Vt: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Make the largest entry of every left vector positive, so repeated fits give the same directions
+    signs = np.sign(U[np.abs(U).argmax(axis=0), np.arange(U.shape[1])])
+    signs[signs == 0] = 1
+    return U * signs, Vt * signs[:, None]
+
+
+def randomized_svd(M: np.ndarray, k: int, n_oversamples: int = 10, n_iter: int = 4,
+                   rng=None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Leading singular triplets from a random range finder with power iterations (Halko, Martinsson, Tropp).
+
+    Every power iteration is re-orthonormalised with a QR step, which keeps the small singular values
+    from being lost to round-off. The cost is O(m n (k + n_oversamples)) per iteration.
+
+    Parameters:
+    M (np.ndarray): Matrix of shape (m, n).
+    k (int): Number of components.
+    n_oversamples (int): Extra random directions that make the captured subspace accurate.
+    n_iter (int): Number of power iterations.
+    rng (np.random.Generator | int | None): Random generator or seed.
+
+    Returns:
+    Tuple: (U of shape (m, k), singular values, Vt of shape (k, n))
+    """
+    rng = np.random.default_rng(rng)
+    size = min(k + n_oversamples, *M.shape)
+    Q = np.linalg.qr(M @ rng.standard_normal((M.shape[1], size)))[0]
+    for _ in range(n_iter):
+        Q = np.linalg.qr(M.T @ Q)[0]
+        Q = np.linalg.qr(M @ Q)[0]
+    U, s, Vt = np.linalg.svd(Q.T @ M, full_matrices=False)
+    return (Q @ U)[:, :k], s[:k], Vt[:k]
+
+
+def top_svd(M: np.ndarray, k: int, solver: str = "auto", rng=None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Top-k singular triplets of a matrix, sorted by decreasing singular value.
+
+    Parameters:
+    M (np.ndarray): Matrix of shape (m, n).
+    k (int): Number of components, at most min(m, n).
+    solver (str): "dense" (full LAPACK SVD), "randomized", "arpack" (Lanczos, scipy) or "auto", which
+                  uses the dense SVD up to a thousand rows or columns and the randomized one above.
+    rng (np.random.Generator | int | None): Random generator or seed of the iterative solvers.
+
+    Returns:
+    Tuple: (U of shape (m, k), singular values, Vt of shape (k, n))
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver {solver!r}, expected one of {SOLVERS}")
+    k = min(k, *M.shape)
+    if solver == "auto":
+        solver = "dense" if min(M.shape) <= max(4 * k, 1000) else "randomized"
+    # ARPACK needs k < min(m, n)
+    if solver == "arpack" and k >= min(M.shape):
+        solver = "dense"
+
+    if solver == "dense":
+        U, s, Vt = np.linalg.svd(M, full_matrices=False)
+        U, s, Vt = U[:, :k], s[:k], Vt[:k]
+    elif solver == "randomized":
+        U, s, Vt = randomized_svd(M, k, rng=rng)
+    else:
+        from scipy.sparse.linalg import svds
+
+        rng = np.random.default_rng(rng)
+        U, s, Vt = svds(M, k=k, v0=rng.standard_normal(min(M.shape)))
+        order = np.argsort(s)[::-1]
+        U, s, Vt = U[:, order], s[order], Vt[order]
+    U, Vt = _flip_signs(U, Vt)
+    return U, s, Vt
+
+
+def _whitening(eigenvalues: np.ndarray, ridge: float) -> np.ndarray:
+    return 1 / np.sqrt(np.maximum(eigenvalues, 0) + ridge)
+
+
+def cca_covariance(C11: np.ndarray, C22: np.ndarray, C12: np.ndarray, k: int, regularization: float = 1e-3,
+                   solver: str = "auto", rng=None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Regularised CCA from covariance matrices, e.g. accumulated over batches.
+
+    Parameters:
+    C11 (np.ndarray): Covariance of the first set, shape (p, p).
+    C22 (np.ndarray): Covariance of the second set, shape (q, q).
+    C12 (np.ndarray): Cross-covariance, shape (p, q).
+    k (int): Number of canonical pairs.
+    regularization (float): Ridge relative to the mean eigenvalue of each covariance.
+    solver (str): SVD backend, see top_svd.
+    rng (np.random.Generator | int | None): Random generator or seed of the iterative solvers.
+
+    Returns:
+    Tuple: (directions of the first set (p, k), directions of the second set (q, k), canonical correlations)
+    """
+    tiny = np.finfo(np.float64).tiny
+    eigenvalues1, V1 = np.linalg.eigh(C11)
+    eigenvalues2, V2 = np.linalg.eigh(C22)
+    K1 = V1 * _whitening(eigenvalues1, regularization * max(np.trace(C11) / len(C11), tiny))
+    K2 = V2 * _whitening(eigenvalues2, regularization * max(np.trace(C22) / len(C22), tiny))
+    U, correlations, Vt = top_svd(K1.T @ C12 @ K2, k, solver, rng)
+    return K1 @ U, K2 @ Vt.T, correlations
+
+
+def cca(A: np.ndarray, B: np.ndarray, k: int, regularization: float = 1e-3, solver: str = "auto",
+        rng=None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Regularised CCA of two centred data matrices.
+
+    The whitened cross-covariance (C11 + r1 I)^(-1/2) C12 (C22 + r2 I)^(-1/2) is symmetric-equivalent to the
+    eigenproblem of [[0, K], [K^T, 0]]; only its top-k singular triplets are computed. The ridge r is
+    relative to the mean eigenvalue of each covariance. With more samples than features the covariances are
+    whitened directly; otherwise the problem is solved in sample space from thin SVDs of the data, which is
+    linear in the number of features.
+
+    Parameters:
+    A (np.ndarray): First set, shape (n, p), one centred sample per row.
+    B (np.ndarray): Second set, shape (n, q).
+    k (int): Number of canonical pairs.
+    regularization (float): Relative ridge.
+    solver (str): SVD backend, see top_svd.
+    rng (np.random.Generator | int | None): Random generator or seed of the iterative solvers.
+
+    Returns:
+    Tuple: (directions of A (p, k), directions of B (q, k), canonical correlations)
+    """
+    A = np.asarray(A, dtype=np.float64)
+    B = np.asarray(B, dtype=np.float64)
+    n, p = A.shape
+    q = B.shape[1]
+    tiny = np.finfo(np.float64).tiny
+
+    if n >= max(p, q):
+        return cca_covariance(A.T @ A / n, B.T @ B / n, A.T @ B / n, k, regularization, solver, rng)
+
+    # Sample space: A = Ua diag(Sa) Va^T, the cross-covariance lives in span(Va) x span(Vb)
+    Ua, Sa, Vta = np.linalg.svd(A, full_matrices=False)
+    Ub, Sb, Vtb = np.linalg.svd(B, full_matrices=False)
+    f1 = _whitening(Sa ** 2 / n, regularization * max((Sa ** 2).sum() / (n * p), tiny))
+    f2 = _whitening(Sb ** 2 / n, regularization * max((Sb ** 2).sum() / (n * q), tiny))
+    core = ((f1 * Sa)[:, None] * (Ua.T @ Ub) * (f2 * Sb)[None, :]) / n
+    U, correlations, Vt = top_svd(core, k, solver, rng)
+    return Vta.T @ (f1[:, None] * U), Vtb.T @ (f2[:, None] * Vt.T), correlations
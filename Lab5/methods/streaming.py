@@ -0,0 +1,256 @@
+import numpy as np
+
+
+class CountSketch:
+    def __init__(self, n_features: int, n_components: int = 1024, random_state: int = None):
+        """
+        Data-independent reduction of flattened images for streaming fits.
+
+        Every input feature is added with a random sign to one of n_components outputs, which preserves inner
+        products in expectation. Unlike a dense random projection it needs O(n_features) memory and can be
+        fixed before the first batch arrives.
+
+        Parameters:
+        n_features (int): Number of input features.
+        n_components (int): Number of output features.
+        random_state (int): Seed of the hash.
+
+        Returns:
+        None
+        """
+        rng = np.random.default_rng(random_state)
+        self.n_features = n_features
+        self.n_components = min(n_components, n_features)
+        self.buckets = rng.integers(self.n_components, size=n_features)
+        self.signs = rng.choice(np.array([-1.0, 1.0], dtype=np.float32), size=n_features)
+        self._matrix = None
+
+    @staticmethod
+    def from_hash(buckets: np.ndarray, signs: np.ndarray, n_components: int) -> 'CountSketch':
+        """
+        Rebuild a sketch from its saved buckets and signs.
+
+        Parameters:
+        buckets (np.ndarray): Output index of every input feature.
+        signs (np.ndarray): Sign of every input feature.
+        n_components (int): Number of output features.
+
+        Returns:
+        CountSketch: The sketch.
+        """
+        sketch = CountSketch.__new__(CountSketch)
+        sketch.__setstate__({"n_features": len(buckets), "n_components": n_components, "buckets": buckets,
+                             "signs": signs})
+        return sketch
+
+    @property
+    def matrix(self):
+        # Sparse (n_features x n_components) matrix with one entry per row, built on first use
+        if self._matrix is None:
+            from scipy.sparse import csr_matrix
+
+            self._matrix = csr_matrix((self.signs, (np.arange(self.n_features), self.buckets)),
+                                      shape=(self.n_features, self.n_components))
+        return self._matrix
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        """
+        Reduce a batch.
+
+        Parameters:
+        X (np.ndarray): Batch of shape (n, ...) with n_features values per sample.
+
+        Returns:
+        np.ndarray: Reduced batch of shape (n, n_components).
+        """
+        X = X.reshape(X.shape[0], int(np.prod(X.shape[1:])))
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        # (S^T X^T)^T keeps the sparse matrix on the left, where scipy multiplies fastest
+        return np.asarray((self.matrix.T @ X.T.astype(np.float32)).T)
+
+    def __getstate__(self):
+        return {"n_features": self.n_features, "n_components": self.n_components, "buckets": self.buckets,
+                "signs": self.signs}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._matrix = None
+
+
+class CrossCovariance:
+    def __init__(self):
+        """
+        Running means and (cross-)covariances of paired samples, merged batch by batch.
+
+        Batches are combined with the parallel update of Chan et al. from their own centred moments, so
+        the result is as accurate as a two-pass computation and new pairs can be added at any time.
+
+        Returns:
+        None
+        """
+        self.count = 0
+        self.mean_x = None
+        self.mean_y = None
+        self.xx = None
+        self.yy = None
+        self.xy = None
+
+    def update(self, X: np.ndarray, Y: np.ndarray) -> 'CrossCovariance':
+        """
+        Add a batch of pairs.
+
+        Parameters:
+        X (np.ndarray): Batch of the first set, shape (n, p).
+        Y (np.ndarray): Batch of the second set, shape (n, q).
+
+        Returns:
+        CrossCovariance: self.
+        """
+        if len(X) != len(Y):
+            raise ValueError("The batches must have the same number of samples")
+        if len(X) == 0:
+            return self
+        X = np.asarray(X, dtype=np.float64)
+        Y = np.asarray(Y, dtype=np.float64)
+        n = len(X)
+        mean_x, mean_y = X.mean(axis=0), Y.mean(axis=0)
+        X = X - mean_x
+        Y = Y - mean_y
+        if self.count == 0:
+            self.count, self.mean_x, self.mean_y = n, mean_x, mean_y
+            self.xx, self.yy, self.xy = X.T @ X, Y.T @ Y, X.T @ Y
+            return self
+
+        total = self.count + n
+        weight = self.count * n / total
+        delta_x, delta_y = mean_x - self.mean_x, mean_y - self.mean_y
+        self.xx += X.T @ X + weight * np.outer(delta_x, delta_x)
+        self.yy += Y.T @ Y + weight * np.outer(delta_y, delta_y)
+        self.xy += X.T @ Y + weight * np.outer(delta_x, delta_y)
+        self.mean_x += delta_x * n / total
+        self.mean_y += delta_y * n / total
+        self.count = total
+        return self
+
+    def covariances(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns:
+        Tuple: (C_xx, C_yy, C_xy) normalised by the number of samples.
+        """
+        if self.count == 0:
+            raise ValueError("No samples were added")
+        return self.xx / self.count, self.yy / self.count, self.xy / self.count
+
+
+class SketchedCrossCovariance(CrossCovariance):
+    def __init__(self, n_components: int = 1024, random_state: int = None):
+        """
+        CrossCovariance of flattened images reduced by a CountSketch per set.
+
+        The sketches are created from the number of features of the first batch.
+
+        Parameters:
+        n_components (int): Size of the reduced space of each set.
+        random_state (int): Seed of the sketches.
+
+        Returns:
+        None
+        """
+        super().__init__()
+        self.n_components = n_components
+        self.random_state = random_state
+        self.sketch_x = None
+        self.sketch_y = None
+
+    def update(self, X: np.ndarray, Y: np.ndarray) -> 'SketchedCrossCovariance':
+        """
+        Add a batch of image pairs.
+
+        Parameters:
+        X (np.ndarray): Images of the first set, shape (n, ...).
+        Y (np.ndarray): Images of the second set, shape (n, ...).
+
+        Returns:
+        SketchedCrossCovariance: self.
+        """
+        if self.sketch_x is None:
+            seeds = np.random.SeedSequence(self.random_state).spawn(2)
+            self.sketch_x = CountSketch(int(np.prod(X.shape[1:])), self.n_components, seeds[0])
+            self.sketch_y = CountSketch(int(np.prod(Y.shape[1:])), self.n_components, seeds[1])
+        return super().update(self.sketch_x(X), self.sketch_y(Y))
+
+    def center(self, X: np.ndarray, Y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Reduce and centre new images with the sketches and means of the accumulated data.
+
+        Returns:
+        Tuple: (reduced X, reduced Y)
+        """
+        return self.sketch_x(X) - self.mean_x, self.sketch_y(Y) - self.mean_y
+
+
+class MatrixMoments:
+    def __init__(self):
+        """
+        Running 2D moments of paired matrix samples (images as rows x columns) for streaming 2DCCA.
+
+        Keeps the mean matrices and, with M and P the means, the row statistics sum (X - M)(X - M)^T,
+        sum (Y - P)(Y - P)^T, sum (X - M)(Y - P)^T and the same column statistics with the transposes.
+        Batches are merged like in CrossCovariance.
+
+        Returns:
+        None
+        """
+        self.count = 0
+        self.mean_x = None
+        self.mean_y = None
+        self.rows = None
+        self.columns = None
+
+    @staticmethod
+    def _products(X: np.ndarray, Y: np.ndarray) -> tuple:
+        # Sums over samples of X_i X_i^T, Y_i Y_i^T, X_i Y_i^T and of the column versions, as single matrix products
+        n, height, width = X.shape
+        X_rows, Y_rows = X.transpose(1, 0, 2).reshape(height, -1), Y.transpose(1, 0, 2).reshape(height, -1)
+        X_columns, Y_columns = X.reshape(-1, width), Y.reshape(-1, width)
+        rows = (X_rows @ X_rows.T, Y_rows @ Y_rows.T, X_rows @ Y_rows.T)
+        columns = (X_columns.T @ X_columns, Y_columns.T @ Y_columns, X_columns.T @ Y_columns)
+        return rows, columns
+
+    def update(self, X: np.ndarray, Y: np.ndarray) -> 'MatrixMoments':
+        """
+        Add a batch of pairs.
+
+        Parameters:
+        X (np.ndarray): Batch of shape (n, H, W).
+        Y (np.ndarray): Batch of shape (n, H, W).
+
+        Returns:
+        MatrixMoments: self.
+        """
+        if X.shape != Y.shape:
+            raise ValueError("Streaming 2D moments need both sets in the same shape")
+        if len(X) == 0:
+            return self
+        n = len(X)
+        mean_x, mean_y = X.mean(axis=0, dtype=np.float64), Y.mean(axis=0, dtype=np.float64)
+        X = X - mean_x
+        Y = Y - mean_y
+        rows, columns = self._products(X, Y)
+        if self.count == 0:
+            self.count, self.mean_x, self.mean_y = n, mean_x, mean_y
+            self.rows, self.columns = list(rows), list(columns)
+            return self
+
+        total = self.count + n
+        weight = self.count * n / total
+        delta_x, delta_y = (mean_x - self.mean_x)[None], (mean_y - self.mean_y)[None]
+        delta_rows, delta_columns = self._products(delta_x, delta_y)
+        for i in range(3):
+            self.rows[i] += rows[i] + weight * delta_rows[i]
+            self.columns[i] += columns[i] + weight * delta_columns[i]
+        self.mean_x += delta_x[0] * n / total
+        self.mean_y += delta_y[0] * n / total
+        self.count = total
+        return self
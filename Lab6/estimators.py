@@ -0,0 +1,419 @@
+import time
+from statistics import NormalDist
+
+import numpy as np
+
+import monte_carlo
+from monte_carlo import CHUNK_SIZE
+
+
+class Result:
+    def __init__(self, mean: float, std_error: float, count: int, elapsed: float = 0.0, seed=None):
+        """
+        Outcome of an estimator run.
+
+        Parameters:
+        mean (float): Estimated value of the integral (area).
+        std_error (float): Standard error reported by the estimator.
+        count (int): Number of integrand evaluations.
+        elapsed (float): Wall time of the run in seconds.
+        seed: Seed the run can be reproduced with.
+
+        Returns:
+        None
+        """
+        self.mean = mean
+        self.std_error = std_error
+        self.count = count
+        self.elapsed = elapsed
+        self.seed = seed
+        self.converged = False
+
+    def half_width(self, confidence: float = 0.95) -> float:
+        """
+        Half-width of the normal confidence interval around the estimate.
+
+        Parameters:
+        confidence (float): Confidence level.
+
+        Returns:
+        float: Half-width of the interval.
+        """
+        return NormalDist().inv_cdf((1 + confidence) / 2) * self.std_error
+
+    @property
+    def efficiency(self) -> float:
+        """
+        Accuracy per unit of time, 1 / (std_error^2 * elapsed). Larger is better.
+        """
+        if self.std_error == 0 or self.elapsed == 0:
+            return float("inf")
+        return 1.0 / (self.std_error ** 2 * self.elapsed)
+
+
+def _volume(low: np.ndarray, high: np.ndarray) -> float:
+    return float(np.prod(high - low))
+
+
+def plain(func, n: int, low, high, rng, chunk_size: int = CHUNK_SIZE, on_chunk=None) -> Result:
+    """
+    Crude Monte Carlo with independent uniform points.
+    """
+    estimate = monte_carlo.estimate(func, n, low, high, rng, chunk_size, on_chunk)
+    return Result(estimate.mean, estimate.std_error, estimate.count)
+
+
+def stratified(func, n: int, low, high, rng, chunk_size: int = CHUNK_SIZE, on_chunk=None,
+               per_stratum: int = 2) -> Result:
+    """
+    Stratified sampling over a regular grid of s^d cells with per_stratum uniform points in each cell.
+
+    The estimator is the volume-weighted sum of the cell means and its variance is
+    sum over cells of (w_k^2 * var_k / n_k), estimated from the spread inside every cell.
+    """
+    low = np.asarray(low, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    dimension = low.size
+    side = max(int((n // per_stratum) ** (1 / dimension) + 1e-9), 1)
+    strata = side ** dimension
+    cell = (high - low) / side
+    group = max(chunk_size // per_stratum, 1)
+
+    mean_sum, variance_sum = 0.0, 0.0
+    for first in range(0, strata, group):
+        indices = np.arange(first, min(first + group, strata))
+        corners = np.array(np.unravel_index(indices, (side,) * dimension), dtype=np.float64)
+        points = rng.random((dimension, indices.size, per_stratum))
+        points += corners[:, :, None]
+        points *= cell[:, None, None]
+        points += low[:, None, None]
+        points = points.reshape(dimension, -1)
+        values = func(*points)
+        if on_chunk is not None:
+            on_chunk(points, values)
+
+        values = values.reshape(indices.size, per_stratum).astype(np.float64)
+        mean_sum += float(values.mean(axis=1).sum())
+        variance_sum += float(values.var(axis=1, ddof=1).sum()) / per_stratum if per_stratum > 1 else 0.0
+
+    volume = _volume(low, high)
+    return Result(volume * mean_sum / strata, volume * np.sqrt(variance_sum) / strata, strata * per_stratum)
+
+
+def antithetic(func, n: int, low, high, rng, chunk_size: int = CHUNK_SIZE, on_chunk=None) -> Result:
+    """
+    Antithetic variates: every point x is paired with its reflection low + high - x
+    and the pair averages are treated as independent samples.
+    """
+    low = np.asarray(low, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    estimate = monte_carlo.Estimate(volume=_volume(low, high))
+    for points in monte_carlo.sample_chunks(n // 2, low, high, rng, chunk_size):
+        values = func(*points).astype(np.float64)
+        reflected = (low + high)[:, None] - points
+        reflected_values = func(*reflected).astype(np.float64)
+        if on_chunk is not None:
+            on_chunk(points, values)
+        estimate.update((values + reflected_values) / 2)
+    return Result(estimate.mean, estimate.std_error, 2 * estimate.count)
+
+
+def control_variates(func, n: int, low, high, rng, chunk_size: int = CHUNK_SIZE, on_chunk=None) -> Result:
+    """
+    Control variates with the coordinates x_i and their squares x_i^2 as controls, whose means
+    over the box are known exactly. The optimal coefficients are fitted by least squares on the
+    same sample from streamed cross-products.
+    """
+    low = np.asarray(low, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    dimension = low.size
+    controls = 2 * dimension
+    controls_mean = np.concatenate([(low + high) / 2, (low ** 2 + low * high + high ** 2) / 3])
+
+    # Rows: constant, centred controls x_i - E[x_i] and x_i^2 - E[x_i^2], integrand
+    gram = np.zeros((controls + 2, controls + 2))
+    for points in monte_carlo.sample_chunks(n, low, high, rng, chunk_size):
+        values = func(*points)
+        if on_chunk is not None:
+            on_chunk(points, values)
+        rows = np.empty((controls + 2, points.shape[1]))
+        rows[0] = 1
+        rows[1:dimension + 1] = points
+        rows[dimension + 1:controls + 1] = points * points
+        rows[1:controls + 1] -= controls_mean[:, None]
+        rows[-1] = values
+        gram += rows @ rows.T
+
+    count = gram[0, 0]
+    controls_sum, values_sum = gram[0, 1:-1], gram[0, -1]
+    s_cc = gram[1:-1, 1:-1] - np.outer(controls_sum, controls_sum) / count
+    s_cf = gram[1:-1, -1] - controls_sum * values_sum / count
+    s_ff = gram[-1, -1] - values_sum ** 2 / count
+    beta = np.linalg.lstsq(s_cc, s_cf, rcond=None)[0]
+
+    mean = (values_sum - beta @ controls_sum) / count
+    residual = max(s_ff - beta @ s_cf, 0.0) / max(count - controls - 1, 1)
+    volume = _volume(low, high)
+    return Result(volume * mean, volume * np.sqrt(residual / count), int(count))
+
+
+def importance(func, n: int, low, high, rng, chunk_size: int = CHUNK_SIZE, on_chunk=None,
+               bins: int = 64, pilot_share: float = 0.1, defensive: float = 0.1) -> Result:
+    """
+    Importance sampling with a piecewise-constant density along the first axis.
+
+    A uniform pilot run estimates the root mean square of the integrand in every bin; the main run
+    samples bins in proportion to it (mixed with a uniform share for safety) and reweights by the
+    likelihood ratio. Only the main run enters the estimate, the pilot is counted in the cost.
+    """
+    low = np.asarray(low, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    width = high[0] - low[0]
+
+    pilot = max(min(int(n * pilot_share), 10 ** 6), bins)
+    square_sum = np.zeros(bins)
+    hits = np.zeros(bins)
+    for points in monte_carlo.sample_chunks(pilot, low, high, rng, chunk_size):
+        values = func(*points).astype(np.float64)
+        bin_index = np.minimum(((points[0] - low[0]) * (bins / width)).astype(np.intp), bins - 1)
+        square_sum += np.bincount(bin_index, weights=values * values, minlength=bins)
+        hits += np.bincount(bin_index, minlength=bins)
+
+    shape = np.sqrt(square_sum / np.maximum(hits, 1))
+    probability = np.full(bins, 1.0 / bins) if shape.sum() == 0 else shape / shape.sum()
+    probability = (1 - defensive) * probability + defensive / bins
+    ratio = 1.0 / (probability * bins)
+
+    estimate = monte_carlo.Estimate(volume=_volume(low, high))
+    remaining = max(n - pilot, 2)
+    for points in monte_carlo.sample_chunks(remaining, low, high, rng, chunk_size):
+        bin_index = rng.choice(bins, size=points.shape[1], p=probability)
+        points[0] = low[0] + (bin_index + (points[0] - low[0]) / width) * (width / bins)
+        values = func(*points)
+        if on_chunk is not None:
+            on_chunk(points, values)
+        estimate.update(values * ratio[bin_index])
+    return Result(estimate.mean, estimate.std_error, pilot + estimate.count)
+
+
+def _radical_inverse(indices: np.ndarray, base: int) -> np.ndarray:
+    result = np.zeros(indices.size)
+    factor = 1.0 / base
+    indices = indices.copy()
+    while indices.any():
+        indices, digits = np.divmod(indices, base)
+        result += digits * factor
+        factor /= base
+    return result
+
+
+# Spacing of the points of scipy's Sobol engine, which uses 30 bits by default
+SOBOL_RESOLUTION = 2.0 ** -30
+
+_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97)
+
+
+def _halton_replicate(dimension: int, count: int, rng, chunk_size: int):
+    if dimension > len(_PRIMES):
+        raise ValueError(f"Halton sequence supports up to {len(_PRIMES)} dimensions")
+    # Cranley-Patterson rotation: a random shift modulo 1 makes each replicate unbiased
+    shift = rng.random(dimension)
+    for first in range(0, count, chunk_size):
+        indices = np.arange(first + 1, min(first + chunk_size, count) + 1, dtype=np.int64)
+        points = np.empty((dimension, indices.size))
+        for axis in range(dimension):
+            points[axis] = _radical_inverse(indices, _PRIMES[axis])
+        points += shift[:, None]
+        yield np.mod(points, 1.0, out=points)
+
+
+def _sobol_replicate(dimension: int, count: int, rng, chunk_size: int):
+    from scipy.stats import qmc
+
+    # A one-dimensional scrambled set gives the same sums for every scramble, so the replicates would not
+    # differ; the first coordinate of a two-dimensional set is scrambled independently per replicate
+    engine = qmc.Sobol(d=max(dimension, 2), scramble=True, seed=rng)
+    chunk = 1 << max(chunk_size.bit_length() - 1, 0)
+    for first in range(0, count, chunk):
+        yield engine.random(min(chunk, count - first))[:, :dimension].T
+
+
+def _quasi(replicate, func, n: int, low, high, rng, chunk_size: int, on_chunk, replicates: int,
+           resolution: float, power_of_two: bool = False) -> Result:
+    low = np.asarray(low, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    count = max(n // replicates, 1)
+    if power_of_two:
+        count = 1 << (count.bit_length() - 1)
+
+    # Independent randomizations of the same low-discrepancy set give an honest standard error
+    means = np.empty(replicates)
+    smallest, largest = np.inf, -np.inf
+    for r in range(replicates):
+        total = 0.0
+        for unit in replicate(low.size, count, rng, chunk_size):
+            points = low[:, None] + unit * (high - low)[:, None]
+            values = func(*points)
+            if on_chunk is not None:
+                on_chunk(points, values)
+            total += float(np.sum(values, dtype=np.float64))
+            if values.size:
+                smallest, largest = min(smallest, float(np.min(values))), max(largest, float(np.max(values)))
+        means[r] = total / count
+
+    volume = _volume(low, high)
+    # The replicates share the bias of the finite resolution of the points, which their spread does not show;
+    # nor is the error zero when they agree to the last bit. The reported error is at least that bias
+    floor = max((largest - smallest) * resolution, np.finfo(np.float64).eps * abs(means.mean()),
+                np.finfo(np.float64).tiny)
+    std_error = max(means.std(ddof=1) / np.sqrt(replicates), floor)
+    return Result(volume * means.mean(), volume * std_error, replicates * count)
+
+
+def halton(func, n: int, low, high, rng, chunk_size: int = CHUNK_SIZE, on_chunk=None, replicates: int = 16) -> Result:
+    """
+    Randomized quasi-Monte Carlo on the Halton sequence with random shifts.
+    """
+    return _quasi(_halton_replicate, func, n, low, high, rng, chunk_size, on_chunk, replicates,
+                  np.finfo(np.float64).eps)
+
+
+def sobol(func, n: int, low, high, rng, chunk_size: int = CHUNK_SIZE, on_chunk=None, replicates: int = 16) -> Result:
+    """
+    Randomized quasi-Monte Carlo on scrambled Sobol points (requires SciPy).
+    The number of points per replicate is rounded down to a power of two.
+    """
+    return _quasi(_sobol_replicate, func, n, low, high, rng, chunk_size, on_chunk, replicates, SOBOL_RESOLUTION,
+                  power_of_two=True)
+
+
+ESTIMATORS = {
+    "plain": plain,
+    "stratified": stratified,
+    "antithetic": antithetic,
+    "control_variates": control_variates,
+    "importance": importance,
+    "halton": halton,
+    "sobol": sobol,
+}
+
+
+def run(method: str, func, n: int, low, high, seed=None, workers: int = 1, on_chunk=None,
+        chunk_size: int = CHUNK_SIZE) -> (Result, object):
+    """
+    Run the selected estimator and time it.
+
+    Parameters:
+    method (str): Key of ESTIMATORS.
+    func (function): Vectorized integrand or predicate taking one coordinate array per dimension.
+    n (int): Number of trials.
+    low (sequence of float): Lower corner of the box.
+    high (sequence of float): Upper corner of the box.
+    seed (int): Seed of the random generator, None for a fresh one.
+    workers (int): Number of processes, only the plain estimator runs in parallel.
+    on_chunk (PointReservoir | DensityRaster): Optional view of the sampled points.
+    chunk_size (int): Maximum number of points per batch.
+
+    Returns:
+    Tuple: (Result, view with the sampled points or None)
+    """
+    if method not in ESTIMATORS:
+        raise ValueError(f"Unknown estimator: {method}")
+
+    start = time.perf_counter()
+    if method == "plain" and workers > 1:
+        estimate, on_chunk = monte_carlo.parallel_estimate(func, n, low, high, workers, seed, chunk_size, on_chunk)
+        result = Result(estimate.mean, estimate.std_error, estimate.count, seed=estimate.seed)
+    else:
+        result = ESTIMATORS[method](func, n, low, high, np.random.default_rng(seed), chunk_size, on_chunk)
+        result.seed = seed
+    result.elapsed = time.perf_counter() - start
+    return result, on_chunk
+
+
+def run_until(method: str, func, low, high, tolerance: float, confidence: float = 0.95, time_budget: float = None,
+              max_n: int = None, seed=None, relative: bool = False, on_chunk=None, callback=None, cancel=None,
+              chunk_size: int = CHUNK_SIZE, report_every: float = 0.1) -> (Result, object):
+    """
+    Sample in chunks until the confidence interval is narrow enough, the time budget runs out or max_n is reached.
+
+    For the plain estimator every point value enters a running Welford mean and variance. Other estimators
+    are run on successive independent batches and the batch estimates are tracked the same way, so the
+    interval needs no knowledge of the exact answer.
+
+    Parameters:
+    method (str): Key of ESTIMATORS.
+    func (function): Vectorized integrand or predicate taking one coordinate array per dimension.
+    low (sequence of float): Lower corner of the box.
+    high (sequence of float): Upper corner of the box.
+    tolerance (float): Target half-width of the confidence interval.
+    confidence (float): Confidence level of the interval.
+    time_budget (float): Maximum wall time in seconds, None for no limit.
+    max_n (int): Maximum number of integrand evaluations, None for no limit.
+    seed (int): Seed of the random generator, None for a fresh one.
+    relative (bool): Treat tolerance as relative to the absolute value of the estimate.
+    on_chunk (PointReservoir | DensityRaster): Optional view of the sampled points.
+    callback (function): Receives intermediate Result objects, at most once per report_every seconds.
+    cancel (threading.Event): Stops the run early when set.
+    chunk_size (int): Number of points per chunk (per batch for the non-plain estimators).
+    report_every (float): Minimum interval between two callback calls in seconds.
+
+    Returns:
+    Tuple: (final Result, view with the sampled points or None)
+    """
+    if method not in ESTIMATORS:
+        raise ValueError(f"Unknown estimator: {method}")
+
+    low = np.asarray(low, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    limit = max_n if max_n else 1 << 62
+    start = last_report = time.perf_counter()
+
+    # Batch estimates are few and may coincide, so the interval is trusted only after several of them
+    if method == "plain":
+        stats = monte_carlo.Estimate(volume=_volume(low, high))
+        chunks = monte_carlo.sample_chunks(limit, low, high, rng, chunk_size)
+        minimum = 2
+    else:
+        stats = monte_carlo.Estimate()
+        minimum = 10
+        # Sum of the squared errors the batches report themselves, see below
+        batch_variance = 0.0
+    count = 0
+
+    while True:
+        if method == "plain":
+            points = next(chunks, None)
+            if points is None:
+                break
+            values = func(*points)
+            stats.update(values)
+            if on_chunk is not None:
+                on_chunk(points, values)
+            count = stats.count
+        else:
+            batch = ESTIMATORS[method](func, chunk_size, low, high, rng, chunk_size, on_chunk)
+            stats.update(np.array([batch.mean]))
+            batch_variance += batch.std_error ** 2
+            count += batch.count
+
+        now = time.perf_counter()
+        std_error = stats.std_error
+        if method != "plain":
+            # The mean of k batches is no more accurate than their own errors allow, even when they coincide
+            std_error = max(std_error, np.sqrt(batch_variance) / stats.count)
+        result = Result(stats.mean, std_error, count, now - start, seed)
+        width = tolerance * abs(result.mean) if relative else tolerance
+        result.converged = stats.count >= minimum and result.half_width(confidence) <= width
+        finished = (result.converged or count >= limit or (time_budget is not None and now - start >= time_budget)
+                    or (cancel is not None and cancel.is_set()))
+
+        if callback is not None and (finished or now - last_report >= report_every):
+            callback(result)
+            last_report = now
+        if finished:
+            return result, on_chunk
+
+    std_error = stats.std_error if method == "plain" else max(stats.std_error, np.sqrt(batch_variance) / stats.count)
+    return Result(stats.mean, std_error, count, time.perf_counter() - start, seed), on_chunk
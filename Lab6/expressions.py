@@ -0,0 +1,247 @@
+import ast
+import math
+import operator
+import re
+
+import numpy as np
+
+FUNCTIONS = {
+    "sin": np.sin, "cos": np.cos, "tan": np.tan,
+    "arcsin": np.arcsin, "arccos": np.arccos, "arctan": np.arctan,
+    "sinh": np.sinh, "cosh": np.cosh, "tanh": np.tanh,
+    "exp": np.exp, "log": np.log, "log10": np.log10, "sqrt": np.sqrt,
+    "abs": np.abs, "floor": np.floor, "ceil": np.ceil,
+    "minimum": np.minimum, "maximum": np.maximum,
+}
+CONSTANTS = {"pi": np.pi, "e": np.e}
+
+_BINARY = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+           ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow}
+_COMPARE = (ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+_INDEXED = re.compile(r"x(\d+)$")
+# Largest integer power of constants computed at compile time, in bits; a float64 holds 1024
+MAX_POWER_BITS = 1024
+
+
+def _ipow(base, exponent: int):
+    # Small integer powers as repeated products: np.power takes the slow generic path for them
+    result = base
+    for _ in range(exponent - 1):
+        result = result * base
+    return result
+
+
+def _is_boolean(node: ast.AST) -> bool:
+    # Comparisons and their combinations, the only operands 'not', 'and' and 'or' accept
+    return isinstance(node, (ast.Compare, ast.BoolOp)) or (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not))
+
+
+def _fold(op: ast.operator, left, right) -> ast.Constant:
+    # Operation on two constants, computed once at compile time so that it cannot fail during a run
+    if (isinstance(op, ast.Pow) and isinstance(left, int) and isinstance(right, int) and right > 0
+            and abs(left).bit_length() * right > MAX_POWER_BITS + 1):
+        raise ValueError("Слишком большая степень в выражении")
+    try:
+        value = _BINARY[type(op)](left, right)
+        # Complex results (negative base, fractional exponent) are rejected by float as well
+        finite = math.isfinite(float(value))
+    except (ArithmeticError, TypeError):
+        finite = False
+    if not finite:
+        raise ValueError("Константное выражение не имеет конечного значения")
+    return ast.Constant(value=value)
+
+
+class _Vectorizer(ast.NodeTransformer):
+    def __init__(self, variables):
+        self.variables = variables
+
+    def generic_visit(self, node):
+        raise ValueError(f"Недопустимая конструкция в выражении: {type(node).__name__}")
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ValueError(f"Недопустимая константа: {node.value!r}")
+        return node
+
+    def visit_Name(self, node):
+        if node.id not in self.variables and node.id not in CONSTANTS:
+            raise ValueError(f"Неизвестное имя: {node.id}")
+        return node
+
+    def visit_UnaryOp(self, node):
+        if isinstance(node.op, ast.Not):
+            # '~' of a float array fails only when the expression is evaluated
+            if not _is_boolean(node.operand):
+                raise ValueError("'not' применим только к сравнениям и логическим выражениям")
+            return ast.UnaryOp(op=ast.Invert(), operand=self.visit(node.operand))
+        if isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self.visit(node.operand)
+            if isinstance(operand, ast.Constant):
+                return ast.Constant(value=-operand.value if isinstance(node.op, ast.USub) else operand.value)
+            return ast.UnaryOp(op=node.op, operand=operand)
+        raise ValueError("Недопустимый унарный оператор")
+
+    def visit_BinOp(self, node):
+        if type(node.op) not in _BINARY:
+            raise ValueError("Недопустимый бинарный оператор")
+        left, right = self.visit(node.left), self.visit(node.right)
+        if isinstance(left, ast.Constant) and isinstance(right, ast.Constant):
+            return _fold(node.op, left.value, right.value)
+        if (isinstance(node.op, ast.Pow) and isinstance(right, ast.Constant) and isinstance(right.value, int)
+                and 2 <= right.value <= 4):
+            return ast.Call(func=ast.Name(id="_ipow", ctx=ast.Load()), args=[left, right], keywords=[])
+        return ast.BinOp(left=left, op=node.op, right=right)
+
+    def visit_BoolOp(self, node):
+        # 'and' / 'or' become element-wise '&' / '|', which like '~' need boolean operands
+        if not all(map(_is_boolean, node.values)):
+            raise ValueError("'and' и 'or' применимы только к сравнениям и логическим выражениям")
+        bitwise = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        values = [self.visit(value) for value in node.values]
+        result = values[0]
+        for value in values[1:]:
+            result = ast.BinOp(left=result, op=bitwise, right=value)
+        return result
+
+    def visit_Compare(self, node):
+        # Chained comparisons a < b < c become (a < b) & (b < c)
+        operands = [self.visit(node.left)] + [self.visit(value) for value in node.comparators]
+        parts = []
+        for op, left, right in zip(node.ops, operands, operands[1:]):
+            if not isinstance(op, _COMPARE):
+                raise ValueError("Недопустимое сравнение")
+            parts.append(ast.Compare(left=left, ops=[op], comparators=[right]))
+        result = parts[0]
+        for part in parts[1:]:
+            result = ast.BinOp(left=result, op=ast.BitAnd(), right=part)
+        return result
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise ValueError("Допустимы только функции: " + ", ".join(FUNCTIONS))
+        return ast.Call(func=node.func, args=[self.visit(arg) for arg in node.args], keywords=[])
+
+
+def _variables_of(tree: ast.AST) -> tuple:
+    names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+    names -= set(FUNCTIONS) | set(CONSTANTS)
+    indexed = [int(match.group(1)) for match in map(_INDEXED.match, names) if match]
+    if indexed:
+        return tuple(f"x{i}" for i in range(1, max(indexed) + 1))
+    for variables in (("x",), ("x", "y"), ("x", "y", "z")):
+        if names <= set(variables):
+            return variables
+    raise ValueError("Используйте переменные x, y, z или x1, ..., xd")
+
+
+class Kernel:
+    def __init__(self, source: str, variables: tuple = None):
+        """
+        User expression compiled once into a vectorized NumPy function of the coordinate arrays.
+
+        Only arithmetic, comparisons, 'and' / 'or' / 'not', the functions from FUNCTIONS and the
+        constants pi and e are accepted. Comparisons produce a predicate (membership mask of a region),
+        anything else an integrand.
+
+        Parameters:
+        source (str): Expression, e.g. "x ** 2 - y ** 3 < 2 and x + y < 1".
+        variables (tuple[str]): Names of the coordinates in order. Inferred from the expression when None.
+
+        Returns:
+        None
+        """
+        self.source = source
+        tree = ast.parse(source.strip(), mode="eval")
+        self.variables = tuple(variables) if variables else _variables_of(tree)
+        self.is_predicate = _is_boolean(tree.body)
+        tree = ast.fix_missing_locations(_Vectorizer(set(self.variables)).visit(tree))
+        self._code = compile(tree, "<expression>", "eval")
+        self._namespace = {"__builtins__": {}, "_ipow": _ipow, **FUNCTIONS, **CONSTANTS}
+
+    @property
+    def dimension(self) -> int:
+        """
+        Number of coordinates the expression depends on.
+        """
+        return len(self.variables)
+
+    def __call__(self, *coordinates: np.ndarray) -> np.ndarray:
+        """
+        Evaluate the expression on arrays of coordinates.
+
+        Parameters:
+        coordinates (np.ndarray): One array per variable, all of the same shape.
+
+        Returns:
+        np.ndarray: Values (or membership mask) of the same shape as the coordinates.
+        """
+        scope = dict(zip(self.variables, coordinates))
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            result = eval(self._code, self._namespace, scope)
+        return np.broadcast_to(result, np.shape(coordinates[0]))
+
+    # Compiled code objects are not picklable: workers recompile the source
+    def __getstate__(self):
+        return {"source": self.source, "variables": self.variables}
+
+    def __setstate__(self, state):
+        self.__init__(state["source"], state["variables"])
+
+
+def parse_bounds(text: str, dimension: int) -> (tuple, tuple):
+    """
+    Parse box limits written as "a1 b1; a2 b2; ...". A single pair is repeated for every dimension.
+
+    Parameters:
+    text (str): Limits of the box.
+    dimension (int): Number of dimensions.
+
+    Returns:
+    Tuple: (lower corner, upper corner)
+    """
+    pairs = [part.replace(",", " ").split() for part in text.split(";") if part.strip()]
+    if len(pairs) == 1:
+        pairs *= dimension
+    if len(pairs) != dimension or any(len(pair) != 2 for pair in pairs):
+        raise ValueError(f"Ожидается {dimension} пар границ вида 'a b; ...'")
+    low = tuple(float(a) for a, _ in pairs)
+    high = tuple(float(b) for _, b in pairs)
+    if any(a >= b for a, b in zip(low, high)):
+        raise ValueError("Нижняя граница должна быть меньше верхней")
+    return low, high
+
+
+def estimate_bounds(region, dimension: int, search: float = 10.0, samples: int = 1 << 18, rng=None) -> (tuple, tuple):
+    """
+    Find a bounding box of a region from random probes in the window [-search, search]^d.
+
+    A coarse pass locates the inside points and a second pass inside the enlarged box refines the limits.
+    The margin of one probe spacing on each side keeps the thin parts the probes may have missed.
+
+    Parameters:
+    region (function): Vectorized predicate.
+    dimension (int): Number of dimensions.
+    search (float): Half-width of the search window. Regions reaching it are cut at the window.
+    samples (int): Number of probes per pass.
+    rng (np.random.Generator | int | None): Random generator or seed.
+
+    Returns:
+    Tuple: (lower corner, upper corner)
+    """
+    rng = np.random.default_rng(rng)
+    low = np.full(dimension, -search)
+    high = np.full(dimension, search)
+    for _ in range(2):
+        points = low[:, None] + rng.random((dimension, samples)) * (high - low)[:, None]
+        inside = points[:, region(*points)]
+        if inside.shape[1] == 0:
+            raise ValueError("Не удалось найти точки области, задайте границы вручную")
+        margin = (high - low) / samples ** (1 / dimension)
+        low = np.maximum(inside.min(axis=1) - margin, -search)
+        high = np.minimum(inside.max(axis=1) + margin, search)
+    return tuple(low.tolist()), tuple(high.tolist())
@@ -1,5 +1,30 @@
+import queue
+import threading
 import tkinter as tk
-from random import uniform
+import numpy as np
+import estimators
+import expressions
+import monte_carlo
+
+METHODS = {
+    "Простой Монте-Карло": "plain",
+    "Стратифицированная выборка": "stratified",
+    "Антитетические переменные": "antithetic",
+    "Контрольные переменные": "control_variates",
+    "Выборка по значимости": "importance",
+    "Квази-Монте-Карло (Соболь)": "sobol",
+    "Квази-Монте-Карло (Холтон)": "halton",
+}
+
+# Expression and box limits offered for each task, and the analytic answers known for them
+DEFAULTS = {
+    1: ("x ** 2 - y ** 3 < 2 and x + y < 1", "-2 2; -2 2"),
+    2: ("x ** 2", "0 2"),
+}
+REFERENCE = {
+    (1, "x ** 2 - y ** 3 < 2 and x + y < 1", "-2 2; -2 2"): 6.37517,
+    (2, "x ** 2", "0 2"): 8 / 3,  # Аналитическое решение для интеграла x^2 от 0 до 2
+}
 
 
 class MonteCarloSimulator:
@@ -13,88 +38,291 @@ class MonteCarloSimulator:
         tk.Label(self.frame, text="Выберите задание:").grid(row=0, column=0, sticky="w")
 
         self.var = tk.IntVar()
-        tk.Radiobutton(self.frame, text="Определение площади фигуры", variable=self.var, value=1).grid(row=1, column=0, sticky="w")
-        tk.Radiobutton(self.frame, text="Вычисление определенного интеграла", variable=self.var, value=2).grid(row=2, column=0, sticky="w")
+        tk.Radiobutton(self.frame, text="Определение площади фигуры", variable=self.var, value=1,
+                       command=self.fill_defaults).grid(row=1, column=0, sticky="w")
+        tk.Radiobutton(self.frame, text="Вычисление определенного интеграла", variable=self.var, value=2,
+                       command=self.fill_defaults).grid(row=2, column=0, sticky="w")
+
+        tk.Label(self.frame, text="Условие области / подынтегральная функция:").grid(row=3, column=0, sticky="w")
+        self.entry_expression = tk.Entry(self.frame, width=35)
+        self.entry_expression.grid(row=3, column=1)
 
-        tk.Label(self.frame, text="Введите количество испытаний (N):").grid(row=3, column=0, sticky="w")
+        tk.Label(self.frame, text="Границы 'a b; c d' (пусто - авто):").grid(row=4, column=0, sticky="w")
+        self.entry_bounds = tk.Entry(self.frame, width=35)
+        self.entry_bounds.grid(row=4, column=1)
+
+        tk.Label(self.frame, text="Введите количество испытаний (N):").grid(row=5, column=0, sticky="w")
         self.entry_n = tk.Entry(self.frame)
-        self.entry_n.grid(row=3, column=1)
+        self.entry_n.grid(row=5, column=1)
+
+        tk.Label(self.frame, text="Точность (полуширина 95% ДИ):").grid(row=6, column=0, sticky="w")
+        self.entry_tolerance = tk.Entry(self.frame)
+        self.entry_tolerance.grid(row=6, column=1)
+
+        tk.Label(self.frame, text="Лимит времени, с:").grid(row=7, column=0, sticky="w")
+        self.entry_time = tk.Entry(self.frame)
+        self.entry_time.grid(row=7, column=1)
+
+        tk.Label(self.frame, text="Количество процессов:").grid(row=8, column=0, sticky="w")
+        self.entry_workers = tk.Entry(self.frame)
+        self.entry_workers.insert(0, "1")
+        self.entry_workers.grid(row=8, column=1)
+
+        tk.Label(self.frame, text="Seed (пусто - случайный):").grid(row=9, column=0, sticky="w")
+        self.entry_seed = tk.Entry(self.frame)
+        self.entry_seed.grid(row=9, column=1)
+
+        tk.Label(self.frame, text="Метод оценки:").grid(row=10, column=0, sticky="w")
+        self.method_var = tk.StringVar(value=next(iter(METHODS)))
+        tk.OptionMenu(self.frame, self.method_var, *METHODS).grid(row=10, column=1, sticky="we")
+
+        self.view_var = tk.IntVar(value=1)
+        tk.Radiobutton(self.frame, text="Выборка точек", variable=self.view_var, value=1).grid(row=11, column=0, sticky="w")
+        tk.Radiobutton(self.frame, text="Плотность точек", variable=self.view_var, value=2).grid(row=11, column=1, sticky="w")
 
         self.calculate_button = tk.Button(self.frame, text="Вычислить", command=self.calculate)
-        self.calculate_button.grid(row=4, columnspan=2, pady=5)
+        self.calculate_button.grid(row=12, column=0, pady=5)
+
+        self.stop_button = tk.Button(self.frame, text="Остановить", command=self.stop, state="disabled")
+        self.stop_button.grid(row=12, column=1, pady=5)
 
         self.result_label = tk.Label(self.frame, text="")
-        self.result_label.grid(row=5, columnspan=2)
+        self.result_label.grid(row=13, columnspan=2)
 
         self.error_label = tk.Label(self.frame, text="")
-        self.error_label.grid(row=6, columnspan=2)
+        self.error_label.grid(row=14, columnspan=2)
+
+        self.stats_label = tk.Label(self.frame, text="")
+        self.stats_label.grid(row=15, columnspan=2)
 
         self.canvas = tk.Canvas(self.frame, width=400, height=400, bg='white')
-        self.canvas.grid(row=7, columnspan=2, pady=10)
+        self.canvas.grid(row=16, columnspan=2, pady=10)
+        self.image = None
+        self.view_box = ((-4, -4), (4, 4))
+        self.sample_box = ((-2, -2), (2, 2))
+        self.reference = None
+        self.results = queue.Queue()
+        self.cancel = threading.Event()
+
+    def monte_carlo_area(self, area, n, method="plain", workers=1, seed=None, view=None, low=(-2, -2), high=(2, 2)):
+        # The estimator runs headless, the canvas only gets a fixed-size view of the samples
+        return estimators.run(method, area, n, low, high, seed, workers, on_chunk=view)  # S = (K / N) * S0
+
+    def monte_carlo_integral(self, func, a, b, n, method="plain", workers=1, seed=None):
+        # a and b are numbers for a simple integral or the corners of the box for a multiple one
+        return estimators.run(method, func, n, np.atleast_1d(a), np.atleast_1d(b), seed, workers)[0]
 
-    def monte_carlo_area(self, area, n):
-        inside = 0
+    def monte_carlo_adaptive(self, func, low, high, tolerance, time_budget, n=None, method="plain", seed=None, view=None,
+                             callback=None):
+        # Runs until the 95% confidence interval is narrow enough, N (if given) and the time budget are upper limits
+        return estimators.run_until(method, func, low, high, tolerance, 0.95, time_budget, n, seed, on_chunk=view,
+                                    callback=callback, cancel=self.cancel)
+
+    def show_view(self, view):
         self.canvas.delete("all")
+        if isinstance(view, monte_carlo.DensityRaster):
+            self.draw_density(view)
+        else:
+            self.draw_points(*view.sample())
         self.draw_axes()
-        for _ in range(n):
-            x = uniform(-2, 2)
-            y = uniform(-2, 2)
-            screen_x = 200 + x * 50
-            screen_y = 200 - y * 50
-            if area(x, y):
-                self.canvas.create_oval(screen_x - 2, screen_y - 2, screen_x + 2, screen_y + 2, fill='blue', outline='blue')
-                inside += 1
-            else:
-                self.canvas.create_oval(screen_x - 2, screen_y - 2, screen_x + 2, screen_y + 2, fill='red', outline='red')
-        return (inside / n) * 16  # S = (K / N) * S0
 
-    def monte_carlo_integral(self, func, a, b, n):
-        integral_sum = 0
-        for _ in range(n):
-            x = uniform(a, b)
-            integral_sum += func(x)
-        return (integral_sum / n) * (b - a)
+    def to_screen(self, x, y):
+        (x0, y0), (x1, y1) = self.view_box
+        return (x - x0) * (400 / (x1 - x0)), (y1 - y) * (400 / (y1 - y0))
 
-    def area_condition(self, x, y):
-        return x ** 2 - y ** 3 < 2 and x + y < 1
+    def draw_density(self, raster):
+        (x0, y0), (x1, y1) = self.sample_box
+        left, top = self.to_screen(x0, y1)
+        right, bottom = self.to_screen(x1, y0)
+        zoom_x = max(int(round((right - left) / raster.shape[1])), 1)
+        zoom_y = max(int(round((bottom - top) / raster.shape[0])), 1)
+        self.image = tk.PhotoImage(data=raster.to_ppm(), format="PPM").zoom(zoom_x, zoom_y)
+        self.canvas.create_image(left, top, image=self.image, anchor="nw")
 
-    def func(self, x):
-        return x ** 2
+    def draw_points(self, points, inside):
+        screen_x, screen_y = self.to_screen(points[0], points[1])
+        for x, y, is_inside in zip(screen_x.tolist(), screen_y.tolist(), inside.tolist()):
+            color = 'blue' if is_inside else 'red'
+            self.canvas.create_oval(x - 2, y - 2, x + 2, y + 2, fill=color, outline=color)
 
     def draw_axes(self):
+        (x0, y0), (x1, y1) = self.view_box
+        origin_x, origin_y = map(float, self.to_screen(min(max(0, x0), x1), min(max(0, y0), y1)))
         # Draw x-axis
-        self.canvas.create_line(0, 200, 400, 200, fill="black")
+        self.canvas.create_line(0, origin_y, 400, origin_y, fill="black")
         # Draw y-axis
-        self.canvas.create_line(200, 0, 200, 400, fill="black")
+        self.canvas.create_line(origin_x, 0, origin_x, 400, fill="black")
+
+        # Ticks are put on the integer points of the sampled box
+        (x0, y0), (x1, y1) = self.sample_box
 
         # Draw ticks on x-axis
-        for i in range(-2, 3):
-            x = 200 + i * 50
-            self.canvas.create_line(x, 195, x, 205, fill="black")
-            self.canvas.create_text(x, 215, text=str(i), fill="black")
+        step = max(int(np.ceil((x1 - x0) / 4)), 1)
+        for i in range(int(np.ceil(x0)), int(np.floor(x1)) + 1, step):
+            x = float(self.to_screen(i, 0)[0])
+            self.canvas.create_line(x, origin_y - 5, x, origin_y + 5, fill="black")
+            self.canvas.create_text(x, origin_y + 15, text=str(i), fill="black")
 
         # Draw ticks on y-axis
-        for i in range(-2, 3):
-            y = 200 - i * 50
-            self.canvas.create_line(195, y, 205, y, fill="black")
-            self.canvas.create_text(185, y, text=str(i), fill="black")
+        step = max(int(np.ceil((y1 - y0) / 4)), 1)
+        for i in range(int(np.ceil(y0)), int(np.floor(y1)) + 1, step):
+            y = float(self.to_screen(0, i)[1])
+            self.canvas.create_line(origin_x - 5, y, origin_x + 5, y, fill="black")
+            self.canvas.create_text(origin_x - 15, y, text=str(i), fill="black")
 
-    def calculate(self):
+    def fill_defaults(self):
+        expression, bounds = DEFAULTS[self.var.get()]
+        self.entry_expression.delete(0, tk.END)
+        self.entry_expression.insert(0, expression)
+        self.entry_bounds.delete(0, tk.END)
+        self.entry_bounds.insert(0, bounds)
+
+    @staticmethod
+    def read_field(entry, parse, minimum, message, default=None):
+        # Value of an optional entry; a ValueError carries the message naming the field
+        text = entry.get().strip()
+        if not text:
+            return default
         try:
-            n = int(self.entry_n.get())
-            if self.var.get() == 1:
-                result = self.monte_carlo_area(self.area_condition, n)
-                relative_error = abs(result - 6.37517) / 6.37517
-                self.result_label.config(text=f"Площадь фигуры: {result:.5f}")
-                self.error_label.config(text=f"Относительная погрешность: {relative_error:.5f}")
-            elif self.var.get() == 2:
-                result = self.monte_carlo_integral(self.func, 0, 2, n)
-                analytic_result = 8 / 3  # Аналитическое решение для интеграла x^2 от 0 до 2
-                relative_error = abs(result - analytic_result) / analytic_result
-                self.result_label.config(text=f"Результат Монте-Карло: {result:.5f}")
-                self.error_label.config(text=f"Относительная погрешность: {relative_error:.5f}")
+            value = parse(text)
         except ValueError:
-            self.result_label.config(text="Ошибка: введите целое число для N.")
+            raise ValueError(message)
+        if not value >= minimum:
+            raise ValueError(message)
+        return value
+
+    def calculate(self):
+        try:
+            n = self.read_field(self.entry_n, int, 1, "введите целое число N не меньше 1.")
+            workers = self.read_field(self.entry_workers, int, 1, "количество процессов должно быть целым числом "
+                                                                   "не меньше 1.", default=1)
+            seed = self.read_field(self.entry_seed, int, 0, "seed должен быть целым неотрицательным числом.")
+            tolerance = self.read_field(self.entry_tolerance, float, np.finfo(float).tiny,
+                                        "точность должна быть положительным числом.")
+            time_budget = self.read_field(self.entry_time, float, 0, "лимит времени должен быть неотрицательным "
+                                                                     "числом секунд.")
+        except ValueError as error:
+            self.result_label.config(text=f"Ошибка: {error}")
+            return
+        if n is None and tolerance is None:
+            self.result_label.config(text="Ошибка: задайте N или требуемую точность.")
+            return
+        if self.var.get() not in (1, 2):
+            return
+
+        task = self.var.get()
+        expression = self.entry_expression.get().strip()
+        bounds = self.entry_bounds.get().strip()
+        if not expression:
+            expression, bounds = DEFAULTS[task][0], bounds or DEFAULTS[task][1]
+        try:
+            kernel = expressions.Kernel(expression)
+            if task == 1 and not kernel.is_predicate:
+                raise ValueError("условие области должно быть сравнением, например x ** 2 + y ** 2 < 1")
+            if bounds:
+                low, high = expressions.parse_bounds(bounds, kernel.dimension)
+            elif task == 1:
+                low, high = None, None
+            else:
+                raise ValueError("задайте пределы интегрирования")
+        except (ValueError, SyntaxError) as error:
+            self.result_label.config(text=f"Ошибка: {error}")
+            return
+        self.reference = REFERENCE.get((task, expression, bounds))
+
+        # Only planar regions are drawn on the canvas
+        view_type = self.view_var.get() if task == 1 and kernel.dimension == 2 else 0
+
+        # Estimation runs off the Tk thread, the results are picked up by poll_results
+        self.cancel.clear()
+        self.calculate_button.config(state="disabled")
+        self.stop_button.config(state="normal" if tolerance is not None else "disabled")
+        self.result_label.config(text="Вычисление...")
+        self.error_label.config(text="")
+        self.stats_label.config(text="")
+        method = METHODS[self.method_var.get()]
+        threading.Thread(target=self.run_task,
+                         args=(task, n, method, workers, seed, view_type, tolerance, time_budget, kernel, low, high),
+                         daemon=True).start()
+        self.root.after(50, self.poll_results)
+
+    def stop(self):
+        self.cancel.set()
+
+    def run_task(self, task, n, method, workers, seed, view_type, tolerance=None, time_budget=None, kernel=None,
+                 low=None, high=None):
+        try:
+            func = kernel
+            if low is None:
+                low, high = expressions.estimate_bounds(kernel, kernel.dimension, rng=seed)
+            if view_type == 2:
+                view = monte_carlo.DensityRaster(low=low, high=high)
+            elif view_type == 1:
+                view = monte_carlo.PointReservoir()
+            else:
+                view = None
+
+            if tolerance is not None:
+                result, view = self.monte_carlo_adaptive(func, low, high, tolerance, time_budget, n, method, seed, view,
+                                                         callback=lambda partial: self.results.put(("progress", task, partial, None, None)))
+            elif task == 1:
+                result, view = self.monte_carlo_area(func, n, method, workers, seed, view, low, high)
+            else:
+                result = self.monte_carlo_integral(func, low, high, n, method, workers, seed)
+            self.results.put(("done", task, result, view, (low, high)))
+        except Exception as error:
+            self.results.put(("error", task, error, None, None))
+
+    def poll_results(self):
+        # Drain everything that arrived since the last poll, only the latest estimate is shown
+        latest = None
+        while True:
+            try:
+                latest = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if latest[0] != "progress":
+                break
+        if latest is None or latest[0] == "progress":
+            if latest is not None:
+                self.show_result(latest[1], latest[2], running=True)
+            self.root.after(50, self.poll_results)
+            return
+
+        kind, task, result, view, box = latest
+        self.calculate_button.config(state="normal")
+        self.stop_button.config(state="disabled")
+        if kind == "error":
+            self.result_label.config(text=f"Ошибка: {result}")
+            return
+        if view is not None:
+            # The sampled box takes the middle half of the canvas, as with the original [-2, 2] square
+            low, high = np.asarray(box[0], dtype=float), np.asarray(box[1], dtype=float)
+            center, half = (low + high) / 2, (high - low) / 2
+            self.sample_box = box
+            self.view_box = (tuple(center - 2 * half), tuple(center + 2 * half))
+            self.show_view(view)
+        self.show_result(task, result)
+
+    def show_result(self, task, result, running=False):
+        if task == 1:
+            self.result_label.config(text=f"Площадь фигуры: {result.mean:.5f} ± {result.half_width():.5f} (95% ДИ)")
+        else:
+            self.result_label.config(text=f"Результат Монте-Карло: {result.mean:.5f} ± {result.half_width():.5f} (95% ДИ)")
+        seed_text = f"seed {result.seed}" if result.seed is not None else ""
+        if self.reference is not None:
+            relative_error = abs(result.mean - self.reference) / self.reference
+            self.error_label.config(text=f"Относительная погрешность: {relative_error:.5f} {seed_text}")
+        else:
+            self.error_label.config(text=seed_text)
+        if running:
+            state = ", идёт расчёт..."
+        elif result.converged:
+            state = ", точность достигнута"
+        else:
+            state = ""
+        self.stats_label.config(text=f"Испытаний: {result.count}, время: {result.elapsed:.3f} с, "
+                                     f"эффективность 1/(σ²t): {result.efficiency:.3g}{state}")
 
 
 if __name__ == "__main__":
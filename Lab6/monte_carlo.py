@@ -0,0 +1,471 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Number of points drawn per batch. Bounds the working memory independently of N
+CHUNK_SIZE = 1 << 16
+
+
+def area_condition(x, y):
+    """
+    Vectorized membership test for the figure x^2 - y^3 < 2, x + y < 1.
+
+    Parameters:
+    x (np.ndarray): X coordinates of the points.
+    y (np.ndarray): Y coordinates of the points.
+
+    Returns:
+    np.ndarray: Boolean mask of the points lying inside the figure.
+    """
+    return (x * x - y * y * y < 2) & (x + y < 1)
+
+
+def func(x):
+    """
+    Vectorized integrand f(x) = x^2.
+
+    Parameters:
+    x (np.ndarray): Points to evaluate.
+
+    Returns:
+    np.ndarray: Values of the integrand.
+    """
+    return x * x
+
+
+def sample_chunks(n: int, low, high, rng=None, chunk_size: int = CHUNK_SIZE):
+    """
+    Draw n points uniformly distributed in the box [low, high] in fixed-size batches.
+
+    The same buffer is refilled for every batch, so the consumer must not keep
+    references to the yielded arrays between iterations.
+
+    Parameters:
+    n (int): Total number of points.
+    low (sequence of float): Lower corner of the box, one value per dimension.
+    high (sequence of float): Upper corner of the box, one value per dimension.
+    rng (np.random.Generator | int | None): Random generator or seed.
+    chunk_size (int): Maximum number of points per batch.
+
+    Returns:
+    Generator of np.ndarray: Arrays of shape (d, m) with m <= chunk_size.
+    """
+    low = np.asarray(low, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    rng = np.random.default_rng(rng)
+    dimension = low.size
+    buffer = np.empty(dimension * min(n, chunk_size))
+    width = (high - low)[:, None]
+    offset = low[:, None]
+
+    done = 0
+    while done < n:
+        size = min(chunk_size, n - done)
+        points = buffer[:dimension * size].reshape(dimension, size)
+        rng.random(out=points)
+        points *= width
+        points += offset
+        yield points
+        done += size
+
+
+class Estimate:
+    def __init__(self, volume: float = 1.0, count: int = 0, mean_value: float = 0.0, m2: float = 0.0):
+        """
+        Running mean and variance of the sampled values (Welford's algorithm, batches combined by Chan's formula).
+        Partial estimates of independent streams are merged exactly.
+
+        Parameters:
+        volume (float): Volume of the sampled box, the mean value is scaled by it.
+        count (int): Number of sampled values.
+        mean_value (float): Mean of the sampled values.
+        m2 (float): Sum of squared deviations from the mean.
+
+        Returns:
+        None
+        """
+        self.volume = volume
+        self.count = count
+        self.mean_value = mean_value
+        self.m2 = m2
+        self.seed = None
+
+    def update(self, values: np.ndarray) -> None:
+        """
+        Add a batch of sampled values.
+
+        Parameters:
+        values (np.ndarray): Values of the integrand or the membership mask.
+
+        Returns:
+        None
+        """
+        size = values.size
+        if size == 0:
+            return
+        if values.dtype == bool:
+            inside = int(np.count_nonzero(values))
+            batch_mean = inside / size
+            batch_m2 = inside * (1 - batch_mean) ** 2 + (size - inside) * batch_mean ** 2
+        else:
+            values = values.astype(np.float64, copy=False)
+            batch_mean = float(np.mean(values))
+            deviations = values - batch_mean
+            batch_m2 = float(np.dot(deviations, deviations))
+        self._combine(size, batch_mean, batch_m2)
+
+    def _combine(self, count: int, mean_value: float, m2: float) -> None:
+        total = self.count + count
+        delta = mean_value - self.mean_value
+        self.mean_value += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def merge(self, other: 'Estimate') -> 'Estimate':
+        """
+        Combine with the estimate of an independent stream over the same box.
+
+        Parameters:
+        other (Estimate): Estimate to merge with.
+
+        Returns:
+        Estimate: Merged estimate.
+        """
+        merged = Estimate(self.volume, self.count, self.mean_value, self.m2)
+        if other.count:
+            merged._combine(other.count, other.mean_value, other.m2)
+        return merged
+
+    @property
+    def mean(self) -> float:
+        """
+        Monte Carlo estimate of the integral (area), volume * mean value.
+        """
+        return self.volume * self.mean_value if self.count else float("nan")
+
+    @property
+    def std_error(self) -> float:
+        """
+        Standard error of the estimate.
+        """
+        if self.count < 2:
+            return float("inf")
+        return self.volume * np.sqrt(self.m2 / (self.count - 1) / self.count)
+
+
+def estimate(func, n: int, low, high, rng=None, chunk_size: int = CHUNK_SIZE, on_chunk=None) -> Estimate:
+    """
+    Estimate the integral of func over the box [low, high] by the mean value method.
+
+    Parameters:
+    func (function): Vectorized integrand or predicate taking one coordinate array per dimension.
+    n (int): Number of trials.
+    low (sequence of float): Lower corner of the box.
+    high (sequence of float): Upper corner of the box.
+    rng (np.random.Generator | int | None): Random generator or seed.
+    chunk_size (int): Maximum number of points per batch.
+    on_chunk (function): Optional callback receiving every batch of points and the sampled values.
+
+    Returns:
+    Estimate: Accumulated estimate.
+    """
+    result = Estimate(volume=float(np.prod(np.subtract(high, low))))
+    for points in sample_chunks(n, low, high, rng, chunk_size):
+        values = func(*points)
+        result.update(values)
+        if on_chunk is not None:
+            on_chunk(points, values)
+    return result
+
+
+def monte_carlo_area(area, n: int, low=(-2, -2), high=(2, 2), rng=None, chunk_size: int = CHUNK_SIZE,
+                     on_chunk=None) -> float:
+    """
+    Estimate the area (volume) of a figure by counting the random points falling inside it.
+
+    Parameters:
+    area (function): Vectorized predicate taking one coordinate array per dimension.
+    n (int): Number of trials.
+    low (sequence of float): Lower corner of the bounding box.
+    high (sequence of float): Upper corner of the bounding box.
+    rng (np.random.Generator | int | None): Random generator or seed.
+    chunk_size (int): Maximum number of points per batch.
+    on_chunk (function): Optional callback receiving every batch of points and its mask.
+
+    Returns:
+    float: Estimated area, S = (K / N) * S0.
+    """
+    return estimate(area, n, low, high, rng, chunk_size, on_chunk).mean
+
+
+def monte_carlo_integral(func, a: float, b: float, n: int, rng=None, chunk_size: int = CHUNK_SIZE) -> float:
+    """
+    Estimate the definite integral of func over [a, b] by the mean value method.
+
+    Parameters:
+    func (function): Vectorized integrand.
+    a (float): Lower limit of integration.
+    b (float): Upper limit of integration.
+    n (int): Number of trials.
+    rng (np.random.Generator | int | None): Random generator or seed.
+    chunk_size (int): Maximum number of points per batch.
+
+    Returns:
+    float: Estimated value of the integral.
+    """
+    return estimate(func, n, (a,), (b,), rng, chunk_size).mean
+
+
+def _estimate_worker(func, n: int, low, high, seed_sequence, chunk_size: int, view):
+    rng = np.random.default_rng(seed_sequence)
+    return estimate(func, n, low, high, rng, chunk_size, view), view
+
+
+def parallel_estimate(func, n: int, low, high, workers: int = None, seed: int = None, chunk_size: int = CHUNK_SIZE,
+                      view=None) -> (Estimate, object):
+    """
+    Estimate the integral of func in a process pool, one independent random stream per worker.
+
+    The streams are spawned from a single SeedSequence and the partial sums are merged in worker order,
+    so the result is bit-identical for a given seed and number of workers.
+
+    Parameters:
+    func (function): Vectorized integrand or predicate. Must be picklable, i.e. defined at module level.
+    n (int): Number of trials.
+    low (sequence of float): Lower corner of the box.
+    high (sequence of float): Upper corner of the box.
+    workers (int): Number of processes. Default is the number of CPUs.
+    seed (int): Root seed. A fresh one is drawn and stored in the result when None.
+    chunk_size (int): Maximum number of points per batch.
+    view (PointReservoir | DensityRaster): Optional view; each worker fills an empty copy made by view.spawn
+        and the copies are merged.
+
+    Returns:
+    Tuple: (merged Estimate, merged view or None)
+    """
+    workers = workers or os.cpu_count() or 1
+    root = np.random.SeedSequence(seed)
+    streams = root.spawn(workers)
+    sizes = [n // workers + (1 if i < n % workers else 0) for i in range(workers)]
+    # A child of the worker's stream, so the view's random choices are independent of the sampled points
+    views = [None if view is None else view.spawn(stream.spawn(1)[0]) for stream in streams]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_estimate_worker, func, size, low, high, stream, chunk_size, worker_view)
+                   for size, stream, worker_view in zip(sizes, streams, views)]
+        results = [future.result() for future in futures]
+
+    merged, merged_view = results[0]
+    for partial, partial_view in results[1:]:
+        merged = merged.merge(partial)
+        if merged_view is not None:
+            merged_view = merged_view.merge(partial_view)
+    merged.seed = root.entropy
+    return merged, merged_view
+
+
+class PointReservoir:
+    def __init__(self, size: int = 2000, rng=None):
+        """
+        Bounded uniform sample of the points seen by an estimator (reservoir sampling, algorithm L).
+
+        Parameters:
+        size (int): Maximum number of points kept.
+        rng (np.random.Generator | int | None): Random generator or seed, independent of the estimator's one.
+
+        Returns:
+        None
+        """
+        self.size = size
+        self.rng = np.random.default_rng(rng)
+        self.points = None
+        self.inside = np.zeros(size, dtype=bool)
+        self.seen = 0
+        self._weight = np.exp(np.log(self.rng.random()) / size)
+        self._next = size + self._skip()
+
+    def _skip(self) -> int:
+        return int(np.floor(np.log(self.rng.random()) / np.log1p(-self._weight)))
+
+    def spawn(self, seed_sequence: np.random.SeedSequence) -> 'PointReservoir':
+        """
+        Empty reservoir of the same size for another stream of points.
+
+        Parameters:
+        seed_sequence (np.random.SeedSequence): Seed of the new reservoir's random generator.
+
+        Returns:
+        PointReservoir: The new reservoir.
+        """
+        return PointReservoir(self.size, seed_sequence)
+
+    def __call__(self, points: np.ndarray, inside: np.ndarray) -> None:
+        """
+        Offer a batch of points to the reservoir.
+
+        Parameters:
+        points (np.ndarray): Points of shape (d, m).
+        inside (np.ndarray): Boolean mask of the points lying inside the figure.
+
+        Returns:
+        None
+        """
+        if self.points is None:
+            self.points = np.empty((points.shape[0], self.size))
+        start, count = self.seen, points.shape[1]
+
+        if start < self.size:
+            take = min(count, self.size - start)
+            self.points[:, start:start + take] = points[:, :take]
+            self.inside[start:start + take] = inside[:take]
+
+        # Only the selected points are touched, O(k log(N / k)) in total
+        while self._next < start + count:
+            index = self._next - start
+            slot = self.rng.integers(self.size)
+            self.points[:, slot] = points[:, index]
+            self.inside[slot] = inside[index]
+            self._weight *= np.exp(np.log(self.rng.random()) / self.size)
+            self._next += self._skip() + 1
+
+        self.seen += count
+
+    def merge(self, other: 'PointReservoir') -> 'PointReservoir':
+        """
+        Combine with the reservoir of an independent stream, keeping each side in proportion to the points it saw.
+
+        Parameters:
+        other (PointReservoir): Reservoir to merge with.
+
+        Returns:
+        PointReservoir: Merged reservoir.
+        """
+        points, inside = self.sample()
+        other_points, other_inside = other.sample()
+        seen = self.seen + other.seen
+        if seen == 0:
+            return self
+
+        kept = min(self.size, points.shape[1] + other_points.shape[1])
+        own = self.rng.hypergeometric(self.seen, other.seen, kept) if self.seen and other.seen else (kept if self.seen else 0)
+        own = min(max(own, kept - other_points.shape[1]), points.shape[1])
+        first = self.rng.choice(points.shape[1], own, replace=False)
+        second = self.rng.choice(other_points.shape[1], kept - own, replace=False)
+
+        merged = PointReservoir(self.size, self.rng)
+        merged.points = np.empty((points.shape[0], self.size))
+        merged.points[:, :kept] = np.concatenate([points[:, first], other_points[:, second]], axis=1)
+        merged.inside[:kept] = np.concatenate([inside[first], other_inside[second]])
+        merged.seen = seen
+        return merged
+
+    def sample(self) -> (np.ndarray, np.ndarray):
+        """
+        Get the points currently held in the reservoir.
+
+        Returns:
+        Tuple of NumPy arrays: (points of shape (d, k), inside mask of shape (k,))
+        """
+        if self.points is None:
+            return np.empty((2, 0)), np.empty(0, dtype=bool)
+        kept = min(self.seen, self.size)
+        return self.points[:, :kept], self.inside[:kept]
+
+
+class DensityRaster:
+    def __init__(self, low=(-2, -2), high=(2, 2), shape=(200, 200), limit: int = 2 * 10 ** 6):
+        """
+        Two-dimensional histogram of the inside and outside points, rendered as a single image.
+
+        Parameters:
+        low (sequence of float): Lower corner of the drawn region.
+        high (sequence of float): Upper corner of the drawn region.
+        shape (tuple[int, int]): Number of bins along y and x.
+        limit (int): Number of points after which the histogram stops being updated.
+
+        Returns:
+        None
+        """
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.shape = shape
+        self.limit = limit
+        self.seen = 0
+        self.inside_counts = np.zeros(shape[0] * shape[1], dtype=np.int64)
+        self.outside_counts = np.zeros(shape[0] * shape[1], dtype=np.int64)
+
+    def spawn(self, seed_sequence: np.random.SeedSequence = None) -> 'DensityRaster':
+        """
+        Empty histogram of the same region for another stream of points.
+
+        Parameters:
+        seed_sequence (np.random.SeedSequence): Unused, the histogram is not random.
+
+        Returns:
+        DensityRaster: The new histogram.
+        """
+        return DensityRaster(self.low, self.high, self.shape, self.limit)
+
+    def __call__(self, points: np.ndarray, inside: np.ndarray) -> None:
+        """
+        Add a batch of points to the histogram.
+
+        Parameters:
+        points (np.ndarray): Points of shape (2, m).
+        inside (np.ndarray): Boolean mask of the points lying inside the figure.
+
+        Returns:
+        None
+        """
+        if self.seen >= self.limit:
+            return
+        take = min(points.shape[1], self.limit - self.seen)
+        rows, cols = self.shape
+        x, y = points[0, :take], points[1, :take]
+        col = ((x - self.low[0]) * (cols / (self.high[0] - self.low[0]))).astype(np.intp)
+        row = ((self.high[1] - y) * (rows / (self.high[1] - self.low[1]))).astype(np.intp)
+        np.clip(col, 0, cols - 1, out=col)
+        np.clip(row, 0, rows - 1, out=row)
+        cell = row * cols + col
+        mask = inside[:take]
+        self.inside_counts += np.bincount(cell[mask], minlength=rows * cols)
+        self.outside_counts += np.bincount(cell[~mask], minlength=rows * cols)
+        self.seen += take
+
+    def merge(self, other: 'DensityRaster') -> 'DensityRaster':
+        """
+        Combine with the histogram of an independent stream over the same region.
+
+        Parameters:
+        other (DensityRaster): Histogram to merge with.
+
+        Returns:
+        DensityRaster: Merged histogram.
+        """
+        self.inside_counts += other.inside_counts
+        self.outside_counts += other.outside_counts
+        self.seen += other.seen
+        return self
+
+    def to_ppm(self) -> bytes:
+        """
+        Render the histogram as a binary PPM image: blue for the figure, red outside, white where empty.
+
+        Returns:
+        bytes: PPM image data.
+        """
+        rows, cols = self.shape
+        total = self.inside_counts + self.outside_counts
+        peak = max(int(total.max()), 1)
+        intensity = np.sqrt(total / peak)
+        share = np.divide(self.inside_counts, total, out=np.zeros(total.size), where=total > 0)
+
+        rgb = np.empty((rows * cols, 3))
+        rgb[:, 0] = 1 - share
+        rgb[:, 1] = 0
+        rgb[:, 2] = share
+        # Blend with the white background according to the local density
+        rgb = 255 * (1 - intensity[:, None] * (1 - rgb))
+        header = f"P6 {cols} {rows} 255\n".encode()
+        return header + rgb.astype(np.uint8).tobytes()
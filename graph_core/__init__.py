@@ -0,0 +1,5 @@
+from .model import Graph, ROOM, TREASURE, LABEL_NAMES, circle_layout, euclidean_weights
+from .view import Viewport, draw_edge, draw_node, draw_graph, node_at
+# generators is not imported here, so that it also runs as a script (python -m graph_core.generators);
+# "from graph_core import generators" still loads it
+from . import feasibility, io
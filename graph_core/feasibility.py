@@ -0,0 +1,191 @@
+import numpy as np
+
+from .model import Graph
+
+# Largest graph completed by its metric closure, an n x n distance matrix
+MAX_CLOSURE_NODES = 2000
+# Nodes listed in a message
+SHOWN_NODES = 5
+# Answer of a solver that found no tour on a graph passing the checks
+NO_TOUR = "Алгоритм не нашёл гамильтонов цикл!"
+CLOSURE_HINT = " Включите «Замыкание графа», чтобы искать обход по кратчайшим путям."
+
+
+def _listed(nodes: np.ndarray) -> str:
+    shown = ", ".join(map(str, nodes[:SHOWN_NODES].tolist()))
+    return shown + (f" и ещё {len(nodes) - SHOWN_NODES}" if len(nodes) > SHOWN_NODES else "")
+
+
+def reachable(indptr: np.ndarray, indices: np.ndarray, start: int) -> np.ndarray:
+    """
+    Nodes reachable from a node, by breadth-first search over whole frontiers at once.
+
+    Parameters:
+    indptr (np.ndarray): CSR offsets of the out-edges.
+    indices (np.ndarray): CSR targets.
+    start (int): Start node.
+
+    Returns:
+    np.ndarray: Boolean mask of the reachable nodes.
+    """
+    seen = np.zeros(len(indptr) - 1, dtype=bool)
+    seen[start] = True
+    # Scratch array for removing repeated nodes from a frontier without sorting it
+    slot = np.empty(len(seen), dtype=np.int64)
+    frontier = np.array([start], dtype=np.int64)
+    while frontier.size:
+        # Positions of all out-edges of the frontier: one arange shifted to the start of every node's run
+        starts, counts = indptr[frontier], indptr[frontier + 1] - indptr[frontier]
+        positions = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        targets = indices[positions]
+        targets = targets[~seen[targets]]
+        # Of repeated targets only the one whose index lands last in slot stays
+        slot[targets] = np.arange(len(targets))
+        frontier = targets[slot[targets] == np.arange(len(targets))]
+        seen[frontier] = True
+    return seen
+
+
+def unreached(graph: Graph) -> (np.ndarray, np.ndarray):
+    """
+    Strong connectivity test in the manner of Kosaraju: the graph is strongly connected exactly when every
+    node is reachable from node 0 both along the edges and against them.
+
+    Parameters:
+    graph (Graph): The graph, at least one node.
+
+    Returns:
+    Tuple: (nodes not reachable from 0, nodes from which 0 is not reachable)
+    """
+    n = graph.number_of_nodes()
+    indptr, indices, _ = graph.csr()
+    forward = reachable(indptr, indices, 0)
+
+    # CSR of the reversed edges; the order of the sources of a node does not matter for the search
+    order = np.argsort(indices)
+    sources = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))
+    reverse_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=n), out=reverse_indptr[1:])
+    backward = reachable(reverse_indptr, sources[order], 0)
+    return np.flatnonzero(~forward), np.flatnonzero(~backward)
+
+
+def tour_problem(graph: Graph):
+    """
+    Cheap necessary conditions for a Hamiltonian cycle, checked before a solver runs.
+
+    Every node needs an out-edge and an in-edge to another node. A node with a single out-edge forces it
+    into the tour, so two such nodes may not share the target; likewise for single in-edges. Finally the
+    graph must be strongly connected. All checks are linear in the size of the graph.
+
+    Parameters:
+    graph (Graph): The graph.
+
+    Returns:
+    str: Why the graph has no Hamiltonian cycle, or None when the checks pass (a cycle may still not exist).
+    """
+    n = graph.number_of_nodes()
+    if n < 2:
+        return "Нужно хотя бы две вершины"
+    sources, targets = graph.sources, graph.targets
+    proper = sources != targets
+    sources, targets = sources[proper], targets[proper]
+    out_degrees = np.bincount(sources, minlength=n)
+    in_degrees = np.bincount(targets, minlength=n)
+
+    if np.any(out_degrees == 0):
+        return f"Из вершин {_listed(np.flatnonzero(out_degrees == 0))} не выходит ни одного ребра -- цикла нет!"
+    if np.any(in_degrees == 0):
+        return f"В вершины {_listed(np.flatnonzero(in_degrees == 0))} не входит ни одного ребра -- цикла нет!"
+
+    forced_targets = np.bincount(targets[out_degrees[sources] == 1], minlength=n)
+    if np.any(forced_targets > 1):
+        return (f"В вершины {_listed(np.flatnonzero(forced_targets > 1))} ведут единственные рёбра "
+                "нескольких вершин -- цикла нет!")
+    forced_sources = np.bincount(sources[in_degrees[targets] == 1], minlength=n)
+    if np.any(forced_sources > 1):
+        return (f"Из вершин {_listed(np.flatnonzero(forced_sources > 1))} выходят единственные рёбра "
+                "нескольких вершин -- цикла нет!")
+
+    not_reached, not_reaching = unreached(graph)
+    if len(not_reached):
+        return f"Вершины {_listed(not_reached)} недостижимы из вершины 0 -- граф не сильно связный!"
+    if len(not_reaching):
+        return f"Из вершин {_listed(not_reaching)} нельзя попасть в вершину 0 -- граф не сильно связный!"
+    return None
+
+
+def metric_closure(graph: Graph) -> (Graph, np.ndarray):
+    """
+    Complete graph of shortest-path distances, in which every strongly connected graph has a tour.
+
+    Distances come from Dijkstra's algorithm run from every node (scipy.sparse.csgraph); an edge u -> v of
+    the closure stands for a shortest path from u to v, recovered with expand_tour.
+
+    Parameters:
+    graph (Graph): Strongly connected graph with at most MAX_CLOSURE_NODES nodes.
+
+    Returns:
+    Tuple: (the closure, predecessor matrix: predecessors[u, v] is the node before v on the path from u)
+    """
+    # scipy is only needed here
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import NegativeCycleError, shortest_path
+
+    n = graph.number_of_nodes()
+    if n > MAX_CLOSURE_NODES:
+        raise ValueError(f"Замыкание графа из {n} вершин слишком велико (не больше {MAX_CLOSURE_NODES})")
+    indptr, indices, weights = graph.csr()
+    try:
+        # Explicit zeros of a sparse matrix are edges; negative weights switch to Johnson's algorithm
+        distances, predecessors = shortest_path(csr_matrix((weights, indices, indptr), shape=(n, n)),
+                                                return_predecessors=True)
+    except NegativeCycleError:
+        raise ValueError("В графе есть цикл отрицательного веса -- замыкание не определено!")
+    if not np.isfinite(distances).all():
+        raise ValueError("Граф не сильно связный -- замыкание не содержит цикла!")
+
+    sources, targets = np.nonzero(~np.eye(n, dtype=bool))
+    closure = Graph.from_arrays(graph.coordinates, sources, targets, distances[sources, targets], graph.labels)
+    return closure, predecessors
+
+
+def expand_tour(predecessors: np.ndarray, tour: list) -> list:
+    """
+    Replace the edges of a tour of the metric closure by the shortest paths they stand for.
+
+    Parameters:
+    predecessors (np.ndarray): Predecessor matrix from metric_closure.
+    tour (list[int]): Node sequence in the closure.
+
+    Returns:
+    list[int]: Closed walk along the edges of the original graph; nodes may repeat.
+    """
+    walk = list(tour[:1])
+    for u, v in zip(tour[:-1], tour[1:]):
+        hops = []
+        while v != u:
+            hops.append(v)
+            v = int(predecessors[u, v])
+        walk.extend(reversed(hops))
+    return walk
+
+
+def tour_instance(graph: Graph, closure: bool = False) -> (Graph, np.ndarray):
+    """
+    The graph a tour solver should run on, after the feasibility checks. A ValueError with the reason is
+    raised when there is no tour.
+
+    Parameters:
+    graph (Graph): The drawn graph.
+    closure (bool): Complete a graph failing the checks by its metric closure instead of rejecting it.
+
+    Returns:
+    Tuple: (graph to solve, predecessor matrix for expand_tour, or None when it is the graph itself)
+    """
+    problem = tour_problem(graph)
+    if problem is None:
+        return graph, None
+    if not closure or graph.number_of_nodes() < 2:
+        raise ValueError(problem)
+    return metric_closure(graph)
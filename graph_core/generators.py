@@ -0,0 +1,211 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from . import io
+from .model import Graph, ROOM, TREASURE, euclidean_weights
+
+# Side of the square the points are drawn in; loaded graphs are fitted into the canvas anyway
+SIDE = 1000.0
+# Out-degree of a generated sparse graph
+DEFAULT_K = 5
+# Largest complete graph worth generating, n * (n - 1) edges
+MAX_COMPLETE_NODES = 5000
+
+
+def random_points(n: int, clusters: int = 0, spread: float = 0.05, side: float = SIDE, seed=None) -> np.ndarray:
+    """
+    Random points in a square, uniform or grouped into Gaussian clusters.
+
+    Parameters:
+    n (int): Number of points.
+    clusters (int): Number of clusters; 0 for uniform points.
+    spread (float): Standard deviation of a cluster as a fraction of the side.
+    side (float): Side of the square.
+    seed (int | np.random.Generator): Random seed.
+
+    Returns:
+    np.ndarray: Coordinates of shape (n, 2).
+    """
+    rng = np.random.default_rng(seed)
+    if clusters <= 0:
+        return rng.uniform(0, side, (n, 2))
+    centers = rng.uniform(0, side, (clusters, 2))
+    points = centers[rng.integers(0, clusters, n)] + rng.normal(0, spread * side, (n, 2))
+    return np.clip(points, 0, side)
+
+
+def random_weights(m: int, low: int = 1, high: int = 100, seed=None) -> np.ndarray:
+    """
+    Independent integer weights, so an edge and its reverse get different ones (an asymmetric instance).
+
+    Parameters:
+    m (int): Number of edges.
+    low (int): Smallest weight.
+    high (int): Largest weight.
+    seed (int | np.random.Generator): Random seed.
+
+    Returns:
+    np.ndarray: float64 weights.
+    """
+    return np.random.default_rng(seed).integers(low, high + 1, m).astype(np.float64)
+
+
+def _weights(coordinates: np.ndarray, sources: np.ndarray, targets: np.ndarray, weights: str, rng) -> np.ndarray:
+    if weights == "euclidean":
+        return euclidean_weights(coordinates, sources, targets)
+    if weights == "random":
+        return random_weights(len(sources), seed=rng)
+    raise ValueError(f"Unknown weights {weights!r}, expected 'euclidean' or 'random'")
+
+
+def complete_graph(n: int, clusters: int = 0, weights: str = "euclidean", seed=None) -> Graph:
+    """
+    Complete digraph on random points.
+
+    Parameters:
+    n (int): Number of nodes, at most MAX_COMPLETE_NODES.
+    clusters (int): Number of point clusters; 0 for uniform points.
+    weights (str): "euclidean" lengths or "random" asymmetric weights.
+    seed (int): Random seed.
+
+    Returns:
+    Graph: The graph.
+    """
+    if n > MAX_COMPLETE_NODES:
+        raise ValueError(f"A complete graph on {n} nodes is too large (at most {MAX_COMPLETE_NODES}); "
+                         "use a k-NN graph instead")
+    rng = np.random.default_rng(seed)
+    coordinates = random_points(n, clusters, seed=rng)
+    sources, targets = np.nonzero(~np.eye(n, dtype=bool))
+    return Graph.from_arrays(coordinates, sources, targets, _weights(coordinates, sources, targets, weights, rng))
+
+
+def knn_graph(n: int, k: int = DEFAULT_K, clusters: int = 0, weights: str = "euclidean", seed=None) -> Graph:
+    """
+    Sparse digraph with an edge from every point to its k nearest neighbours, plus the edges of a random
+    Hamiltonian cycle, so that a tour always exists.
+
+    Parameters:
+    n (int): Number of nodes.
+    k (int): Nearest neighbours per node.
+    clusters (int): Number of point clusters; 0 for uniform points.
+    weights (str): "euclidean" lengths or "random" asymmetric weights.
+    seed (int): Random seed.
+
+    Returns:
+    Graph: The graph with at most n * (k + 1) edges.
+    """
+    # scipy is only needed here
+    from scipy.spatial import cKDTree
+
+    rng = np.random.default_rng(seed)
+    coordinates = random_points(n, clusters, seed=rng)
+    k = min(k, n - 1)
+    if k > 0:
+        tree = cKDTree(coordinates)
+        # Queried in the leaf order of the tree, where nearby points follow each other: about twice as fast
+        # as in random order. The nearest point of every point is the point itself
+        neighbors = np.empty((n, k + 1), dtype=np.int64)
+        neighbors[tree.indices] = tree.query(coordinates[tree.indices], k + 1)[1]
+        sources = np.repeat(np.arange(n, dtype=np.int64), k)
+        targets = neighbors[:, 1:].ravel()
+    else:
+        sources = targets = np.empty(0, dtype=np.int64)
+
+    if n > 1:
+        cycle = rng.permutation(n)
+        sources = np.concatenate((sources, cycle))
+        targets = np.concatenate((targets, np.roll(cycle, -1)))
+    return Graph.from_arrays(coordinates, sources, targets, _weights(coordinates, sources, targets, weights, rng))
+
+
+def _depths(parents: np.ndarray) -> np.ndarray:
+    # Depth of every node of a tree given by parent pointers (the root points to itself), by pointer jumping:
+    # O(n log depth) with whole-array steps instead of a walk per node. depths[v] is the distance from v to
+    # ancestors[v]; the root has distance 0 to itself, so jumping past it adds nothing
+    depths = (parents != np.arange(len(parents))).astype(np.int64)
+    ancestors = parents.copy()
+    while True:
+        jumped = ancestors[ancestors]
+        if np.array_equal(jumped, ancestors):
+            return depths
+        depths += depths[ancestors]
+        ancestors = jumped
+
+
+def random_tree(n: int, treasure: float = 0.3, seed=None) -> Graph:
+    """
+    Random recursive tree for the treasure task: node i > 0 hangs under a uniform random node before it.
+
+    Every edge is stored in both directions, like a tree drawn in the Lab4 editor, and node 0 is the root.
+    Nodes are laid out by depth, ordered by parent within a level.
+
+    Parameters:
+    n (int): Number of nodes.
+    treasure (float): Probability of a node to hold a treasure.
+    seed (int): Random seed.
+
+    Returns:
+    Graph: The tree.
+    """
+    if n < 1:
+        raise ValueError("A tree needs at least one node")
+    if not 0 <= treasure <= 1:
+        raise ValueError("The treasure density must be in [0, 1]")
+    rng = np.random.default_rng(seed)
+    children = np.arange(1, n, dtype=np.int64)
+    parents = np.zeros(n, dtype=np.int64)
+    parents[1:] = np.floor(rng.random(n - 1) * children).astype(np.int64)
+    depths = _depths(parents)
+
+    # Position within the level, ordered by parent so subtrees stay together
+    order = np.lexsort((parents, depths))
+    level_starts = np.searchsorted(depths[order], depths[order], side="left")
+    level_sizes = np.bincount(depths)
+    positions = np.empty(n, dtype=np.int64)
+    positions[order] = np.arange(n) - level_starts
+    coordinates = np.column_stack(((positions + 0.5) / level_sizes[depths] * SIDE,
+                                   depths * SIDE / max(int(depths.max(initial=0)), 1)))
+
+    labels = np.where(rng.random(n) < treasure, TREASURE, ROOM)
+    sources = np.concatenate((parents[1:], children))
+    targets = np.concatenate((children, parents[1:]))
+    return Graph.from_arrays(coordinates, sources, targets, labels=labels)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a random graph for the Lab1-Lab4 solvers.")
+    parser.add_argument("kind", choices=("complete", "knn", "tree"),
+                        help="complete digraph, sparse k-NN digraph with a Hamiltonian cycle, or treasure tree")
+    parser.add_argument("n", type=int, help="number of nodes")
+    parser.add_argument("-o", "--output", required=True, help="graph file, the extension picks the format")
+    parser.add_argument("-k", type=int, default=DEFAULT_K, help="nearest neighbours per node (knn)")
+    parser.add_argument("--clusters", type=int, default=0, help="number of point clusters, 0 for uniform")
+    parser.add_argument("--weights", choices=("euclidean", "random"), default="euclidean",
+                        help="edge lengths or random asymmetric weights")
+    parser.add_argument("--treasure", type=float, default=0.3, help="treasure density (tree)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        if args.kind == "complete":
+            graph = complete_graph(args.n, args.clusters, args.weights, args.seed)
+        elif args.kind == "knn":
+            graph = knn_graph(args.n, args.k, args.clusters, args.weights, args.seed)
+        else:
+            graph = random_tree(args.n, args.treasure, args.seed)
+        generated = time.perf_counter()
+        io.save(args.output, graph)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"{graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges: "
+          f"generated in {generated - start:.2f} s, saved in {time.perf_counter() - generated:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
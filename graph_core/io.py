@@ -0,0 +1,307 @@
+import os
+
+import numpy as np
+
+from .model import Graph, ROOM, TREASURE, circle_layout
+
+FORMAT_VERSION = 1
+# Weight written for missing edges of an explicit TSPLIB matrix and treated as "no edge" when reading
+MISSING_WEIGHT = 10 ** 9
+# Largest complete graph built from a coordinate TSPLIB file or written as a matrix
+MAX_MATRIX_NODES = 5000
+# Edges formatted at once when writing an edge list
+WRITE_BLOCK = 1 << 16
+
+
+def save_npz(path: str, graph: Graph, compressed: bool = False) -> None:
+    """
+    Save a graph as NumPy arrays in an .npz archive, the fastest format to load.
+
+    Parameters:
+    path (str): File path.
+    graph (Graph): Graph to save.
+    compressed (bool): Deflate the arrays; smaller, but slower to write and read.
+
+    Returns:
+    None
+    """
+    save = np.savez_compressed if compressed else np.savez
+    # Stored in CSR form, which loads without sorting
+    indptr, indices, weights = graph.csr()
+    with open(path, "wb") as f:
+        save(f, version=np.array(FORMAT_VERSION), coordinates=graph.coordinates, labels=graph.labels,
+             indptr=indptr, indices=indices, weights=weights)
+
+
+def load_npz(path: str) -> Graph:
+    """
+    Load a graph saved with save_npz.
+
+    Parameters:
+    path (str): File path.
+
+    Returns:
+    Graph: The graph.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["version"]) != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported graph format version {int(data['version'])}")
+        return Graph.from_csr(data["coordinates"], data["indptr"], data["indices"], data["weights"], data["labels"])
+
+
+def write_edge_list(path: str, graph: Graph) -> None:
+    """
+    Write the edges as "source target weight" lines.
+
+    A "# nodes n" header keeps isolated nodes and a "# treasures i j ..." header the TREASURE nodes;
+    coordinates are not stored.
+
+    Parameters:
+    path (str): File path.
+    graph (Graph): Graph to write.
+
+    Returns:
+    None
+    """
+    sources, targets, weights = graph.sources, graph.targets, graph.weights
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# nodes {graph.number_of_nodes()}\n")
+        treasures = np.flatnonzero(graph.labels == TREASURE)
+        if len(treasures):
+            f.write(f"# treasures {' '.join(map(str, treasures.tolist()))}\n")
+        # Formatting lists in blocks is about twice as fast as np.savetxt; floats keep their shortest repr
+        for start in range(0, len(sources), WRITE_BLOCK):
+            block = slice(start, start + WRITE_BLOCK)
+            f.writelines(map("{} {} {}\n".format, sources[block].tolist(), targets[block].tolist(),
+                             weights[block].tolist()))
+
+
+def read_edge_list(path: str) -> Graph:
+    """
+    Read "source target [weight]" lines; "#" starts a comment. Nodes are laid out on a circle; the headers
+    written by write_edge_list restore the node count and the treasures.
+
+    Parameters:
+    path (str): File path.
+
+    Returns:
+    Graph: The graph. Edges without a weight get weight 1.
+    """
+    n = 0
+    treasures = np.empty(0, dtype=np.int64)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            words = line.split()
+            if words[:2] == ["#", "nodes"] and len(words) == 3:
+                n = int(words[2])
+            if words[:2] == ["#", "treasures"]:
+                treasures = np.array(words[2:], dtype=np.int64)
+            if words and not words[0].startswith("#"):
+                break
+    values = np.loadtxt(path, comments="#", ndmin=2)
+    if values.size == 0:
+        # A graph without edges is written as the header alone; loadtxt then gives shape (0, 0)
+        values = np.empty((0, 3))
+    if values.shape[1] not in (2, 3):
+        raise ValueError(f"{path}: expected 2 or 3 columns, got {values.shape[1]}")
+    columns = values.shape[1]
+    sources, targets = values[:, 0].astype(np.int64), values[:, 1].astype(np.int64)
+    weights = values[:, 2] if columns == 3 else np.ones(len(values))
+    if len(values):
+        n = max(n, int(max(sources.max(), targets.max())) + 1)
+    if len(treasures):
+        n = max(n, int(treasures.max()) + 1)
+    labels = np.full(n, ROOM, dtype=np.int8)
+    labels[treasures] = TREASURE
+    return Graph.from_arrays(circle_layout(n), sources, targets, weights, labels)
+
+
+def _tsplib_distances(coordinates: np.ndarray, kind: str) -> np.ndarray:
+    # Full distance matrix of a coordinate instance, rounded as the TSPLIB specification prescribes
+    delta = coordinates[:, None, :] - coordinates[None, :, :]
+    if kind == "ATT":
+        distance = np.sqrt((delta ** 2).sum(axis=2) / 10)
+        rounded = np.rint(distance)
+        return np.where(rounded < distance, rounded + 1, rounded)
+    distance = np.hypot(delta[..., 0], delta[..., 1])
+    if kind == "CEIL_2D":
+        return np.ceil(distance)
+    if kind == "EUC_2D":
+        return np.floor(distance + 0.5)
+    raise ValueError(f"Unsupported EDGE_WEIGHT_TYPE {kind}")
+
+
+def _explicit_matrix(values: np.ndarray, n: int, layout: str) -> np.ndarray:
+    # Expand the explicit weights of a TSPLIB file into a full matrix
+    if layout == "FULL_MATRIX":
+        return values[:n * n].reshape(n, n)
+    matrix = np.zeros((n, n))
+    if layout in ("UPPER_ROW", "LOWER_COL"):
+        rows, columns = np.triu_indices(n, 1)
+    elif layout in ("LOWER_ROW", "UPPER_COL"):
+        rows, columns = np.tril_indices(n, -1)
+    elif layout in ("UPPER_DIAG_ROW", "LOWER_DIAG_COL"):
+        rows, columns = np.triu_indices(n)
+    elif layout in ("LOWER_DIAG_ROW", "UPPER_DIAG_COL"):
+        rows, columns = np.tril_indices(n)
+    else:
+        raise ValueError(f"Unsupported EDGE_WEIGHT_FORMAT {layout}")
+    # A column-wise triangle lists the same values as the row-wise opposite one; the matrix is symmetric
+    matrix[rows, columns] = values[:len(rows)]
+    matrix[columns, rows] = values[:len(rows)]
+    return matrix
+
+
+def read_tsplib(path: str) -> Graph:
+    """
+    Read a TSP / ATSP instance in TSPLIB format.
+
+    Coordinate instances (EUC_2D, CEIL_2D, ATT) become complete graphs with the rounded TSPLIB distances;
+    explicit instances take their weights from EDGE_WEIGHT_SECTION, where MISSING_WEIGHT or more means no
+    edge. Coordinates come from NODE_COORD_SECTION or DISPLAY_DATA_SECTION, otherwise the nodes are laid
+    out on a circle.
+
+    Parameters:
+    path (str): File path.
+
+    Returns:
+    Graph: The graph, nodes renumbered from 0.
+    """
+    header = {}
+    sections = {}
+    current = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line == "EOF":
+                continue
+            key, colon, value = line.partition(":")
+            if colon and key.strip().isupper() and not key.strip()[0].isdigit():
+                header[key.strip()] = value.strip()
+                current = None
+            elif line.endswith("_SECTION"):
+                current = sections.setdefault(line, [])
+            elif current is not None:
+                current.append(line)
+
+    n = int(header.get("DIMENSION", 0))
+    kind = header.get("EDGE_WEIGHT_TYPE", "EXPLICIT")
+    if n > MAX_MATRIX_NODES:
+        raise ValueError(f"{path}: {n} nodes make a complete graph too large to build "
+                         f"(at most {MAX_MATRIX_NODES}); use an edge list or .npz instead")
+
+    coordinates = None
+    for section in ("NODE_COORD_SECTION", "DISPLAY_DATA_SECTION"):
+        if section in sections:
+            values = np.array(" ".join(sections[section]).split(), dtype=np.float64).reshape(-1, 3)
+            coordinates = values[np.argsort(values[:, 0], kind="stable"), 1:]
+            break
+
+    if kind == "EXPLICIT":
+        values = np.array(" ".join(sections.get("EDGE_WEIGHT_SECTION", [])).split(), dtype=np.float64)
+        matrix = _explicit_matrix(values, n, header.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX"))
+    else:
+        if coordinates is None:
+            raise ValueError(f"{path}: EDGE_WEIGHT_TYPE {kind} needs a NODE_COORD_SECTION")
+        matrix = _tsplib_distances(coordinates, kind)
+
+    if coordinates is None:
+        coordinates = circle_layout(n)
+    present = matrix < MISSING_WEIGHT
+    np.fill_diagonal(present, False)
+    sources, targets = np.nonzero(present)
+    return Graph.from_arrays(coordinates, sources, targets, matrix[sources, targets])
+
+
+def write_tsplib(path: str, graph: Graph) -> None:
+    """
+    Write a graph as an explicit ATSP instance (FULL_MATRIX) with the coordinates as display data.
+
+    Missing edges get MISSING_WEIGHT, weights are rounded to integers as TSPLIB requires. TSPLIB has no
+    node labels, so a graph with treasures is rejected rather than saved without them.
+
+    Parameters:
+    path (str): File path.
+    graph (Graph): Graph to write, at most MAX_MATRIX_NODES nodes, all of them ROOM.
+
+    Returns:
+    None
+    """
+    n = graph.number_of_nodes()
+    if n > MAX_MATRIX_NODES:
+        raise ValueError(f"{n} nodes are too many for a TSPLIB matrix (at most {MAX_MATRIX_NODES})")
+    if np.any(graph.labels != ROOM):
+        raise ValueError("TSPLIB cannot store node labels; save a graph with treasures as .npz or an edge list")
+    matrix = np.full((n, n), MISSING_WEIGHT, dtype=np.int64)
+    np.fill_diagonal(matrix, 0)
+    matrix[graph.sources, graph.targets] = np.rint(graph.weights).astype(np.int64)
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"NAME: {os.path.splitext(os.path.basename(path))[0]}\n"
+                "TYPE: ATSP\n"
+                f"DIMENSION: {n}\n"
+                "EDGE_WEIGHT_TYPE: EXPLICIT\n"
+                "EDGE_WEIGHT_FORMAT: FULL_MATRIX\n"
+                "DISPLAY_DATA_TYPE: TWOD_DISPLAY\n"
+                "EDGE_WEIGHT_SECTION\n")
+        np.savetxt(f, matrix, fmt="%d")
+        f.write("DISPLAY_DATA_SECTION\n")
+        np.savetxt(f, np.column_stack((np.arange(1, n + 1), graph.coordinates)), fmt=("%d", "%.17g", "%.17g"))
+        f.write("EOF\n")
+
+
+# Extension -> (reader, writer, description for the file dialogs). Coordinates survive .npz and TSPLIB,
+# labels .npz and edge lists
+FORMATS = {
+    ".npz": (load_npz, save_npz, "Граф NumPy"),
+    ".txt": (read_edge_list, write_edge_list, "Список рёбер"),
+    ".edges": (read_edge_list, write_edge_list, "Список рёбер"),
+    ".tsp": (read_tsplib, write_tsplib, "TSPLIB"),
+    ".atsp": (read_tsplib, write_tsplib, "TSPLIB"),
+}
+
+
+def _format(path: str):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown graph file type {extension!r}, expected one of {', '.join(FORMATS)}")
+    return FORMATS[extension]
+
+
+def load(path: str) -> Graph:
+    """
+    Read a graph in the format given by the file extension (see FORMATS).
+
+    Parameters:
+    path (str): File path.
+
+    Returns:
+    Graph: The graph.
+    """
+    return _format(path)[0](path)
+
+
+def save(path: str, graph: Graph) -> None:
+    """
+    Write a graph in the format given by the file extension (see FORMATS).
+
+    Parameters:
+    path (str): File path.
+    graph (Graph): Graph to write.
+
+    Returns:
+    None
+    """
+    _format(path)[1](path, graph)
+
+
+def file_types() -> list:
+    """
+    Returns:
+    list[tuple[str, str]]: (description, pattern) pairs for tkinter file dialogs, all formats first.
+    """
+    types = [("Все графы", " ".join(f"*{extension}" for extension in FORMATS))]
+    for extension, (_, _, description) in FORMATS.items():
+        types.append((description, f"*{extension}"))
+    return types
+
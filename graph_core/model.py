@@ -0,0 +1,355 @@
+import numpy as np
+
+# Node labels of the tree task (Lab4)
+ROOM = 0
+TREASURE = 1
+LABEL_NAMES = ("Room", "Treasure")
+
+# Initial capacity of the growable arrays of an interactively built graph
+INITIAL_CAPACITY = 16
+
+
+def euclidean_weights(coordinates: np.ndarray, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    Lengths of edges between points, truncated to integers like the weights of a clicked edge.
+
+    Parameters:
+    coordinates (np.ndarray): Points of shape (n, 2).
+    sources (np.ndarray): Start nodes of the edges.
+    targets (np.ndarray): End nodes of the edges.
+
+    Returns:
+    np.ndarray: float64 weights.
+    """
+    delta = coordinates[targets] - coordinates[sources]
+    return np.floor(np.hypot(delta[:, 0], delta[:, 1]))
+
+
+def _edge_keys(sources: np.ndarray, targets: np.ndarray, n: int) -> (np.ndarray, np.ndarray):
+    # One sort key per edge, (source, target) in lexicographic order, and the stable order sorting it;
+    # the order is None when the edges are sorted already (every graph built by from_arrays)
+    keys = sources * max(n, 1) + targets
+    if len(keys) < 2 or np.all(keys[1:] >= keys[:-1]):
+        return keys, None
+    return keys, np.argsort(keys, kind="stable")
+
+
+def circle_layout(n: int, center=(300, 190), radius: float = 170) -> np.ndarray:
+    """
+    Points evenly spaced on a circle, for graphs read without coordinates.
+
+    Parameters:
+    n (int): Number of points.
+    center (tuple): Center of the circle.
+    radius (float): Radius of the circle.
+
+    Returns:
+    np.ndarray: Coordinates of shape (n, 2).
+    """
+    angles = 2 * np.pi * np.arange(n) / max(n, 1)
+    return np.column_stack((center[0] + radius * np.cos(angles), center[1] + radius * np.sin(angles)))
+
+
+class Graph:
+    def __init__(self):
+        """
+        Directed weighted graph with array-backed nodes and edges, shared by the Lab1-Lab4 editors and solvers.
+
+        Nodes are 0..n-1 with (x, y) coordinates and an integer label. Edges are kept as coordinate (COO)
+        arrays that grow by doubling, so clicking a node or an edge is amortised O(1); adding an existing
+        edge replaces its weight, like networkx.DiGraph.add_edge. Solvers read the compressed sparse row
+        (CSR) form, built on first use after a change: the out-edges of v are
+        indices[indptr[v]:indptr[v + 1]], sorted by target.
+
+        Returns:
+        None
+        """
+        self._coordinates = np.empty((INITIAL_CAPACITY, 2))
+        self._labels = np.empty(INITIAL_CAPACITY, dtype=np.int8)
+        self._sources = np.empty(INITIAL_CAPACITY, dtype=np.int64)
+        self._targets = np.empty(INITIAL_CAPACITY, dtype=np.int64)
+        self._weights = np.empty(INITIAL_CAPACITY)
+        self._n = 0
+        self._m = 0
+        self._csr = None
+
+    @staticmethod
+    def from_arrays(coordinates, sources=(), targets=(), weights=None, labels=None) -> 'Graph':
+        """
+        Build a graph from whole arrays at once.
+
+        Parameters:
+        coordinates (array-like): Node coordinates of shape (n, 2).
+        sources (array-like): Start nodes of the edges.
+        targets (array-like): End nodes of the edges.
+        weights (array-like): Edge weights. Euclidean lengths of the edges when None.
+        labels (array-like): Node labels. All ROOM when None.
+
+        Returns:
+        Graph: The graph. Of repeated edges the last one is kept.
+        """
+        coordinates = np.array(coordinates, dtype=np.float64).reshape(-1, 2)
+        sources = np.asarray(sources, dtype=np.int64).ravel()
+        targets = np.asarray(targets, dtype=np.int64).ravel()
+        n = len(coordinates)
+        if len(sources) != len(targets):
+            raise ValueError("sources and targets must have the same length")
+        if len(sources) and (min(sources.min(), targets.min()) < 0 or max(sources.max(), targets.max()) >= n):
+            raise ValueError(f"Edge endpoints must be nodes 0..{n - 1}")
+        if weights is None:
+            weights = euclidean_weights(coordinates, sources, targets)
+        weights = np.array(weights, dtype=np.float64).ravel()
+        if len(weights) != len(sources):
+            raise ValueError("weights must have one value per edge")
+
+        # Sort by (source, target), the order of the CSR form; duplicates end up adjacent in input order
+        keys, order = _edge_keys(sources, targets, n)
+        if order is not None:
+            keys, sources, targets, weights = keys[order], sources[order], targets[order], weights[order]
+        last = np.ones(len(sources), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        if not last.all():
+            sources, targets, weights = sources[last], targets[last], weights[last]
+
+        graph = Graph()
+        graph._coordinates = coordinates
+        graph._labels = (np.zeros(n, dtype=np.int8) if labels is None
+                         else np.array(labels, dtype=np.int8).ravel())
+        if len(graph._labels) != n:
+            raise ValueError("labels must have one value per node")
+        graph._sources, graph._targets, graph._weights = sources, targets, weights
+        graph._n, graph._m = n, len(sources)
+        return graph
+
+    @staticmethod
+    def from_csr(coordinates, indptr, indices, weights, labels=None) -> 'Graph':
+        """
+        Build a graph from its compressed sparse row form without sorting, e.g. as saved by csr().
+
+        Parameters:
+        coordinates (array-like): Node coordinates of shape (n, 2).
+        indptr (array-like): Offsets of the out-edges of every node, length n + 1.
+        indices (array-like): Targets, increasing and unique within every node.
+        weights (array-like): Weights in the same order.
+        labels (array-like): Node labels. All ROOM when None.
+
+        Returns:
+        Graph: The graph.
+        """
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        indptr = np.asarray(indptr, dtype=np.int64)
+        n = len(coordinates)
+        if len(indptr) != n + 1 or indptr[0] != 0 or indptr[-1] != len(indices) or np.any(np.diff(indptr) < 0):
+            raise ValueError("indptr does not match the nodes and edges")
+        sources = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))
+        return Graph.from_arrays(coordinates, sources, indices, weights, labels)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def number_of_nodes(self) -> int:
+        return self._n
+
+    def number_of_edges(self) -> int:
+        return self._m
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        return self._coordinates[:self._n]
+
+    @property
+    def labels(self) -> np.ndarray:
+        return self._labels[:self._n]
+
+    @property
+    def sources(self) -> np.ndarray:
+        return self._sources[:self._m]
+
+    @property
+    def targets(self) -> np.ndarray:
+        return self._targets[:self._m]
+
+    @property
+    def weights(self) -> np.ndarray:
+        return self._weights[:self._m]
+
+    @staticmethod
+    def _grown(array: np.ndarray, size: int) -> np.ndarray:
+        if size <= len(array):
+            return array
+        grown = np.empty((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def add_node(self, x: float, y: float, label: int = ROOM) -> int:
+        """
+        Add a node.
+
+        Parameters:
+        x (float): X coordinate.
+        y (float): Y coordinate.
+        label (int): ROOM or TREASURE.
+
+        Returns:
+        int: Index of the new node.
+        """
+        self._coordinates = self._grown(self._coordinates, self._n + 1)
+        self._labels = self._grown(self._labels, self._n + 1)
+        self._coordinates[self._n] = x, y
+        self._labels[self._n] = label
+        self._n += 1
+        self._csr = None
+        return self._n - 1
+
+    def set_label(self, node: int, label: int) -> None:
+        self._labels[node] = label
+
+    def _find(self, u: int, v: int):
+        # (edge index, CSR position) of the edge u -> v, or None
+        indptr, indices, _, order = self._compressed()
+        start, end = indptr[u], indptr[u + 1]
+        position = start + np.searchsorted(indices[start:end], v)
+        if position < end and indices[position] == v:
+            return (position if order is None else order[position]), position
+        return None
+
+    def add_edge(self, u: int, v: int, weight: float = None) -> None:
+        """
+        Add an edge or replace the weight of an existing one.
+
+        Parameters:
+        u (int): Start node.
+        v (int): End node.
+        weight (float): Weight. The euclidean length when None.
+
+        Returns:
+        None
+        """
+        if not (0 <= u < self._n and 0 <= v < self._n):
+            raise ValueError(f"Edge endpoints must be nodes 0..{self._n - 1}")
+        if weight is None:
+            weight = euclidean_weights(self.coordinates, np.array([u]), np.array([v]))[0]
+        if self._find(u, v) is not None:
+            self.set_weight(u, v, weight)
+            return
+        for name in ("_sources", "_targets", "_weights"):
+            setattr(self, name, self._grown(getattr(self, name), self._m + 1))
+        self._sources[self._m], self._targets[self._m], self._weights[self._m] = u, v, weight
+        self._m += 1
+        self._csr = None
+
+    def set_weight(self, u: int, v: int, weight: float) -> None:
+        """
+        Change the weight of an existing edge.
+
+        Parameters:
+        u (int): Start node.
+        v (int): End node.
+        weight (float): New weight.
+
+        Returns:
+        None
+        """
+        found = self._find(u, v)
+        if found is None:
+            raise KeyError((u, v))
+        index, position = found
+        self._weights[index] = weight
+        # A view of the edge weights when the edges are sorted, otherwise a reordered copy
+        self._csr[2][position] = weight
+
+    def has_edge(self, u: int, v: int) -> bool:
+        return self._find(u, v) is not None
+
+    def weight(self, u: int, v: int, default=None):
+        """
+        Weight of an edge.
+
+        Parameters:
+        u (int): Start node.
+        v (int): End node.
+        default: Value for a missing edge.
+
+        Returns:
+        float: The weight, or default when there is no such edge.
+        """
+        found = self._find(u, v)
+        return default if found is None else float(self._weights[found[0]])
+
+    def _compressed(self) -> tuple:
+        # (indptr, indices, weights, CSR position -> edge index or None when the edges are in CSR order)
+        if self._csr is None:
+            sources, targets = self.sources, self.targets
+            _, order = _edge_keys(sources, targets, self._n)
+            indptr = np.zeros(self._n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(sources, minlength=self._n), out=indptr[1:])
+            if order is None:
+                self._csr = (indptr, targets, self.weights, None)
+            else:
+                self._csr = (indptr, targets[order], self.weights[order], order)
+        return self._csr
+
+    def csr(self) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        Compressed sparse row form of the edges. The arrays are shared with the graph and must not be modified.
+
+        Returns:
+        Tuple: (indptr of length n + 1, targets sorted per source, weights in the same order)
+        """
+        indptr, indices, weights, _ = self._compressed()
+        return indptr, indices, weights
+
+    def neighbors(self, node: int) -> np.ndarray:
+        """
+        Returns:
+        np.ndarray: Targets of the out-edges of a node, in increasing order.
+        """
+        indptr, indices, _ = self.csr()
+        return indices[indptr[node]:indptr[node + 1]]
+
+    def out_edges(self, node: int) -> (np.ndarray, np.ndarray):
+        """
+        Returns:
+        Tuple: (targets, weights) of the out-edges of a node, targets in increasing order.
+        """
+        indptr, indices, weights = self.csr()
+        return indices[indptr[node]:indptr[node + 1]], weights[indptr[node]:indptr[node + 1]]
+
+    def out_degrees(self) -> np.ndarray:
+        return np.diff(self.csr()[0])
+
+    def in_degrees(self) -> np.ndarray:
+        return np.bincount(self.targets, minlength=self._n)
+
+    def edges(self):
+        """
+        Iterate over the edges sorted by (source, target).
+
+        Returns:
+        Generator of tuple: (source, target, weight)
+        """
+        indptr, indices, weights = self.csr()
+        sources = np.repeat(np.arange(self._n), np.diff(indptr))
+        return zip(sources.tolist(), indices.tolist(), weights.tolist())
+
+    def clear(self) -> None:
+        self._n = 0
+        self._m = 0
+        self._csr = None
+
+    def copy(self) -> 'Graph':
+        return Graph.from_arrays(self.coordinates, self.sources, self.targets, self.weights, self.labels)
+
+    def to_networkx(self):
+        """
+        Convert to a networkx.DiGraph with "weight" edge and "label" node attributes.
+
+        Returns:
+        networkx.DiGraph: The graph.
+        """
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        graph.add_nodes_from((node, {"label": LABEL_NAMES[label]}) for node, label in enumerate(self.labels.tolist()))
+        graph.add_weighted_edges_from(self.edges())
+        return graph
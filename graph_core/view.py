@@ -0,0 +1,155 @@
+import numpy as np
+
+from .model import TREASURE
+
+NODE_RADIUS = 10
+# Larger graphs are drawn in part: a Tk canvas slows down with every item
+MAX_DRAWN_NODES = 1000
+MAX_DRAWN_EDGES = 3000
+
+
+class Viewport:
+    def __init__(self):
+        """
+        Mapping between graph coordinates and canvas pixels, screen = graph * scale + offset.
+
+        Clicked graphs use the identity, so their coordinates are canvas pixels; loaded or generated graphs
+        are fitted into the canvas.
+
+        Returns:
+        None
+        """
+        self.scale = 1.0
+        self.offset = np.zeros(2)
+
+    def reset(self) -> None:
+        self.scale = 1.0
+        self.offset = np.zeros(2)
+
+    def fit(self, coordinates: np.ndarray, width: float, height: float, margin: float = 2 * NODE_RADIUS) -> None:
+        """
+        Fit points into a canvas, keeping the identity when they are on it already.
+
+        Parameters:
+        coordinates (np.ndarray): Points of shape (n, 2).
+        width (float): Canvas width.
+        height (float): Canvas height.
+        margin (float): Free border in pixels.
+
+        Returns:
+        None
+        """
+        self.reset()
+        if len(coordinates) == 0:
+            return
+        low, high = coordinates.min(axis=0), coordinates.max(axis=0)
+        if low[0] >= 0 and low[1] >= 0 and high[0] <= width and high[1] <= height:
+            return
+        extent = np.maximum(high - low, 1e-12)
+        self.scale = float(min((width - 2 * margin) / extent[0], (height - 2 * margin) / extent[1]))
+        self.offset = margin - low * self.scale
+
+    def to_screen(self, points: np.ndarray) -> np.ndarray:
+        return np.asarray(points, dtype=np.float64) * self.scale + self.offset
+
+    def to_graph(self, x: float, y: float) -> tuple:
+        graph_x, graph_y = (np.array([x, y], dtype=np.float64) - self.offset) / self.scale
+        return float(graph_x), float(graph_y)
+
+
+def draw_edge(canvas, start, end, directed: bool = True) -> None:
+    """
+    Draw an edge between two node circles, with an arrow for a directed one.
+
+    Parameters:
+    canvas: Tk canvas.
+    start (tuple): Screen position of the start node.
+    end (tuple): Screen position of the end node.
+    directed (bool): Draw an arrow head at the end node.
+
+    Returns:
+    None
+    """
+    (start_x, start_y), (end_x, end_y) = start, end
+    length = ((end_x - start_x) ** 2 + (end_y - start_y) ** 2) ** 0.5
+    if length == 0:
+        return
+    sx = start_x + (end_x - start_x) * (NODE_RADIUS / length)
+    sy = start_y + (end_y - start_y) * (NODE_RADIUS / length)
+    ex = end_x - (end_x - start_x) * (NODE_RADIUS / length)
+    ey = end_y - (end_y - start_y) * (NODE_RADIUS / length)
+    if directed:
+        canvas.create_line(sx, sy, ex, ey, arrow="last", width=2)
+    else:
+        canvas.create_line(sx, sy, ex, ey, width=2)
+
+
+def draw_node(canvas, x: float, y: float, index: int, treasure: bool = False) -> None:
+    """
+    Draw a numbered node circle.
+
+    Parameters:
+    canvas: Tk canvas.
+    x (float): Screen X.
+    y (float): Screen Y.
+    index (int): Node number.
+    treasure (bool): Draw a treasure node (gold) instead of a room (blue).
+
+    Returns:
+    None
+    """
+    canvas.create_oval(x - NODE_RADIUS, y - NODE_RADIUS, x + NODE_RADIUS, y + NODE_RADIUS,
+                       fill="gold" if treasure else "blue", tags="vertex")
+    canvas.create_text(x, y, text=str(index), fill="black" if treasure else "white", tags="vertex_text")
+
+
+def draw_graph(canvas, graph, viewport: Viewport, directed: bool = True, path=None) -> bool:
+    """
+    Draw a graph, or only a path through it, on a cleared canvas.
+
+    Parameters:
+    canvas: Tk canvas.
+    graph (Graph): Graph to draw.
+    viewport (Viewport): Mapping to canvas pixels.
+    directed (bool): Draw arrows; otherwise every pair of opposite edges is drawn as one line.
+    path (list[int]): Draw the consecutive edges of this node sequence instead of the graph's edges.
+
+    Returns:
+    bool: True when the graph was too large and only a part of it was drawn.
+    """
+    screen = viewport.to_screen(graph.coordinates)
+    if path is not None:
+        sources, targets = np.asarray(path[:-1], dtype=np.int64), np.asarray(path[1:], dtype=np.int64)
+    else:
+        sources, targets = graph.sources, graph.targets
+        if not directed:
+            keep = sources < targets
+            sources, targets = sources[keep], targets[keep]
+    truncated = len(sources) > MAX_DRAWN_EDGES or len(screen) > MAX_DRAWN_NODES
+    for u, v in zip(sources[:MAX_DRAWN_EDGES].tolist(), targets[:MAX_DRAWN_EDGES].tolist()):
+        draw_edge(canvas, screen[u], screen[v], directed)
+    labels = graph.labels
+    for node, (x, y) in enumerate(screen[:MAX_DRAWN_NODES].tolist()):
+        draw_node(canvas, x, y, node, labels[node] == TREASURE)
+    return truncated
+
+
+def node_at(graph, viewport: Viewport, x: float, y: float):
+    """
+    Node under a canvas position.
+
+    Parameters:
+    graph (Graph): The graph.
+    viewport (Viewport): Mapping to canvas pixels.
+    x (float): Screen X.
+    y (float): Screen Y.
+
+    Returns:
+    int: The node nearest to the position within the node radius, or None.
+    """
+    if len(graph) == 0:
+        return None
+    delta = viewport.to_screen(graph.coordinates) - (x, y)
+    distances = np.einsum("ij,ij->i", delta, delta)
+    node = int(np.argmin(distances))
+    return node if distances[node] <= NODE_RADIUS ** 2 else None